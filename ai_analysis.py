@@ -1,5 +1,43 @@
 from groq import Groq
+import contextvars
+import hashlib
+import httpx
+import json
 import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from instrumentation import tramo
+
+# Cliente de Groq para los insights:
+#   - un cliente por (API key, base_url), reutilizado entre llamadas y
+#     sesiones: el pool de httpx mantiene las conexiones abiertas (keep-alive);
+#   - timeout acotado y reintentos con backoff exponencial (los del SDK:
+#     0.5 s -> 8 s, respetando Retry-After en 429/5xx);
+#   - cache TTL de respuestas por (resumen de KPIs normalizado, versión del
+#     prompt, modelo): repetir el análisis del mismo estado de filtros no
+#     consume tokens;
+#   - solicitar_insights_ia() corre la llamada en un hilo aparte y devuelve
+#     un Future, así el script de Streamlit no se bloquea.
+# GROQ_BASE_URL apunta el cliente a otro servidor (p. ej. un mock local).
+
+MODELO = "llama-3.1-8b-instant"
+# Subir cuando cambie el prompt: invalida la cache de respuestas
+VERSION_PROMPT = "1"
+
+TIMEOUT_S = float(os.environ.get("TECHLOG_IA_TIMEOUT", "30"))
+TIMEOUT_CONEXION_S = 5.0
+MAX_REINTENTOS = 2
+TTL_CACHE_S = float(os.environ.get("TECHLOG_IA_TTL", "3600"))
+MAX_CACHE = 256
+MAX_HILOS = 4
+
+_clientes = {}
+_cache = OrderedDict()
+_lock = threading.Lock()
+_ejecutor = ThreadPoolExecutor(max_workers=MAX_HILOS, thread_name_prefix="techlog-ia")
 
 
 def safe_number(x):
@@ -8,17 +46,52 @@ def safe_number(x):
     return round(float(x), 2)
 
 
-def generar_insights_ia(df, api_key):
+# ---------------- Cliente ----------------
+def obtener_cliente(api_key, base_url=None):
+    base_url = base_url or os.environ.get("GROQ_BASE_URL")
+    with _lock:
+        cliente = _clientes.get((api_key, base_url))
+        if cliente is None:
+            cliente = Groq(
+                api_key=api_key,
+                base_url=base_url,
+                timeout=httpx.Timeout(TIMEOUT_S, connect=TIMEOUT_CONEXION_S),
+                max_retries=MAX_REINTENTOS,
+            )
+            _clientes[(api_key, base_url)] = cliente
+        return cliente
 
-    if df.empty:
-        return (
-            "⚠️ No hay datos suficientes con los filtros actuales.\n\n"
-            "Ajusta el rango de fechas o los filtros para generar insights."
-        )
 
-    client = Groq(api_key=api_key)
+# ---------------- Cache de respuestas ----------------
+def clave_respuesta(resumen, modelo=MODELO):
+    normalizado = json.dumps(resumen, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(f"{VERSION_PROMPT}|{modelo}|{normalizado}".encode()).hexdigest()
+
 
-    resumen = {
+def _de_cache(clave):
+    with _lock:
+        entrada = _cache.get(clave)
+        if entrada is None:
+            return None
+        guardado, texto = entrada
+        if time.monotonic() - guardado > TTL_CACHE_S:
+            del _cache[clave]
+            return None
+        _cache.move_to_end(clave)
+        return texto
+
+
+def _a_cache(clave, texto):
+    with _lock:
+        _cache[clave] = (time.monotonic(), texto)
+        _cache.move_to_end(clave)
+        while len(_cache) > MAX_CACHE:
+            _cache.popitem(last=False)
+
+
+# ---------------- Prompt ----------------
+def resumen_kpis(df):
+    return {
         "filas_analizadas": int(len(df)),
         "ingresos_totales_usd": safe_number(df["Ingreso"].sum()),
         "margen_total_usd": safe_number(df["Margen_Utilidad"].sum()),
@@ -30,11 +103,13 @@ def generar_insights_ia(df, api_key):
             df["Tiempo_Entrega_Limpio"].mean()
         ),
         "riesgo_tickets_pct": safe_number(
-            (df["Ticket_Soporte_Abierto"] == "Sí").mean() * 100
+            df["Ticket_Soporte_Abierto"].fillna(False).astype(bool).mean() * 100
         )
     }
 
-    prompt = f"""
+
+def construir_prompt(resumen):
+    return f"""
 Analiza los siguientes KPIs operativos y financieros:
 {resumen}
 
@@ -51,23 +126,73 @@ REGLAS:
 - Formato: Usa Markdown con negritas para enfatizar puntos clave.
 """
 
+
+SIN_DATOS = (
+    "⚠️ No hay datos suficientes con los filtros actuales.\n\n"
+    "Ajusta el rango de fechas o los filtros para generar insights."
+)
+
+
+# ---------------- Llamada ----------------
+def insights_desde_resumen(resumen, api_key, base_url=None):
+    clave = clave_respuesta(resumen)
+    texto = _de_cache(clave)
+    if texto is not None:
+        return texto
+
     try:
-        response = client.chat.completions.create(
-           model="llama-3.1-8b-instant"
-
-,
-            messages=[
-                {"role": "system", "content": "Eres un experto en análisis de negocio."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.4,
-            max_tokens=350
-        )
+        with tramo("ia_groq_completion", modelo=MODELO):
+            response = obtener_cliente(api_key, base_url).chat.completions.create(
+                model=MODELO,
+                messages=[
+                    {"role": "system", "content": "Eres un experto en análisis de negocio."},
+                    {"role": "user", "content": construir_prompt(resumen)}
+                ],
+                temperature=0.4,
+                max_tokens=350
+            )
 
-        return response.choices[0].message.content
+        texto = response.choices[0].message.content
 
     except Exception as e:
+        # los errores no se cachean: el siguiente intento vuelve a llamar
         return (
             "❌ Error al generar insights con IA.\n\n"
             f"Detalle técnico: {e}"
         )
+
+    _a_cache(clave, texto)
+    return texto
+
+
+def generar_insights_ia(df, api_key, base_url=None):
+
+    if df.empty:
+        return SIN_DATOS
+
+    with tramo("ia_resumen_kpis", filas=len(df)):
+        resumen = resumen_kpis(df)
+
+    return insights_desde_resumen(resumen, api_key, base_url)
+
+
+def solicitar_insights_ia(df, api_key, base_url=None):
+    # Igual que generar_insights_ia pero sin bloquear: devuelve un Future.
+    # El resumen se calcula aquí (toca el DataFrame); solo la llamada HTTP
+    # va al hilo. Si la respuesta está en cache el Future ya viene resuelto.
+    futuro = Future()
+    if df.empty:
+        futuro.set_result(SIN_DATOS)
+        return futuro
+
+    with tramo("ia_resumen_kpis", filas=len(df)):
+        resumen = resumen_kpis(df)
+
+    texto = _de_cache(clave_respuesta(resumen))
+    if texto is not None:
+        futuro.set_result(texto)
+        return futuro
+
+    # copy_context: el tramo de la llamada queda en la traza del rerun
+    contexto = contextvars.copy_context()
+    return _ejecutor.submit(contexto.run, insights_desde_resumen, resumen, api_key, base_url)
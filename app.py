@@ -1,16 +1,21 @@
-from ai_analysis import generar_insights_ia
+from ai_analysis import solicitar_insights_ia
+import json
 import streamlit as st
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-import unicodedata
 import plotly.express as px
-from data_processing import (
-    clean_inventario,
-    clean_transacciones,
-    clean_feedback,
-    resumen_limpieza
-)
+from ingestion import EXTENSIONES, ErrorIngesta
+from shared_store import almacen_compartido, almacen_figuras, cargar_datasets, datasets
+from profiler import reporte_auditoria
+from integration import MotorIntegracion, clave_etapa
+from filter_index import IndiceFiltros
+from audit_viewer import VisorAuditoria, ELIMINADAS
+from kpi_cube import CuboKPI
+from text_index import IndiceComentarios, CuboSentimiento
+from charts import grafico_dispersion
+from correlation import MotorCorrelaciones
+from instrumentation import tramo, iniciar_traza, cerrar_traza, MedicionMemoria
 
 # --------------------------------------------------
 # Configuración general
@@ -20,6 +25,26 @@ st.set_page_config(
     layout="wide"
 )
 
+# --------------------------------------------------
+# Instrumentación (panel "Rendimiento")
+# --------------------------------------------------
+# Cada rerun es una traza. El panel muestra los reruns ya terminados: el
+# actual puede cortarse con st.stop() antes de llegar al final del script.
+MAX_TRAZAS = 20
+
+traza_anterior = st.session_state.get("traza")
+cerrar_traza(traza_anterior)
+if traza_anterior is not None and traza_anterior.tramos:
+    st.session_state.setdefault("trazas", []).append(traza_anterior)
+    del st.session_state["trazas"][:-MAX_TRAZAS]
+
+rendimiento = st.session_state.get("rendimiento_activo", False)
+# tracemalloc es de todo el proceso: la sesión solo suelta su propio pedido
+st.session_state.setdefault("medicion_memoria", MedicionMemoria()).activar(
+    rendimiento and st.session_state.get("rendimiento_memoria", False)
+)
+st.session_state["traza"] = iniciar_traza("rerun") if rendimiento else None
+
 st.title("📦 EDA Operacional – TechLog")
 st.markdown(
     "Auditoría de datos, integración y análisis de riesgo para una operación **Tech + Logistics**."
@@ -28,49 +53,26 @@ st.markdown(
 # --------------------------------------------------
 # Funciones auxiliares
 # --------------------------------------------------
-def norm(x):
-    if pd.isna(x):
-        return x
-    x = str(x).strip().lower()
-    return unicodedata.normalize("NFKD", x).encode("ascii","ignore").decode("utf-8")
-
 def nps_grupo(x):
     if pd.isna(x): return np.nan
     if x >= 9: return "Promotor"
     if x >= 7: return "Pasivo"
     return "Detractor"
 
-def health_report(df_raw, df_clean):
-    pct_nulos = df_clean.isna().mean() * 100
-    duplicados = len(df_raw) - len(df_raw.drop_duplicates())
-
-    num = df_clean.select_dtypes(include=np.number)
-    outliers = ((num - num.mean()).abs() > 3 * num.std()).sum().sum()
-
-    health = max(
-        0,
-        100 - (
-            pct_nulos.mean() * 0.4 +
-            (duplicados / len(df_raw)) * 100 * 0.2 +
-            (outliers / max(1, num.size)) * 100 * 0.4
-        )
-    )
-
-    return {
-        "health_score": round(health, 1),
-        "pct_nulos": pct_nulos,
-        "duplicados": duplicados,
-        "outliers": int(outliers)
-    }
+def graficar(fig, contenedor=st, **kwargs):
+    # Serialización de Plotly + envío al navegador, medida como tramo propio
+    with tramo(f"plotly_chart:{kwargs.get('key', 'sin_key')}"):
+        contenedor.plotly_chart(fig, **kwargs)
 
 # --------------------------------------------------
 # Sidebar – Ingesta
 # --------------------------------------------------
 st.sidebar.title("Carga de Datos")
 
-inv_file = st.sidebar.file_uploader("Inventario", type="csv")
-tx_file  = st.sidebar.file_uploader("Transacciones", type="csv")
-fb_file  = st.sidebar.file_uploader("Feedback Clientes", type="csv")
+# CSV (también comprimido con gzip/zstd), Parquet o Arrow IPC
+inv_file = st.sidebar.file_uploader("Inventario", type=EXTENSIONES)
+tx_file  = st.sidebar.file_uploader("Transacciones", type=EXTENSIONES)
+fb_file  = st.sidebar.file_uploader("Feedback Clientes", type=EXTENSIONES)
 
 if st.sidebar.button("🧹 Ejecutar Limpieza"):
 
@@ -78,29 +80,56 @@ if st.sidebar.button("🧹 Ejecutar Limpieza"):
         st.error("Debes cargar los tres archivos.")
         st.stop()
 
-    # ---------------- Ingesta RAW ----------------
-    df_inv_raw = pd.read_csv(inv_file)
-    df_tx_raw  = pd.read_csv(tx_file)
-    df_fb_raw  = pd.read_csv(fb_file)
-
-    # ---------------- Limpieza ----------------
-    df_inv = clean_inventario(df_inv_raw)
-    df_tx  = clean_transacciones(df_tx_raw)
-    df_fb  = clean_feedback(df_fb_raw)
+    # ---------------- Ingesta + limpieza (con cache, en paralelo) ----------------
+    # Los DataFrames quedan en el almacén compartido del proceso: si otra
+    # sesión ya cargó el mismo archivo se reutiliza su copia; si se limpió
+    # antes (mismo contenido y versión) se carga desde la cache en disco; los
+    # que faltan se parsean y limpian en paralelo en un pool de procesos.
+    try:
+        with tramo("ingesta_limpieza"):
+            resultados = cargar_datasets({
+                "inventario": inv_file.getvalue(),
+                "transacciones": tx_file.getvalue(),
+                "feedback": fb_file.getvalue(),
+            })
+    except ErrorIngesta as e:
+        st.error(str(e))
+        st.stop()
+    res_inv = resultados["inventario"]
+    res_tx  = resultados["transacciones"]
+    res_fb  = resultados["feedback"]
 
     # ---------------- Reportes de limpieza ----------------
-    st.session_state["rep_inv"] = resumen_limpieza(df_inv_raw, df_inv)
-    st.session_state["rep_tx"]  = resumen_limpieza(df_tx_raw, df_tx)
-    st.session_state["rep_fb"]  = resumen_limpieza(df_fb_raw, df_fb)
-
-    # ---------------- Guardar dataframes ----------------
-    st.session_state["df_inv_raw"] = df_inv_raw
-    st.session_state["df_tx_raw"]  = df_tx_raw
-    st.session_state["df_fb_raw"]  = df_fb_raw
+    st.session_state["rep_inv"] = res_inv["reporte"]
+    st.session_state["rep_tx"]  = res_tx["reporte"]
+    st.session_state["rep_fb"]  = res_fb["reporte"]
+
+    # ---------------- Claves de los dataframes ----------------
+    # La sesión guarda solo las claves; los datos están en el almacén
+    st.session_state["versiones"] = {
+        "inventario": res_inv["clave"],
+        "transacciones": res_tx["clave"],
+        "feedback": res_fb["clave"],
+    }
 
-    st.session_state["df_inv"] = df_inv
-    st.session_state["df_tx"]  = df_tx
-    st.session_state["df_fb"]  = df_fb
+    hits = sum(r["hit"] for r in [res_inv, res_tx, res_fb])
+    if hits:
+        st.sidebar.caption(f"♻️ {hits}/3 datasets cargados desde cache")
+
+    # Filas mal formadas (saltadas) y columnas con valores inválidos
+    for nombre, res in resultados.items():
+        ingesta = res["reporte"].get("Ingesta")
+        if not ingesta:
+            continue
+        if ingesta["filas_malformadas"]:
+            st.sidebar.warning(
+                f"{nombre}: {ingesta['filas_malformadas']:,} filas mal formadas se omitieron."
+            )
+        for col, inv in ingesta["valores_invalidos"].items():
+            st.sidebar.caption(
+                f"⚠️ {nombre}.{col}: {inv['cantidad']:,} valores inválidos "
+                f"(p. ej. {', '.join(map(str, inv['ejemplos'][:3]))})"
+            )
 
 st.sidebar.divider()
 st.sidebar.subheader("🔑 Integración IA (Groq)")
@@ -114,21 +143,61 @@ api_key = st.sidebar.text_input(
 if api_key:
     st.session_state["groq_api_key"] = api_key
 
+st.sidebar.divider()
+st.sidebar.subheader("⏱️ Rendimiento")
+st.sidebar.checkbox("Instrumentar etapas", key="rendimiento_activo")
+
+if rendimiento:
+    st.sidebar.checkbox("Medir memoria (más lento)", key="rendimiento_memoria")
+    est = almacen_compartido().estadisticas()
+    tasa = "–" if est["tasa_aciertos"] is None else f"{est['tasa_aciertos']:.0%}"
+    st.sidebar.caption(
+        f"Almacén compartido: {est['memoria_mb']:,.0f} / {est['presupuesto_mb']:,.0f} MB · "
+        f"{est['entradas_memoria']} en memoria, {est['entradas_disco']} en disco · "
+        f"aciertos {tasa} · desalojos {est['desalojos']}"
+    )
+    est = almacen_figuras().estadisticas()
+    tasa = "–" if est["tasa_aciertos"] is None else f"{est['tasa_aciertos']:.0%}"
+    st.sidebar.caption(
+        f"Figuras: {est['entradas_memoria']} ({est['memoria_mb']:,.1f} / {est['presupuesto_mb']:,.0f} MB) · "
+        f"aciertos {tasa} · desalojos {est['desalojos']}"
+    )
+    trazas = st.session_state.get("trazas", [])
+    if trazas:
+        i = st.sidebar.selectbox(
+            "Rerun",
+            range(len(trazas) - 1, -1, -1),
+            format_func=lambda i: f"#{i + 1} · {trazas[i].duracion_ms:,.0f} ms",
+        )
+        desglose = pd.DataFrame(trazas[i].desglose()).drop(columns="profundidad")
+        st.sidebar.dataframe(desglose, hide_index=True, use_container_width=True)
+        st.sidebar.download_button(
+            "Exportar traza (OTLP JSON)",
+            json.dumps(trazas[i].exportar()),
+            file_name=f"traza-{trazas[i].trace_id}.json",
+            mime="application/json",
+        )
+    else:
+        st.sidebar.caption("El desglose aparece a partir del siguiente rerun.")
+
 
 # --------------------------------------------------
 # Validación
 # --------------------------------------------------
-if "df_inv" not in st.session_state:
+if "versiones" not in st.session_state:
     st.info("Carga los archivos y ejecuta la limpieza.")
     st.stop()
 
-df_inv = st.session_state["df_inv"]
-df_tx  = st.session_state["df_tx"]
-df_fb  = st.session_state["df_fb"]
+almacen = almacen_compartido()
+versiones = st.session_state["versiones"]
+datos = datasets(versiones, almacen)
+if datos is None or not all(VisorAuditoria(c, n).existe() for n, c in versiones.items()):
+    st.info("Los datos de esta sesión ya no están disponibles: vuelve a ejecutar la limpieza.")
+    st.stop()
 
-df_inv_raw = st.session_state.get("df_inv_raw")
-df_tx_raw  = st.session_state.get("df_tx_raw")
-df_fb_raw  = st.session_state.get("df_fb_raw")
+df_inv = datos["inventario"]
+df_tx  = datos["transacciones"]
+df_fb  = datos["feedback"]
 # --------------------------------------------------
 # Auditoría visual
 # --------------------------------------------------
@@ -136,20 +205,34 @@ df_fb_raw  = st.session_state.get("df_fb_raw")
 # --------------------------------------------------
 # Integración
 # --------------------------------------------------
-df_master = (
-    df_tx
-    .merge(df_inv, on="SKU_ID", how="left", indicator=True)
-    .merge(df_fb, on="Transaccion_ID", how="left")
-)
-# Convertir y limpiar fechas nulas
-df_master["Fecha_Venta"] = pd.to_datetime(df_master["Fecha_Venta"], errors="coerce")
-df_master = df_master.dropna(subset=["Fecha_Venta"])
-
-df_master["sku_fantasma"] = df_master["_merge"] == "left_only"
-df_master["Ingreso"] = df_master["Cantidad_Vendida"] * df_master["Precio_Venta_Final"]
-df_master["Costo_Total"] = df_master["Cantidad_Vendida"] * df_master["Costo_Unitario_Limpio"] + df_master["Costo_Envio"]
-df_master["Margen_Utilidad"] = df_master["Ingreso"] - df_master["Costo_Total"]
-df_master["Brecha_Entrega"] = df_master["Tiempo_Entrega_Limpio"] - df_master["Lead_Time_Limpio"]
+# La tabla maestra se construye una vez por combinación de datasets limpios
+# y queda en el almacén compartido: los reruns y las demás sesiones con los
+# mismos archivos la reutilizan.
+with tramo("master"):
+    df_master = MotorIntegracion(almacen).master(df_tx, df_inv, df_fb, versiones=versiones)
+
+# Índice de filtros (orden por fecha + bitmaps) y cubo de KPIs,
+# uno por tabla maestra, también compartidos
+clave_master = clave_etapa("master", versiones)
+with tramo("indice_filtros"):
+    indice = almacen.obtener_o_calcular(f"indice|{clave_master}", lambda: IndiceFiltros(df_master))
+with tramo("cubo_kpi"):
+    cubo = almacen.obtener_o_calcular(f"cubo|{clave_master}", lambda: CuboKPI(df_master))
+
+# Índice invertido de comentarios sobre las filas del índice de filtros
+# (mismas posiciones) y cubo de sentimiento por categoría / bodega
+with tramo("indice_comentarios"):
+    comentarios = almacen.obtener_o_calcular(
+        f"comentarios|{clave_master}", lambda: IndiceComentarios(indice.df["Comentario_Texto"])
+    )
+with tramo("cubo_sentimiento"):
+    cubo_sentimiento = almacen.obtener_o_calcular(
+        f"cubo_sentimiento|{clave_master}",
+        lambda: CuboSentimiento(indice.df, comentarios.sentimiento())
+    )
+if st.session_state.get("clave_master") != clave_master:
+    st.session_state["motor_corr"] = MotorCorrelaciones()
+    st.session_state["clave_master"] = clave_master
 
 
 # --------------------------------------------------
@@ -158,8 +241,8 @@ df_master["Brecha_Entrega"] = df_master["Tiempo_Entrega_Limpio"] - df_master["Le
 st.sidebar.header("🎛️ Filtros")
 
 # ---------------- Fechas ----------------
-fecha_min = df_master["Fecha_Venta"].min().date()
-fecha_max = df_master["Fecha_Venta"].max().date()
+fecha_min = indice.fecha_min().date()
+fecha_max = indice.fecha_max().date()
 
 # Slider para rango de fechas
 fecha_inicio, fecha_fin = st.sidebar.slider(
@@ -176,20 +259,20 @@ fecha_fin = pd.to_datetime(fecha_fin)
 # ---------------- Filtros categóricos ----------------
 bodegas = st.sidebar.multiselect(
     "Bodega de Origen",
-    options=sorted(df_master["Bodega_Origen"].dropna().unique()),
-    default=sorted(df_master["Bodega_Origen"].dropna().unique())
+    options=indice.valores("Bodega_Origen"),
+    default=indice.valores("Bodega_Origen")
 )
 
 ciudades = st.sidebar.multiselect(
     "Ciudad Destino",
-    options=sorted(df_master["Ciudad_Destino_Limpia"].dropna().unique()),
-    default=sorted(df_master["Ciudad_Destino_Limpia"].dropna().unique())
+    options=indice.valores("Ciudad_Destino_Limpia"),
+    default=indice.valores("Ciudad_Destino_Limpia")
 )
 
 canales = st.sidebar.multiselect(
     "Canal de Venta",
-    options=sorted(df_master["Canal_Venta"].dropna().unique()),
-    default=sorted(df_master["Canal_Venta"].dropna().unique())
+    options=indice.valores("Canal_Venta"),
+    default=indice.valores("Canal_Venta")
 )
 
 # ---------------- Validaciones ----------------
@@ -202,19 +285,46 @@ if not bodegas:
     st.stop()
 
 # ---------------- Filtro maestro ----------------
-df_f = df_master[
-    (df_master["Fecha_Venta"].between(fecha_inicio, fecha_fin)) &
-    (df_master["Bodega_Origen"].isin(bodegas)) &
-    (df_master["Ciudad_Destino_Limpia"].isin(ciudades)) &
-    (df_master["Canal_Venta"].isin(canales))
-]
+# Rango de fechas por búsqueda binaria + bitmaps por valor (sin recorrer
+# toda la maestra)
+filtros = {
+    "Bodega_Origen": bodegas,
+    "Ciudad_Destino_Limpia": ciudades,
+    "Canal_Venta": canales,
+}
+with tramo("filtro") as t:
+    pos_f = indice.posiciones(fecha_inicio, fecha_fin, filtros)
+    df_f = indice.filas(pos_f)
+    t.atributo("filas", len(df_f))
 
 # Debug opcional
 st.sidebar.caption(f"Filas totales: {len(df_master)}")
 st.sidebar.caption(f"Filas filtradas: {len(df_f)}")
 
+
+# --------------------------------------------------
+# Cache de figuras
+# --------------------------------------------------
+# Las figuras de Plotly se construyen una vez por (tabla maestra, estado de
+# filtros, gráfico) y quedan en un almacén aparte con su propio presupuesto
+# y desalojo LRU (shared_store.almacen_figuras): volver a una pestaña o
+# cambiar un selector de vuelta no reconstruye nada.
+estado_filtros = (fecha_inicio, fecha_fin, tuple(bodegas), tuple(ciudades), tuple(canales))
+figuras = almacen_figuras()
+
+def figura(id_grafico, construir, *variante):
+    # variante: lo que además de los filtros cambia la figura (ejes, color...)
+    clave = f"figura|{clave_master}|{estado_filtros}|{id_grafico}|{variante}"
+    return figuras.obtener_o_calcular(clave, construir)
+
+# Solo se ejecuta la pestaña abierta: cambiar de pestaña es un rerun y las
+# demás no calculan ni envían sus gráficos. Dentro de cada pestaña, los
+# selectores que solo afectan a una sección viven en un fragmento
+# (st.fragment) y al cambiarlos se vuelve a ejecutar solo esa sección.
 tab1, tab2, tab3, tab4 = st.tabs(
-    ["🧪 Auditoría", "⚙️ Operaciones", "👥 Cliente", "🤖 Insights IA"]
+    ["🧪 Auditoría", "⚙️ Operaciones", "👥 Cliente", "🤖 Insights IA"],
+    key="pestana",
+    on_change="rerun"
 )
 
 
@@ -222,18 +332,32 @@ tab1, tab2, tab3, tab4 = st.tabs(
 #  Auditoria
 #----------------------------------------------------
 
-with tab1:
-    if "df_inv_raw" not in st.session_state:
-        st.warning("Ejecuta la limpieza para ver la auditoría.")
-        st.stop()
-
-
-    st.subheader("🔎 Transparencia de Limpieza – Inventario")
+@st.fragment
+def auditoria():
+    dataset = st.selectbox(
+        "Selecciona el dataset",
+        ["Inventario", "Transacciones", "Feedback"]
+    )
+    
+    claves = {"Inventario": "inv", "Transacciones": "tx", "Feedback": "fb"}[dataset]
+    nombre = {"inv": "inventario", "tx": "transacciones", "fb": "feedback"}[claves]
+    df_clean = {"inv": df_inv, "tx": df_tx, "fb": df_fb}[claves]
 
-    resumen = resumen_limpieza(df_inv_raw, df_inv)
+    # Crudo y limpio en archivos Arrow mapeados en memoria (audit_viewer.py):
+    # solo se leen las páginas que se muestran
+    visor = almacen.obtener_o_calcular(
+        f"visor|{versiones[nombre]}", lambda: VisorAuditoria(versiones[nombre], nombre)
+    )
 
-    
+    st.subheader(f"🔎 Transparencia de Limpieza – {dataset}")
 
+    # El reporte (resumen + perfil por columna) se calculó al limpiar y viene
+    # de la cache; solo se recalcula si la sesión no lo tiene.
+    resumen = st.session_state.get(f"rep_{claves}")
+    if not resumen or "Perfil" not in resumen:
+        with tramo("reporte_auditoria", dataset=dataset):
+            resumen = reporte_auditoria(visor.raw_df(), df_clean)
+        st.session_state[f"rep_{claves}"] = resumen
 
     col1, col2, col3, col4 = st.columns(4)
 
@@ -245,75 +369,87 @@ with tab1:
         f'{resumen["Salud de datos (%)"]}%'
     )
 
+    with st.expander("📋 Perfil por columna (nulos, outliers, cuantiles)"):
+        st.caption(
+            f"Health score: {resumen['Health score']} · "
+            f"Outliers (3σ) en columnas numéricas: {resumen['Outliers (3σ)']}"
+        )
+        st.dataframe(pd.DataFrame(resumen["Perfil"]), use_container_width=True)
+        ingesta = resumen.get("Ingesta")
+        if ingesta:
+            st.caption(
+                f"Ingesta ({ingesta['formato']}): {ingesta['filas_malformadas']:,} filas mal formadas omitidas · "
+                f"valores inválidos: {ingesta['valores_invalidos'] or 'ninguno'} · "
+                f"columnas ignoradas: {', '.join(ingesta['columnas_ignoradas']) or 'ninguna'}"
+            )
+            if ingesta["ejemplos_malformadas"]:
+                st.dataframe(pd.DataFrame(ingesta["ejemplos_malformadas"]), hide_index=True, use_container_width=True)
+
     st.divider()
     st.subheader("📂 Vista Antes vs Después")
-    
-    dataset = st.selectbox(
-        "Selecciona el dataset",
-        ["Inventario", "Transacciones", "Feedback"]
+
+    vista = st.radio(
+        "Mostrar",
+        ["Todas las filas", "Filas modificadas por regla"],
+        horizontal=True,
+        key="auditoria_vista"
     )
-    
-    if dataset == "Inventario":
-        df_raw = st.session_state["df_inv_raw"]
-        df_clean = df_inv
-    elif dataset == "Transacciones":
-        df_raw = st.session_state["df_tx_raw"]
-        df_clean = df_tx
+
+    if vista == "Todas las filas":
+        paginas = VisorAuditoria.paginas(visor.clean.num_rows)
+        pagina = st.number_input("Página", 1, paginas, 1, key=f"auditoria_pagina_{claves}") - 1
+        with tramo("auditoria_pagina", dataset=dataset):
+            antes, despues = visor.pagina(pagina)
+        st.caption(f"Página {pagina + 1} de {paginas} · cada fila limpia junto a su fila original")
+
+        col1, col2 = st.columns(2)
+
+        with col1:
+            st.markdown("### ❌ Antes de la Limpieza")
+            st.dataframe(antes, use_container_width=True)
+
+        with col2:
+            st.markdown("### ✅ Después de la Limpieza")
+            st.dataframe(despues, use_container_width=True)
     else:
-        df_raw = st.session_state["df_fb_raw"]
-        df_clean = df_fb
-    
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        st.markdown("### ❌ Antes de la Limpieza")
-        st.dataframe(df_raw.head(100), use_container_width=True)
-    
-    with col2:
-        st.markdown("### ✅ Después de la Limpieza")
-        st.dataframe(df_clean.head(100), use_container_width=True)
-with tab2:
+        regla = st.selectbox(
+            "Regla de limpieza (columna)",
+            [ELIMINADAS, *visor.reglas()],
+            key=f"auditoria_regla_{claves}"
+        )
+        with tramo("auditoria_diff", dataset=dataset, regla=regla):
+            afectadas = visor.cambios(regla)
+        st.caption(f"{len(afectadas):,} filas afectadas por esta regla")
 
-    # --------------------------------------------------
-    # KPIs Ejecutivos
-    # --------------------------------------------------
-    st.subheader("📊 KPIs Operacionales")
-    
-    col1, col2, col3, col4 = st.columns(4)
-    
-    col1.metric("Ingresos Totales (USD)", f"${df_f['Ingreso'].sum():,.0f}")
-    col2.metric("Margen Total (USD)", f"${df_f['Margen_Utilidad'].sum():,.0f}")
-    
-    margen_pct = (df_f["Margen_Utilidad"].sum() / df_f["Ingreso"].sum()) * 100
-    col3.metric("Margen Total (%)", f"{margen_pct:.1f}%")
-    
-    col4.metric(
-        "Ventas con SKU Fantasma (%)",
-        f"{df_f['sku_fantasma'].mean() * 100:.1f}%"
-    )
-    
-    # --------------------------------------------------
-    # Análisis interactivo de correlaciones
-    # --------------------------------------------------
-    st.subheader("🔍 Relación entre Variables Operativas y de Negocio")
-    
-    st.markdown(
-        """
-        Explora cómo las variables logísticas y comerciales se relacionan entre sí.
-        Cambia los ejes para descubrir patrones ocultos y cuellos de botella.
-        """
-    )
-    
-    variables_numericas = {
-        "Tiempo de Entrega": "Tiempo_Entrega_Limpio",
-        "Brecha de Entrega": "Brecha_Entrega",
-        "Margen de Utilidad": "Margen_Utilidad",
-        "Ingreso por Venta": "Ingreso",
-        "Satisfacción (NPS)": "Satisfaccion_NPS",
-        "Rating Logística": "Rating_Logistica",
-        "Rating Producto": "Rating_Producto"
-    }
-    
+        if len(afectadas):
+            paginas = VisorAuditoria.paginas(len(afectadas))
+            pagina = st.number_input(
+                "Página", 1, paginas, 1, key=f"auditoria_pagina_regla_{claves}"
+            ) - 1
+            st.dataframe(visor.comparar(regla, pagina), hide_index=True, use_container_width=True)
+
+with tab1:
+    if tab1.open:
+        auditoria()
+
+
+#-----------------------------------------------------
+#  Operaciones
+#----------------------------------------------------
+
+variables_numericas = {
+    "Tiempo de Entrega": "Tiempo_Entrega_Limpio",
+    "Brecha de Entrega": "Brecha_Entrega",
+    "Margen de Utilidad": "Margen_Utilidad",
+    "Ingreso por Venta": "Ingreso",
+    "Satisfacción (NPS)": "Satisfaccion_NPS",
+    "Rating Logística": "Rating_Logistica",
+    "Rating Producto": "Rating_Producto"
+}
+
+@st.fragment
+def correlaciones():
+    # Ejes, color y modo de densidad solo afectan a esta sección
     colx, coly, colc = st.columns(3)
     
     x_var_label = colx.selectbox("Eje X", variables_numericas.keys(), index=0)
@@ -328,35 +464,48 @@ with tab2:
     x_var = variables_numericas[x_var_label]
     y_var = variables_numericas[y_var_label]
     
-    fig = px.scatter(
-        df_f,
-        x=x_var,
-        y=y_var,
-        color=color_var,
-        hover_data=[
-            "SKU_ID",
-            "Ciudad_Destino_Limpia",
-            "Canal_Venta"
-        ],
-        opacity=0.6,
-        trendline="ols",
-        title=f"{y_var_label} vs {x_var_label}"
-    )
+    # Con muchos puntos el gráfico pasa a WebGL / muestreo estratificado;
+    # las rectas OLS se calculan siempre con todas las filas
+    densidad = st.checkbox("Mostrar como mapa de densidad", value=False)
+    
+    def construir_dispersion():
+        fig = grafico_dispersion(
+            df_f,
+            x=x_var,
+            y=y_var,
+            color=color_var,
+            hover_data=[
+                "SKU_ID",
+                "Ciudad_Destino_Limpia",
+                "Canal_Venta"
+            ],
+            opacity=0.6,
+            tendencia=True,
+            modo="densidad" if densidad else "auto",
+            titulo=f"{y_var_label} vs {x_var_label}"
+        )
+        fig.update_layout(
+            template="plotly_white",
+            height=500,
+            legend_title_text=color_var.replace("_", " ")
+        )
+        return fig
     
-    fig.update_layout(
-        template="plotly_white",
-        height=500,
-        legend_title_text=color_var.replace("_", " ")
-    )
+    with tramo("grafico_dispersion_operativo", filas=len(df_f)):
+        fig = figura("dispersion_operativo", construir_dispersion, x_var, y_var, color_var, densidad)
     
     # ... después de fig.update_layout()
-    st.plotly_chart(fig, use_container_width=True, key="grafico_dispersion_operativo")
+    graficar(fig, use_container_width=True, key="grafico_dispersion_operativo")
     
     # --- AQUÍ ESTÁ LA CORRECCIÓN ---
     # Calculamos la correlación de Pearson entre las dos variables seleccionadas
-    # Usamos .dropna() para que no de error si hay valores nulos
-    # 1. Calculamos la correlación
-    corr = df_f[x_var].corr(df_f[y_var])
+    # 1. La matriz completa (todas las parejas, filas completas por pareja) se
+    #    calcula una vez por estado de filtros; cambiar de ejes es una búsqueda
+    with tramo("matriz_correlaciones"):
+        matriz_corr = st.session_state["motor_corr"].matriz(
+            df_f, list(variables_numericas.values()), estado_filtros
+        )
+    corr = matriz_corr.loc[x_var, y_var]
     
     # 2. Definimos la etiqueta de intensidad antes del markdown
     if abs(corr) > 0.7:
@@ -366,8 +515,10 @@ with tab2:
     else:
         intensidad = "débil"
     
-    # 3. Mostramos el markdown limpio
-    st.markdown(
+    # 3. Mostramos el markdown limpio junto a la matriz completa
+    col_interp, col_matriz = st.columns([1, 2])
+    
+    col_interp.markdown(
         f"""
         **📌 Interpretación rápida**
     
@@ -379,55 +530,114 @@ with tab2:
         """
     )
     
+    def construir_matriz():
+        etiquetas = list(variables_numericas.keys())
+        fig = px.imshow(
+            matriz_corr.to_numpy(),
+            x=etiquetas,
+            y=etiquetas,
+            zmin=-1,
+            zmax=1,
+            color_continuous_scale="RdBu_r",
+            text_auto=".2f",
+            title="Matriz de Correlaciones"
+        )
+        fig.update_layout(template="plotly_white", height=450)
+        return fig
     
-    st.subheader("💡 ¿Dónde se gana y dónde se pierde dinero?")
+    fig = figura("matriz_correlaciones", construir_matriz)
+    graficar(fig, col_matriz, use_container_width=True, key="grafico_matriz_correlaciones")
+
+def operaciones():
+    # --------------------------------------------------
+    # KPIs Ejecutivos
+    # --------------------------------------------------
+    st.subheader("📊 KPIs Operacionales")
     
-    fig = px.box(
-        df_f,
-        x="Bodega_Origen",
-        y="Margen_Utilidad",
-        color="Bodega_Origen",
-        title="Distribución de Margen por Bodega"
+    # Sumas sobre las celdas del cubo, no sobre las transacciones
+    with tramo("kpis"):
+        kpis = cubo.totales(fecha_inicio, fecha_fin, filtros)
+    
+    col1, col2, col3, col4 = st.columns(4)
+    
+    col1.metric("Ingresos Totales (USD)", f"${kpis['ingreso']:,.0f}")
+    col2.metric("Margen Total (USD)", f"${kpis['margen']:,.0f}")
+    
+    col3.metric("Margen Total (%)", f"{kpis['margen_pct']:.1f}%")
+    
+    col4.metric(
+        "Ventas con SKU Fantasma (%)",
+        f"{kpis['fantasmas_pct']:.1f}%"
     )
     
-    fig.update_layout(
-        template="plotly_white",
-        showlegend=False
+    # --------------------------------------------------
+    # Análisis interactivo de correlaciones
+    # --------------------------------------------------
+    st.subheader("🔍 Relación entre Variables Operativas y de Negocio")
+    
+    st.markdown(
+        """
+        Explora cómo las variables logísticas y comerciales se relacionan entre sí.
+        Cambia los ejes para descubrir patrones ocultos y cuellos de botella.
+        """
     )
     
+    correlaciones()
+    
+    
+    st.subheader("💡 ¿Dónde se gana y dónde se pierde dinero?")
+    
+    def construir_cajas_rentabilidad():
+        fig = px.box(
+            df_f,
+            x="Bodega_Origen",
+            y="Margen_Utilidad",
+            color="Bodega_Origen",
+            title="Distribución de Margen por Bodega"
+        )
+        fig.update_layout(
+            template="plotly_white",
+            showlegend=False
+        )
+        return fig
+    
+    with tramo("grafico_cajas_rentabilidad", filas=len(df_f)):
+        fig = figura("cajas_rentabilidad", construir_cajas_rentabilidad)
+    
     # ... busca el px.box para el Margen_Utilidad
-    st.plotly_chart(fig, use_container_width=True, key="grafico_cajas_rentabilidad")
+    graficar(fig, use_container_width=True, key="grafico_cajas_rentabilidad")
     
     # --------------------------------------------------
     # Rentabilidad
     # --------------------------------------------------
     st.subheader("💰 Rentabilidad por Bodega")
     
-    margen_bodega_df = (
-        df_f
-        .groupby("Bodega_Origen", as_index=False)["Margen_Utilidad"]
-        .mean()
-        .sort_values("Margen_Utilidad")
-    )
+    with tramo("kpis_por_bodega"):
+        kpis_bodega = cubo.por_bodega(fecha_inicio, fecha_fin, filtros)
     
-    fig = px.bar(
-        margen_bodega_df,
-        y="Bodega_Origen",
-        x="Margen_Utilidad",
-        color="Bodega_Origen",
-        orientation="h",
-        title="Margen Promedio por Bodega (USD)"
-    )
-    
-    fig.update_layout(
-        template="plotly_white",
-        showlegend=False,
-        xaxis_title="Margen promedio (USD)",
-        yaxis_title="Bodega de Origen"
-    )
+    def construir_rentabilidad_bodega():
+        margen_bodega_df = (
+            kpis_bodega[["Bodega_Origen", "Margen_Utilidad"]]
+            .sort_values("Margen_Utilidad")
+        )
+        fig = px.bar(
+            margen_bodega_df,
+            y="Bodega_Origen",
+            x="Margen_Utilidad",
+            color="Bodega_Origen",
+            orientation="h",
+            title="Margen Promedio por Bodega (USD)"
+        )
+        fig.update_layout(
+            template="plotly_white",
+            showlegend=False,
+            xaxis_title="Margen promedio (USD)",
+            yaxis_title="Bodega de Origen"
+        )
+        return fig
     
-    st.plotly_chart(
-        fig,
+    graficar(
+        figura("rentabilidad_bodega", construir_rentabilidad_bodega),
         use_container_width=True,
         key="grafico_rentabilidad_bodega"
     )
@@ -436,24 +646,28 @@ with tab2:
     # --------------------------------------------------
     st.subheader("🚚 Logística y Satisfacción")
     
-    fig = px.scatter(
-        df_f,
-        x="Tiempo_Entrega_Limpio",
-        y="Satisfaccion_NPS",
-        color="Bodega_Origen",
-        opacity=0.4,
-        title="Relación entre Tiempo de Entrega y Satisfacción (NPS)",
-        labels={
-            "Tiempo_Entrega_Limpio": "Tiempo de Entrega (días)",
-            "Satisfaccion_NPS": "NPS"
-        }
-    )
+    def construir_logistica_satisfaccion():
+        fig = grafico_dispersion(
+            df_f,
+            x="Tiempo_Entrega_Limpio",
+            y="Satisfaccion_NPS",
+            color="Bodega_Origen",
+            opacity=0.4,
+            titulo="Relación entre Tiempo de Entrega y Satisfacción (NPS)",
+            labels={
+                "Tiempo_Entrega_Limpio": "Tiempo de Entrega (días)",
+                "Satisfaccion_NPS": "NPS"
+            }
+        )
+        fig.update_layout(
+            template="plotly_white"
+        )
+        return fig
     
-    fig.update_layout(
-        template="plotly_white"
-    )
+    with tramo("grafico_logistica_satisfaccion", filas=len(df_f)):
+        fig = figura("logistica_satisfaccion", construir_logistica_satisfaccion)
     
-    st.plotly_chart(
+    graficar(
         fig,
         use_container_width=True,
         key="grafico_logistica_satisfaccion"
@@ -463,41 +677,42 @@ with tab2:
     # Riesgo Operativo
     # --------------------------------------------------
     # ---------------- Riesgo Operativo (preparación datos) ----------------
-    riesgo_df = (
-        df_f
-        .assign(ticket_bin=df_f["Ticket_Soporte_Abierto"] == "Sí")
-        .groupby("Bodega_Origen", as_index=False)["ticket_bin"]
-        .mean()
-        .rename(columns={"ticket_bin": "Tasa_Tickets"})
-    )
     st.subheader("⚠️ Riesgo Operativo por Bodega")
     
-    fig = px.bar(
-        riesgo_df,
-        x="Bodega_Origen",
-        y="Tasa_Tickets",
-        color="Bodega_Origen",
-        title="Riesgo Operativo por Bodega"
-    )
-    
-    fig.update_layout(
-        template="plotly_white",
-        showlegend=False,
-        yaxis_tickformat=".0%",
-        yaxis_title="Tasa de Tickets de Soporte",
-        xaxis_title="Bodega de Origen"
-    )
+    def construir_riesgo_bodega():
+        riesgo_df = kpis_bodega[["Bodega_Origen", "Tasa_Tickets"]]
+        fig = px.bar(
+            riesgo_df,
+            x="Bodega_Origen",
+            y="Tasa_Tickets",
+            color="Bodega_Origen",
+            title="Riesgo Operativo por Bodega"
+        )
+        fig.update_layout(
+            template="plotly_white",
+            showlegend=False,
+            yaxis_tickformat=".0%",
+            yaxis_title="Tasa de Tickets de Soporte",
+            xaxis_title="Bodega de Origen"
+        )
+        return fig
     
-    st.plotly_chart(
-        fig,
+    graficar(
+        figura("riesgo_bodega", construir_riesgo_bodega),
         use_container_width=True,
         key="grafico_riesgo_bodega"
     )
 
+with tab2:
+    if tab2.open:
+        operaciones()
 
-with tab3:
-    st.subheader("Satisfacción del Cliente")
 
+#-----------------------------------------------------
+#  Cliente
+#----------------------------------------------------
+
+def construir_cajas_nps():
     fig = px.box(
         df_f,
         x="Bodega_Origen",
@@ -505,12 +720,130 @@ with tab3:
         color="Bodega_Origen",
         title="Distribución de NPS por Bodega"
     )
-
     fig.update_layout(template="plotly_white", showlegend=False)
-    st.plotly_chart(fig, use_container_width=True)
+    return fig
+
+# ---------------- Comentarios (índice invertido + sentimiento) ----------------
+COLUMNAS_COMENTARIO = ["Fecha_Venta", "Transaccion_Key", "SKU_ID", "Categoria", "Bodega_Origen", "Comentario_Texto"]
+
+def construir_sentimiento(dimension):
+    # Sumas sobre las celdas del cubo de sentimiento, con los filtros del sidebar
+    def construir():
+        df = cubo_sentimiento.por(dimension, fecha_inicio, fecha_fin, filtros)
+        fig = px.bar(
+            df.sort_values("Sentimiento_Medio"),
+            x=dimension,
+            y="Sentimiento_Medio",
+            color="Sentimiento_Medio",
+            color_continuous_scale="RdYlGn",
+            range_color=(-1, 1),
+            hover_data=["Comentarios", "Pct_Negativos"],
+            title=f"Sentimiento medio por {'categoría' if dimension == 'Categoria' else 'bodega'}"
+        )
+        fig.update_layout(template="plotly_white", yaxis_range=(-1, 1), coloraxis_showscale=False)
+        return fig
+    return construir
+
+def datos_paradoja():
+    # Paradoja de Fidelidad: stock actual por categoría vs sentimiento
+    sentimiento = cubo_sentimiento.por("Categoria", fecha_inicio, fecha_fin, filtros)
+    stock = (
+        df_inv.groupby("Categoria", as_index=False, observed=True)["Stock_Actual"].sum()
+        .astype({"Categoria": "string"})
+    )
+    return sentimiento.merge(stock, on="Categoria", how="inner")
+
+def construir_paradoja(df):
+    fig = px.scatter(
+        df,
+        x="Stock_Actual",
+        y="Sentimiento_Medio",
+        size="Comentarios",
+        color="Categoria",
+        text="Categoria",
+        title="Paradoja de Fidelidad: Stock vs Sentimiento"
+    )
+    fig.add_hline(y=0, line_dash="dot")
+    fig.add_vline(x=df["Stock_Actual"].median() if len(df) else 0, line_dash="dot")
+    fig.update_layout(template="plotly_white", showlegend=False, yaxis_range=(-1, 1))
+    return fig
+
+@st.fragment
+def comentarios_cliente():
+    # La búsqueda solo vuelve a ejecutar esta sección
+    consulta = st.text_input(
+        "Buscar en comentarios",
+        placeholder='lento "no volveria"',
+        help="Todas las palabras deben aparecer; entre comillas, como frase exacta. "
+             "Sin tildes ni mayúsculas que importen."
+    )
+    with tramo("busqueda_comentarios") as t:
+        pos = comentarios.buscar(consulta, pos_f) if consulta.strip() else pos_f
+        resumen = comentarios.resumen(pos)
+        t.atributo("filas", resumen["filas"])
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Comentarios", f"{resumen['comentarios']:,}")
+    col2.metric(
+        "Sentimiento medio",
+        "–" if np.isnan(resumen["sentimiento_medio"]) else f"{resumen['sentimiento_medio']:+.2f}"
+    )
+    col3.metric(
+        "Negativos (%)",
+        f"{resumen['negativos'] / resumen['comentarios']:.0%}" if resumen["comentarios"] else "–"
+    )
+
+    col_terminos, col_filas = st.columns([1, 2])
+    col_terminos.dataframe(
+        comentarios.terminos_frecuentes(pos),
+        hide_index=True,
+        use_container_width=True,
+        column_config={"Sentimiento_Medio": st.column_config.NumberColumn(format="%+.2f")}
+    )
+    if consulta.strip():
+        muestra = indice.filas(pos[:100])[COLUMNAS_COMENTARIO].copy()
+        muestra["Sentimiento"] = comentarios.sentimiento(pos[:100])
+        col_filas.caption(f"{len(pos):,} filas coinciden (se muestran hasta 100)")
+        col_filas.dataframe(muestra, hide_index=True, use_container_width=True)
+
+with tab3:
+    if tab3.open:
+        st.subheader("Satisfacción del Cliente")
+
+        with tramo("grafico_cajas_nps", filas=len(df_f)):
+            fig = figura("cajas_nps", construir_cajas_nps)
+
+        graficar(fig, use_container_width=True, key="grafico_cajas_nps")
+
+        st.subheader("💬 Comentarios de Clientes")
+        comentarios_cliente()
+
+        col_cat, col_bod = st.columns(2)
+        with tramo("sentimiento_por_grupo"):
+            fig_cat = figura("sentimiento_categoria", construir_sentimiento("Categoria"))
+            fig_bod = figura("sentimiento_bodega", construir_sentimiento("Bodega_Origen"))
+        graficar(fig_cat, contenedor=col_cat, use_container_width=True, key="grafico_sentimiento_categoria")
+        graficar(fig_bod, contenedor=col_bod, use_container_width=True, key="grafico_sentimiento_bodega")
+
+        st.subheader("🧭 Paradoja de Fidelidad")
+        paradoja = datos_paradoja()
+        fig = figura("paradoja", lambda: construir_paradoja(paradoja))
+        graficar(fig, use_container_width=True, key="grafico_paradoja")
+        criticas = paradoja[
+            (paradoja["Stock_Actual"] > paradoja["Stock_Actual"].median())
+            & (paradoja["Sentimiento_Medio"] < 0)
+        ]
+        if len(criticas):
+            st.warning(
+                "Alto stock con sentimiento negativo: "
+                + ", ".join(f"{c} ({s:+.2f})" for c, s in zip(criticas["Categoria"], criticas["Sentimiento_Medio"]))
+            )
 
 
 with tab4:
+    if not tab4.open:
+        st.stop()
+
     st.subheader("🤖 Insights Generados por IA")
 
     groq_key = st.session_state.get("groq_api_key")
@@ -519,12 +852,31 @@ with tab4:
         st.warning("Ingresa la API Key en el panel lateral.")
         st.stop()
 
+    # La llamada a Groq corre en un hilo aparte: el resto del dashboard sigue
+    # respondiendo y este fragmento consulta el resultado cada segundo.
+    # Un estado de filtros ya analizado sale de la cache sin llamar a la API.
     if st.button("🧠 Analizar con IA"):
-        with st.spinner("Analizando datos filtrados..."):
-            resultado = generar_insights_ia(df_f, groq_key)
+        st.session_state["futuro_ia"] = solicitar_insights_ia(df_f, groq_key)
+
+    futuro = st.session_state.get("futuro_ia")
+    pendiente = futuro is not None and not futuro.done()
+
+    @st.fragment(run_every=1 if pendiente else None)
+    def insights_ia():
+        futuro = st.session_state.get("futuro_ia")
+        if futuro is None:
+            return
+        if not futuro.done():
+            st.info("⏳ Analizando datos filtrados...")
+            return
+        if pendiente:
+            # rerun completo para detener la consulta periódica
+            st.rerun()
 
         st.markdown("### 📌 Insights Ejecutivos")
-        st.write(resultado)
+        st.write(futuro.result())
+
+    insights_ia()
 
 
 
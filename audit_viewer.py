@@ -0,0 +1,191 @@
+import os
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from cleaning_cache import DIR_CACHE
+from data_processing import filas_origen
+
+# Vista "Antes vs Después" fuera de memoria.
+# Por cada dataset (clave de cache) se guardan en disco:
+#   raw.arrow / clean.arrow   Arrow IPC sin compresión: se abren con
+#                             memory-map y una página es un slice sin copia;
+#                             solo las filas de la página pasan a pandas
+#   origen.npy                posición en raw de cada fila de clean
+# Los datos crudos ya no necesitan vivir en RAM: el SO pagina desde el
+# archivo lo que se mira.
+#
+# El diff por fila se calcula bajo demanda, una regla (columna) a la vez, y
+# queda en memoria como posiciones (8 bytes por fila cambiada). Una regla
+# compara una columna limpia contra su columna de origen en el crudo, con
+# el tipo de la limpia: números con tolerancia de float32, fechas como
+# fechas, sí/no contra "Sí"/"No", el resto como texto. Un valor que pasa a nulo cuenta como cambio.
+
+DIR_AUDITORIA = DIR_CACHE / "auditoria"
+FILAS_POR_PAGINA = 100
+
+# columna limpia -> columna del crudo de la que sale (si no es la misma)
+ORIGEN_COLUMNAS = {
+    "Tiempo_Entrega_Limpio": "Tiempo_Entrega_Real",
+    "Ciudad_Destino_Limpia": "Ciudad_Destino",
+    "Costo_Unitario_Limpio": "Costo_Unitario_USD",
+    "Lead_Time_Limpio": "Lead_Time_Dias",
+}
+CLAVES = {"inventario": "SKU_ID", "transacciones": "Transaccion_ID", "feedback": "Feedback_ID"}
+ELIMINADAS = "Filas eliminadas"
+
+
+# ---------------- Archivos ----------------
+def _a_arrow(df):
+    # object con tipos mezclados (crudos) -> texto; Arrow no los admite
+    df = df.astype({c: "string" for c in df.columns if df[c].dtype == object})
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def _escribir_arrow(df, ruta):
+    # temporal propio: dos sesiones pueden preparar el mismo dataset a la vez
+    tmp = ruta.with_suffix(f".{uuid.uuid4().hex[:8]}.tmp")
+    tabla = _a_arrow(df)
+    with pa.OSFile(str(tmp), "wb") as f, pa.ipc.new_file(f, tabla.schema) as escritor:
+        escritor.write_table(tabla)
+    os.replace(tmp, ruta)
+
+
+def _abrir_arrow(ruta):
+    return pa.ipc.open_file(pa.memory_map(str(ruta), "r")).read_all()
+
+
+def _distintos(antes, despues):
+    # Máscara de filas donde la limpieza cambió el valor
+    nulos_antes = antes.isna().to_numpy()
+    nulos_despues = despues.isna().to_numpy()
+    if pd.api.types.is_datetime64_any_dtype(despues):
+        a = pd.to_datetime(antes, errors="coerce").to_numpy()
+        iguales = a == despues.to_numpy()
+    elif pd.api.types.is_bool_dtype(despues):
+        # "Sí" / "No" es la forma canónica de un sí/no en el crudo (schema.py)
+        a = antes.map(lambda v: {"Sí": True, "No": False}.get(v, v) if isinstance(v, str) else v)
+        iguales = (a.astype("object") == despues.astype("object")).to_numpy(dtype=bool)
+    elif pd.api.types.is_numeric_dtype(despues):
+        a = pd.to_numeric(antes, errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+        d = despues.to_numpy(dtype="float64", na_value=np.nan)
+        iguales = np.isclose(a, d, rtol=1e-6, equal_nan=True)
+    else:
+        iguales = (antes.astype("string") == despues.astype("string")).fillna(False).to_numpy(dtype=bool)
+    return ~((iguales | (nulos_antes & nulos_despues)) & (nulos_antes == nulos_despues))
+
+
+class VisorAuditoria:
+
+    def __init__(self, clave, nombre, directorio=None):
+        self.nombre = nombre
+        self.dir = Path(directorio or DIR_AUDITORIA) / clave
+        self._raw = self._clean = self._origen = None
+        self._cambios = {}
+
+    @classmethod
+    def preparar(cls, clave, nombre, df_raw, df_clean, directorio=None):
+        # Escribe los archivos si no existen (una vez por contenido)
+        visor = cls(clave, nombre, directorio)
+        if not visor.existe():
+            visor.dir.mkdir(parents=True, exist_ok=True)
+            np.save(visor.dir / "origen.npy", filas_origen(nombre, df_raw))
+            _escribir_arrow(df_raw, visor.dir / "raw.arrow")
+            # clean.arrow al final: marca la entrada como completa
+            _escribir_arrow(df_clean, visor.dir / "clean.arrow")
+        return visor
+
+    def existe(self):
+        return (self.dir / "clean.arrow").exists()
+
+    @property
+    def raw(self):
+        if self._raw is None:
+            self._raw = _abrir_arrow(self.dir / "raw.arrow")
+        return self._raw
+
+    @property
+    def clean(self):
+        if self._clean is None:
+            self._clean = _abrir_arrow(self.dir / "clean.arrow")
+        return self._clean
+
+    @property
+    def origen(self):
+        if self._origen is None:
+            self._origen = np.load(self.dir / "origen.npy", mmap_mode="r")
+        return self._origen
+
+    @property
+    def nbytes(self):
+        # Lo mapeado lo maneja el SO; en memoria propia solo quedan los diffs
+        return sum(p.nbytes for p in self._cambios.values())
+
+    def raw_df(self):
+        return self.raw.to_pandas()
+
+    # ---------------- Páginas ----------------
+    @staticmethod
+    def paginas(filas, por_pagina=FILAS_POR_PAGINA):
+        return max(1, -(-filas // por_pagina))
+
+    def pagina(self, pagina, por_pagina=FILAS_POR_PAGINA):
+        # (antes, después) alineados fila a fila: la página del limpio es un
+        # slice sin copia y del crudo se toman solo sus filas de origen
+        inicio = pagina * por_pagina
+        despues = self.clean.slice(inicio, por_pagina).to_pandas()
+        origen = np.asarray(self.origen[inicio:inicio + por_pagina])
+        antes = self.raw.take(pa.array(origen)).to_pandas()
+        antes.index = pd.Index(origen + 1, name="Fila original")
+        despues.index = antes.index
+        return antes, despues
+
+    # ---------------- Diff por regla ----------------
+    def reglas(self):
+        # {etiqueta: (columna cruda, columna limpia)}
+        crudas = set(self.raw.column_names)
+        reglas = {}
+        for col in self.clean.column_names:
+            origen = ORIGEN_COLUMNAS.get(col, col)
+            if origen in crudas:
+                etiqueta = col if origen == col else f"{col} ← {origen}"
+                reglas[etiqueta] = (origen, col)
+        return reglas
+
+    def cambios(self, regla):
+        # Posiciones en clean (o en raw para ELIMINADAS) afectadas por la regla
+        if regla not in self._cambios:
+            if regla == ELIMINADAS:
+                conservadas = np.zeros(self.raw.num_rows, dtype=bool)
+                conservadas[self.origen] = True
+                self._cambios[regla] = np.flatnonzero(~conservadas)
+            else:
+                col_raw, col_clean = self.reglas()[regla]
+                # select() en vez de column(): conserva los tipos de pandas
+                antes = self.raw.select([col_raw]).take(pa.array(self.origen)).to_pandas()[col_raw]
+                despues = self.clean.select([col_clean]).to_pandas()[col_clean]
+                self._cambios[regla] = np.flatnonzero(_distintos(antes, despues))
+        return self._cambios[regla]
+
+    def comparar(self, regla, pagina, por_pagina=FILAS_POR_PAGINA):
+        # Filas de la página de una regla: clave, valor antes y después
+        pos = self.cambios(regla)[pagina * por_pagina:(pagina + 1) * por_pagina]
+        clave = CLAVES[self.nombre]
+        if regla == ELIMINADAS:
+            df = self.raw.take(pa.array(pos)).to_pandas()
+            df.insert(0, "Fila original", pos + 1)
+            return df
+
+        col_raw, col_clean = self.reglas()[regla]
+        origen = np.asarray(self.origen)[pos]
+        antes = self.raw.select([clave, col_raw]).take(pa.array(origen)).to_pandas()
+        despues = self.clean.select([col_clean]).take(pa.array(pos)).to_pandas()
+        return pd.DataFrame({
+            "Fila original": origen + 1,
+            clave: antes[clave].to_numpy(),
+            "Antes": antes[col_raw].astype("string").to_numpy(),
+            "Después": despues[col_clean].astype("string").to_numpy(),
+        })
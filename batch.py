@@ -0,0 +1,269 @@
+import argparse
+import json
+import math
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from data_processing import clean_inventario, clean_transacciones, clean_feedback
+from ingestion import leer_dataset, leer_por_bloques
+from integration import construir_master
+from kpi_cube import agregar_celdas
+from profiler import reporte_auditoria
+from streaming import FILAS_POR_BLOQUE, limpiar_feedback_por_bloques, limpiar_transacciones_por_bloques
+
+# Ejecución por lotes (sin Streamlit) del pipeline completo:
+#   ingesta -> clean_* -> reportes de limpieza -> maestra -> KPIs
+# Escribe los datasets limpios y la maestra en Parquet, más un
+# reporte.json con los tiempos de cada etapa.
+#
+#   python batch.py --inventario inv.csv --transacciones tx.csv \
+#       --feedback fb.csv --salida salida/
+#
+# --recorte-entrega iqr|3sigma cambia el recorte fijo de Tiempo_Entrega_Real
+# por umbrales de outliers calculados con bosquejos de cuantiles en
+# paralelo (sketches.py) sobre el archivo de transacciones.
+#
+# --por-bloques limpia transacciones y feedback con streaming.py (memoria
+# acotada a un bloque de --filas-por-bloque filas) y los escribe como
+# directorios de Parquet por partes; el inventario se limpia entero. En
+# ese modo no se construyen la maestra ni los KPIs: necesitan las tablas
+# completas en memoria.
+
+LIMPIADORES = {
+    "inventario": clean_inventario,
+    "transacciones": clean_transacciones,
+    "feedback": clean_feedback,
+}
+
+
+class Cronometro:
+
+    def __init__(self):
+        self.etapas = {}
+
+    @contextmanager
+    def etapa(self, nombre):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.etapas[nombre] = round(time.perf_counter() - inicio, 4)
+
+
+def kpis_globales(df_master):
+    ingreso = df_master["Ingreso"].sum()
+    margen = df_master["Margen_Utilidad"].sum()
+    return {
+        "filas": int(len(df_master)),
+        "ingresos_totales_usd": round(float(ingreso), 2),
+        "margen_total_usd": round(float(margen), 2),
+        "margen_pct": round(float(margen / ingreso * 100), 2) if ingreso else None,
+        "ventas_sku_fantasma_pct": round(float(df_master["sku_fantasma"].mean() * 100), 2),
+        "tiempo_entrega_promedio_dias": round(float(df_master["Tiempo_Entrega_Limpio"].mean()), 2),
+        "tasa_tickets_pct": round(
+            float(df_master["Ticket_Soporte_Abierto"].fillna(False).astype(bool).mean() * 100), 2
+        ),
+    }
+
+
+def _json_default(x):
+    if hasattr(x, "item"):
+        return x.item()
+    return str(x)
+
+
+def _json_estricto(x):
+    # NaN / inf -> null: json.dump los escribiría como NaN / Infinity,
+    # que no es JSON válido para otros lectores
+    if isinstance(x, dict):
+        return {k: _json_estricto(v) for k, v in x.items()}
+    if isinstance(x, (list, tuple)):
+        return [_json_estricto(v) for v in x]
+    if isinstance(x, np.generic):
+        x = x.item()
+    if x is pd.NA or x is pd.NaT or (isinstance(x, float) and not math.isfinite(x)):
+        return None
+    return x
+
+
+def ejecutar_pipeline(rutas, dir_salida, paralelo=False, csv=False, recorte_entrega="fijo"):
+    # rutas: {"inventario": ruta, "transacciones": ruta, "feedback": ruta}
+    dir_salida = Path(dir_salida)
+    dir_salida.mkdir(parents=True, exist_ok=True)
+    crono = Cronometro()
+    limpios = {}
+    reportes = {}
+    ingestas = {}
+    limites = None
+
+    if recorte_entrega != "fijo":
+        from sketches import bosquejos_en_paralelo
+
+        with crono.etapa("bosquejos_entrega"):
+            bosquejos = bosquejos_en_paralelo({"transacciones": Path(rutas["transacciones"]).read_bytes()})
+            limites = bosquejos.limites_entrega(recorte_entrega)
+
+    if paralelo:
+        from parallel import limpiar_datasets
+
+        with crono.etapa("ingesta_limpieza_reportes"):
+            resultados = limpiar_datasets({n: Path(r).read_bytes() for n, r in rutas.items()},
+                                          limites_entrega=limites)
+        for nombre, res in resultados.items():
+            limpios[nombre] = res["clean"]
+            reportes[nombre] = res["reporte"]
+    else:
+        for nombre, ruta in rutas.items():
+            with crono.etapa(f"ingesta_{nombre}"):
+                df_raw, ingestas[nombre] = leer_dataset(nombre, ruta)
+            with crono.etapa(f"limpieza_{nombre}"):
+                if nombre == "transacciones":
+                    limpios[nombre] = clean_transacciones(df_raw, limites_entrega=limites)
+                else:
+                    limpios[nombre] = LIMPIADORES[nombre](df_raw)
+            with crono.etapa(f"reporte_{nombre}"):
+                reportes[nombre] = reporte_auditoria(df_raw, limpios[nombre])
+                reportes[nombre]["Ingesta"] = ingestas[nombre]
+            del df_raw
+
+    with crono.etapa("master"):
+        df_master = construir_master(limpios["transacciones"], limpios["inventario"], limpios["feedback"])
+
+    with crono.etapa("kpis"):
+        kpis = kpis_globales(df_master)
+        kpis_diarios = agregar_celdas(df_master)
+
+    with crono.etapa("escritura"):
+        for nombre, df in limpios.items():
+            df.to_parquet(dir_salida / f"{nombre}_limpio.parquet", index=False)
+            if csv:
+                df.to_csv(dir_salida / f"{nombre}_limpio.csv", index=False)
+        df_master.to_parquet(dir_salida / "master.parquet", index=False)
+        kpis_diarios.to_parquet(dir_salida / "kpis_diarios.parquet", index=False)
+
+    reporte = {
+        "entradas": {n: str(r) for n, r in rutas.items()},
+        "filas": {n: int(len(df)) for n, df in limpios.items()} | {"master": int(len(df_master))},
+        "limpieza": reportes,
+        "kpis": kpis,
+        "limites_entrega": list(limites) if limites is not None else None,
+        "tiempos_s": crono.etapas,
+        "tiempo_total_s": round(sum(crono.etapas.values()), 4),
+    }
+    _escribir_reporte(reporte, dir_salida)
+    return reporte
+
+
+def _escribir_reporte(reporte, dir_salida):
+    with open(Path(dir_salida) / "reporte.json", "w", encoding="utf-8") as f:
+        json.dump(_json_estricto(reporte), f, ensure_ascii=False, indent=2, allow_nan=False,
+                  default=_json_default)
+
+
+# ---------------- Memoria acotada ----------------
+def ejecutar_por_bloques(rutas, dir_salida, filas_por_bloque=FILAS_POR_BLOQUE, recorte_entrega="fijo"):
+    dir_salida = Path(dir_salida)
+    dir_salida.mkdir(parents=True, exist_ok=True)
+    crono = Cronometro()
+    limpieza = {}
+    limites = None
+
+    if recorte_entrega != "fijo":
+        from sketches import BosquejosLimpieza
+
+        # Una pasada por bloques: el bosquejo ocupa lo mismo con cualquier tamaño
+        with crono.etapa("bosquejos_entrega"):
+            bosquejos = BosquejosLimpieza()
+            for bloque in leer_por_bloques("transacciones", rutas["transacciones"], filas_por_bloque):
+                bosquejos.agregar("transacciones", bloque)
+            limites = bosquejos.limites_entrega(recorte_entrega)
+
+    with crono.etapa("ingesta_inventario"):
+        df_raw, ingesta = leer_dataset("inventario", rutas["inventario"])
+    with crono.etapa("limpieza_inventario"):
+        df_inv = clean_inventario(df_raw)
+    with crono.etapa("reporte_inventario"):
+        limpieza["inventario"] = reporte_auditoria(df_raw, df_inv)
+        limpieza["inventario"]["Ingesta"] = ingesta
+    del df_raw
+
+    with crono.etapa("limpieza_transacciones"):
+        limpieza["transacciones"] = limpiar_transacciones_por_bloques(
+            rutas["transacciones"], dir_salida / "transacciones_limpio", filas_por_bloque,
+            limites_entrega=limites,
+        )
+    with crono.etapa("limpieza_feedback"):
+        limpieza["feedback"] = limpiar_feedback_por_bloques(
+            rutas["feedback"], dir_salida / "feedback_limpio", filas_por_bloque
+        )
+
+    with crono.etapa("escritura"):
+        df_inv.to_parquet(dir_salida / "inventario_limpio.parquet", index=False)
+
+    reporte = {
+        "entradas": {n: str(r) for n, r in rutas.items()},
+        "filas": {
+            "inventario": int(len(df_inv)),
+            "transacciones": limpieza["transacciones"]["filas"],
+            "feedback": limpieza["feedback"]["filas"] - limpieza["feedback"]["duplicadas"],
+        },
+        "limpieza": limpieza,
+        "filas_por_bloque": filas_por_bloque,
+        "limites_entrega": list(limites) if limites is not None else None,
+        "tiempos_s": crono.etapas,
+        "tiempo_total_s": round(sum(crono.etapas.values()), 4),
+    }
+    _escribir_reporte(reporte, dir_salida)
+    return reporte
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Limpieza e integración por lotes de los datasets de TechLogistics."
+    )
+    parser.add_argument("--inventario", required=True, help="Inventario (CSV, .csv.gz, .csv.zst, Parquet o Arrow IPC)")
+    parser.add_argument("--transacciones", required=True, help="Transacciones (mismos formatos)")
+    parser.add_argument("--feedback", required=True, help="Feedback de clientes (mismos formatos)")
+    parser.add_argument("--salida", required=True, help="Directorio de salida")
+    parser.add_argument("--paralelo", action="store_true",
+                        help="Limpiar los datasets en un pool de procesos (con cache)")
+    parser.add_argument("--csv", action="store_true",
+                        help="Escribir además *_limpio.csv")
+    parser.add_argument("--recorte-entrega", choices=["fijo", "iqr", "3sigma"], default="fijo",
+                        help="Recorte de Tiempo_Entrega_Real: el fijo de la limpieza o umbrales de "
+                             "outliers desde bosquejos de cuantiles")
+    parser.add_argument("--por-bloques", action="store_true",
+                        help="Limpiar transacciones y feedback por bloques con memoria acotada "
+                             "(sin maestra ni KPIs)")
+    parser.add_argument("--filas-por-bloque", type=int, default=FILAS_POR_BLOQUE,
+                        help=f"Filas por bloque con --por-bloques (defecto {FILAS_POR_BLOQUE})")
+    args = parser.parse_args(argv)
+    if args.por_bloques and (args.paralelo or args.csv):
+        parser.error("--por-bloques no se combina con --paralelo ni con --csv")
+
+    rutas = {"inventario": args.inventario, "transacciones": args.transacciones, "feedback": args.feedback}
+    if args.por_bloques:
+        reporte = ejecutar_por_bloques(rutas, args.salida, args.filas_por_bloque,
+                                       recorte_entrega=args.recorte_entrega)
+    else:
+        reporte = ejecutar_pipeline(
+            rutas,
+            args.salida,
+            paralelo=args.paralelo,
+            csv=args.csv,
+            recorte_entrega=args.recorte_entrega,
+        )
+
+    for etapa, segundos in reporte["tiempos_s"].items():
+        print(f"{etapa:<28} {segundos:>9.3f} s")
+    print(f"{'total':<28} {reporte['tiempo_total_s']:>9.3f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
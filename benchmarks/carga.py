@@ -0,0 +1,351 @@
+import argparse
+import json
+import logging
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import numpy as np
+
+from benchmarks import mock_groq
+from benchmarks.generar_datos import generar
+
+# Prueba de carga del dashboard con sesiones concurrentes.
+# Cada sesión es un AppTest de Streamlit (app.py sin navegador) y recorre un
+# guion realista: sube los tres CSV, ejecuta la limpieza, mueve el rango de
+# fechas, quita una bodega, cambia a Operaciones, cambia el eje X del
+# scatter y pide insights de IA contra el mock local de Groq. Cada run() del
+# guion es un rerun y se cronometra.
+# Por cada número de sesiones concurrentes se reporta:
+#   - latencia de rerun p50 / p95 / p99 (todas las acciones y por acción);
+#   - pico de RSS del proceso (muestreado cada 50 ms);
+#   - CPU del proceso y de sus hijos (pool de limpieza), total y por sesión.
+# Por defecto cada nivel arranca en frío (almacenes y cache de limpieza
+# vacíos), así los niveles son comparables; --caliente los conserva.
+# Los módulos de la app se importan después de apuntar TECHLOG_CACHE_DIR a
+# un directorio temporal: la prueba no toca la cache de limpieza real.
+# Como run_benchmarks.py, --comparar marca regresiones de p95 y el proceso
+# termina con código 1.
+#
+#   python -m benchmarks.carga --sesiones 1 5 10 20 --transacciones 200000 \
+#       --salida carga.json [--comparar base.json --tolerancia 0.25]
+
+APP = Path(__file__).resolve().parent.parent / "app.py"
+ARCHIVOS = ("inventario", "transacciones", "feedback")
+PERCENTILES = (50, 95, 99)
+TIMEOUT_RERUN_S = 600
+ESPERA_IA_S = 60
+INTERVALO_MUESTREO_S = 0.05
+
+
+# ---------------- Recursos del proceso ----------------
+def _rss_mb():
+    # RSS actual; sin /proc (macOS) se usa el máximo histórico
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for linea in f:
+                if linea.startswith("VmRSS:"):
+                    return int(linea.split()[1]) / 2**10
+    except OSError:
+        pass
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (2**20 if sys.platform == "darwin" else 2**10)
+
+
+def _cpu_s():
+    # (proceso, hijos): la limpieza corre en un pool de procesos
+    t = os.times()
+    return t.user + t.system, t.children_user + t.children_system
+
+
+class MuestreoRecursos:
+    # Pico de RSS (hilo que muestrea) y CPU consumida entre __enter__ y __exit__
+
+    def __init__(self, intervalo=INTERVALO_MUESTREO_S):
+        self.intervalo = intervalo
+        self.pico_mb = 0.0
+        self._parar = threading.Event()
+
+    def _muestrear(self):
+        while not self._parar.is_set():
+            self.pico_mb = max(self.pico_mb, _rss_mb())
+            self._parar.wait(self.intervalo)
+
+    def __enter__(self):
+        self.pico_mb = _rss_mb()
+        self._cpu = _cpu_s()
+        self._inicio = time.perf_counter()
+        self._hilo = threading.Thread(target=self._muestrear, daemon=True)
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._parar.set()
+        self._hilo.join()
+        self.pared_s = time.perf_counter() - self._inicio
+        propio, hijos = _cpu_s()
+        self.cpu_s = propio - self._cpu[0]
+        self.cpu_hijos_s = hijos - self._cpu[1]
+        return False
+
+
+# ---------------- Proceso de Streamlit ----------------
+@contextmanager
+def proceso_compartido():
+    # AppTest supone una sola ejecución a la vez: en cada run() crea y luego
+    # borra un Runtime global, recompila el script y parchea la config. Con
+    # sesiones en hilos eso falla ("Runtime hasn't been created!"). Aquí todas
+    # las sesiones comparten un Runtime simulado y una ScriptCache, como las
+    # sesiones de un mismo `streamlit run`: el script se compila una vez.
+    from streamlit.runtime import Runtime
+    from streamlit.testing.v1 import app_test, local_script_runner
+    from streamlit.testing.v1.util import patch_config_options
+
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = app_test.MediaFileManager(app_test.MemoryMediaFileStorage("/mock/media"))
+    runtime.dataframe_source_mgr = app_test.DataframeSourceManager()
+    runtime.cache_storage_manager = app_test.MemoryCacheStorageManager()
+    runtime.bidi_component_registry = app_test.BidiComponentManager()
+    cache_script = app_test.ScriptCache()
+
+    # app_test asigna y borra _instance en esta subclase; Runtime.instance()
+    # sigue viendo el compartido
+    class _RuntimeLocal(Runtime):
+        pass
+
+    originales = (app_test.Runtime, app_test.ScriptCache, app_test.patch_config_options,
+                  local_script_runner.ScriptCache)
+    Runtime._instance = runtime
+    app_test.Runtime = _RuntimeLocal
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: cache_script
+    app_test.patch_config_options = lambda opciones: nullcontext()
+    try:
+        with patch_config_options({"global.appTest": True}):
+            yield
+    finally:
+        (app_test.Runtime, app_test.ScriptCache, app_test.patch_config_options,
+         local_script_runner.ScriptCache) = originales
+        Runtime._instance = None
+
+
+# ---------------- Sesión ----------------
+def _por_etiqueta(widgets, etiqueta):
+    for w in widgets:
+        if w.label == etiqueta:
+            return w
+    raise LookupError(f"no se encontró el widget {etiqueta!r}")
+
+
+class Sesion:
+
+    def __init__(self, archivos, semilla, api_key="mock"):
+        from streamlit.testing.v1 import AppTest
+
+        self.at = AppTest.from_file(str(APP), default_timeout=TIMEOUT_RERUN_S)
+        self.archivos = archivos
+        self.api_key = api_key
+        self.rng = np.random.default_rng(semilla)
+        self.pestana = None
+        self.latencias = []   # (acción, segundos)
+        self.errores = []
+
+    def _paso(self, accion, rerun):
+        # AppTest no devuelve el estado de st.tabs como lo hace el navegador:
+        # la pestaña abierta se vuelve a fijar antes de cada rerun
+        if self.pestana:
+            self.at.session_state["pestana"] = self.pestana
+        inicio = time.perf_counter()
+        rerun()
+        self.latencias.append((accion, time.perf_counter() - inicio))
+        if self.at.exception:
+            self.errores.append(f"{accion}: {self.at.exception[0].message}")
+
+    def recorrer(self):
+        at = self.at
+        self._paso("inicio", at.run)
+
+        for widget, nombre in zip(at.file_uploader, ARCHIVOS):
+            widget.set_value((f"{nombre}.csv", self.archivos[nombre], "text/csv"))
+        at.text_input[0].input(self.api_key)
+        self._paso("limpieza", _por_etiqueta(at.button, "🧹 Ejecutar Limpieza").click().run)
+
+        # Rango de fechas distinto por sesión: también varía el prompt de IA
+        slider = _por_etiqueta(at.slider, "📅 Rango de fechas")
+        inicio, fin = slider.value
+        dias = (fin - inicio).days
+        desde = inicio + (fin - inicio) * float(self.rng.uniform(0, 0.4))
+        hasta = fin - (fin - inicio) * float(self.rng.uniform(0, 0.4))
+        if dias > 1 and desde < hasta:
+            self._paso("fechas", slider.set_range(desde, hasta).run)
+
+        bodegas = _por_etiqueta(at.multiselect, "Bodega de Origen")
+        if len(bodegas.value) > 1:
+            quitar = bodegas.value[int(self.rng.integers(len(bodegas.value)))]
+            self._paso("bodegas", bodegas.unselect(quitar).run)
+
+        self.pestana = "⚙️ Operaciones"
+        self._paso("pestana_operaciones", at.run)
+
+        eje_x = _por_etiqueta(at.selectbox, "Eje X")
+        otras = [o for o in eje_x.options if o != eje_x.value]
+        if otras:
+            self._paso("eje_x", eje_x.select(otras[int(self.rng.integers(len(otras)))]).run)
+
+        self.pestana = "🤖 Insights IA"
+        self._paso("pestana_ia", at.run)
+        self._paso("ia_pedido", _por_etiqueta(at.button, "🧠 Analizar con IA").click().run)
+
+        # El fragmento consulta el resultado cada segundo; aquí se hace a mano
+        limite = time.monotonic() + ESPERA_IA_S
+        while not any("Insights Ejecutivos" in m.value for m in at.markdown):
+            if time.monotonic() > limite:
+                self.errores.append(f"ia: sin respuesta en {ESPERA_IA_S} s")
+                break
+            time.sleep(0.1)
+            self._paso("ia_consulta", at.run)
+        return self
+
+
+# ---------------- Niveles de carga ----------------
+def _percentiles(valores):
+    if not valores:
+        return {f"p{p}_s": None for p in PERCENTILES}
+    return {f"p{p}_s": round(float(np.percentile(valores, p)), 4) for p in PERCENTILES}
+
+
+def _en_frio(dir_cache):
+    from ai_analysis import _cache
+    from shared_store import almacen_compartido, almacen_figuras
+
+    almacen_compartido().vaciar()
+    almacen_figuras().vaciar()
+    _cache.clear()
+    shutil.rmtree(dir_cache, ignore_errors=True)
+
+
+def correr_nivel(n_sesiones, archivos, semilla=0, dir_cache=None):
+    # dir_cache: cache de limpieza a vaciar antes del nivel (None = en caliente)
+    if dir_cache is not None:
+        _en_frio(dir_cache)
+    sesiones = [Sesion(archivos, semilla * 100_000 + n_sesiones * 1_000 + i) for i in range(n_sesiones)]
+
+    with proceso_compartido(), MuestreoRecursos() as recursos, ThreadPoolExecutor(n_sesiones) as pool:
+        fallidas = [f.exception() for f in [pool.submit(s.recorrer) for s in sesiones]]
+
+    latencias = [d for s in sesiones for _, d in s.latencias]
+    por_accion = {}
+    for s in sesiones:
+        for accion, d in s.latencias:
+            por_accion.setdefault(accion, []).append(d)
+    errores = [e for s in sesiones for e in s.errores]
+    errores += [f"{type(e).__name__}: {e}" for e in fallidas if e is not None]
+
+    cpu_total = recursos.cpu_s + recursos.cpu_hijos_s
+    return {
+        "sesiones": n_sesiones,
+        "reruns": len(latencias),
+        "latencia": _percentiles(latencias) | {"max_s": round(max(latencias), 4) if latencias else None},
+        "por_accion": {a: _percentiles(v) | {"n": len(v)} for a, v in por_accion.items()},
+        "pared_s": round(recursos.pared_s, 3),
+        "rss_pico_mb": round(recursos.pico_mb, 1),
+        "cpu_s": round(recursos.cpu_s, 3),
+        "cpu_hijos_s": round(recursos.cpu_hijos_s, 3),
+        "cpu_por_sesion_s": round(cpu_total / n_sesiones, 3),
+        "cpu_pct": round(100 * cpu_total / recursos.pared_s, 1) if recursos.pared_s else None,
+        "errores": errores,
+    }
+
+
+# ---------------- Regresiones ----------------
+def comparar(actual, base, tolerancia):
+    # Niveles cuyo p95 supera (1 + tolerancia) veces el de la base
+    from benchmarks.run_benchmarks import RUIDO_S
+
+    regresiones = []
+    for nivel, res in actual["niveles"].items():
+        antes = base.get("niveles", {}).get(nivel, {}).get("latencia", {}).get("p95_s")
+        ahora = res["latencia"]["p95_s"]
+        if antes is None or ahora is None:
+            continue
+        if ahora > antes * (1 + tolerancia) and ahora - antes > RUIDO_S:
+            regresiones.append({
+                "sesiones": int(nivel),
+                "base_p95_s": antes,
+                "actual_p95_s": ahora,
+                "cambio_pct": round((ahora / antes - 1) * 100, 1) if antes else None,
+            })
+    return regresiones
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga del dashboard con sesiones concurrentes.")
+    parser.add_argument("--sesiones", type=int, nargs="+", default=[1, 5, 10],
+                        help="Sesiones concurrentes por nivel (p. ej. 1 5 10 20)")
+    parser.add_argument("--transacciones", type=int, default=100_000, help="Tamaño de los CSV generados")
+    parser.add_argument("--datos", help="Directorio con inventario.csv, transacciones.csv y feedback.csv "
+                                        "(si no existen se generan ahí)")
+    parser.add_argument("--latencia-ia", type=float, default=0.5, help="Segundos por respuesta del mock de Groq")
+    parser.add_argument("--caliente", action="store_true",
+                        help="No vaciar almacenes ni cache de limpieza entre niveles")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--salida", default="resultados_carga.json", help="JSON de resultados")
+    parser.add_argument("--comparar", help="JSON de una corrida anterior")
+    parser.add_argument("--tolerancia", type=float, default=0.25,
+                        help="Aumento relativo de p95 permitido antes de marcar regresión")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="techlog-carga-") as tmp:
+        dir_cache = Path(tmp) / "cache"
+        os.environ["TECHLOG_CACHE_DIR"] = str(dir_cache)
+        # Sin los avisos que Streamlit repite en cada rerun
+        for nombre in ("streamlit.deprecation_util", "streamlit.runtime.scriptrunner_utils.script_run_context"):
+            logging.getLogger(nombre).disabled = True
+        from benchmarks.run_benchmarks import entorno
+
+        servidor = mock_groq.iniciar(latencia=args.latencia_ia)
+        os.environ["GROQ_BASE_URL"] = servidor.url
+
+        dir_datos = Path(args.datos or Path(tmp) / "datos")
+        if not (dir_datos / "feedback.csv").exists():
+            generar(args.transacciones, dir_datos, args.semilla)
+        archivos = {n: (dir_datos / f"{n}.csv").read_bytes() for n in ARCHIVOS}
+
+        resultados = {"entorno": entorno(), "transacciones": args.transacciones, "niveles": {}}
+        for n in args.sesiones:
+            peticiones = servidor.peticiones
+            res = correr_nivel(n, archivos, args.semilla, None if args.caliente else dir_cache)
+            res["peticiones_ia"] = servidor.peticiones - peticiones
+            resultados["niveles"][str(n)] = res
+            lat = res["latencia"]
+            print(f"{n:>4} sesiones  p50 {lat['p50_s']:.3f} s  p95 {lat['p95_s']:.3f} s  "
+                  f"p99 {lat['p99_s']:.3f} s  RSS {res['rss_pico_mb']:,.0f} MB  "
+                  f"CPU {res['cpu_por_sesion_s']:.2f} s/sesión ({res['cpu_pct']:.0f}%)  "
+                  f"errores {len(res['errores'])}", flush=True)
+            for e in res["errores"][:5]:
+                print(f"       {e}")
+        servidor.shutdown()
+
+    codigo = 0
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            base = json.load(f)
+        resultados["regresiones"] = comparar(resultados, base, args.tolerancia)
+        for r in resultados["regresiones"]:
+            print(f"REGRESIÓN {r['sesiones']} sesiones: p95 {r['base_p95_s']:.3f} s -> {r['actual_p95_s']:.3f} s")
+        codigo = 1 if resultados["regresiones"] else 0
+
+    with open(args.salida, "w", encoding="utf-8") as f:
+        json.dump(resultados, f, ensure_ascii=False, indent=2)
+    return codigo
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Generador de datos sintéticos "sucios" con el mismo esquema y los mismos
+# patrones de error que los extractos reales:
+#   inventario    -> categorías con variantes (smart-phone / laptop, nulos),
+#                    costos de 0.01 a 850k y ceros, stock negativo, lead
+#                    times nulos, SKUs repetidos con revisiones distintas
+#   transacciones -> ~18% de SKUs fantasma, entregas de 999 días,
+#                    cantidades negativas, ciudades con grafías mezcladas
+#                    ("MED", "Medellín", "bog"...), fechas inválidas
+#   feedback      -> edades de 195 años, ratings fuera de 1-5, "---" como
+#                    comentario, Sí/si/yes/1 mezclados, filas duplicadas
+#
+# Se escribe por bloques, así que escala a decenas de millones de filas sin
+# tener el archivo completo en memoria.
+#
+#   python -m benchmarks.generar_datos --transacciones 1000000 --salida datos/
+
+FILAS_POR_BLOQUE = 1_000_000
+
+CATEGORIAS = ["laptops", "Laptop", "monitores", "Monitores ", "smartphones", "Smart-Phone",
+              "tablets", "TABLETS", "accesorios", "Accesorios"]
+BODEGAS = ["norte", "Norte", "sur", " Sur", "bod-ext-99", "zona_franca", "Zona_Franca", "occidente"]
+CIUDADES = ["ventas_web", "bog", "BOG", "bogota", "Bogotá", "cali", "Cali ", "bucaramanga",
+            "medellin", "Medellín", "med", "MED", "barranquilla"]
+ESTADOS = ["Retrasado", "Entregado", "Devuelto", "En Camino", "Perdido"]
+CANALES = ["Físico", "Online", "WhatsApp", "App"]
+COMENTARIOS = ["Excelente", "Lento", "Dañado", "No volvería", "Precio justo", "---"]
+SI_NO = ["Sí", "si", "yes", "1", "No", "no", "0"]
+
+PRIMER_SKU = 1000
+PRIMERA_TRX = 10000
+PRIMER_FB = 8000
+
+
+def _con_nulos(valores, rng, fraccion):
+    valores = np.asarray(valores, dtype=object)
+    valores[rng.random(len(valores)) < fraccion] = None
+    return valores
+
+
+def _fechas(rng, n, inicio, fin):
+    dias = (pd.Timestamp(fin) - pd.Timestamp(inicio)).days
+    return (pd.Timestamp(inicio) + pd.to_timedelta(rng.integers(0, dias, n), unit="D")).strftime("%Y-%m-%d")
+
+
+def n_skus(n_transacciones):
+    return max(2500, n_transacciones // 4)
+
+
+# ---------------- Inventario ----------------
+def generar_inventario(n_skus, rng):
+    ids = PRIMER_SKU + np.arange(n_skus)
+    # ~5% de SKUs con una segunda revisión (duplicado por SKU)
+    repetidos = rng.choice(ids, n_skus // 20, replace=False)
+    ids = np.concatenate([ids, repetidos])
+    n = len(ids)
+
+    sku = pd.Series(ids.astype(str)).radd("PROD-")
+    ruido = rng.random(n) < 0.05
+    sku[ruido] = " " + sku[ruido].str.lower() + " "
+
+    costo = np.round(rng.lognormal(6.5, 0.6, n), 2)
+    costo[rng.random(n) < 0.01] = 0.0
+    costo[rng.random(n) < 0.002] = 850000.0
+    costo[rng.random(n) < 0.002] = 0.01
+
+    stock = rng.integers(0, 2000, n).astype(float)
+    stock[rng.random(n) < 0.02] = -50
+    stock[rng.random(n) < 0.04] = np.nan
+
+    lead = rng.integers(3, 11, n).astype(float)
+    lead[rng.random(n) < 0.5] = np.nan
+
+    return pd.DataFrame({
+        "SKU_ID": sku,
+        "Categoria": _con_nulos(rng.choice(CATEGORIAS, n), rng, 0.12),
+        "Stock_Actual": stock,
+        "Costo_Unitario_USD": costo,
+        "Punto_Reorden": rng.integers(100, 300, n),
+        "Lead_Time_Dias": lead,
+        "Bodega_Origen": rng.choice(BODEGAS, n),
+        "Ultima_Revision": _fechas(rng, n, "2024-03-04", "2026-01-31"),
+    })
+
+
+# ---------------- Transacciones ----------------
+def generar_transacciones(inicio, n, n_skus, rng):
+    ids = PRIMERA_TRX + inicio + np.arange(n)
+
+    # ~18% de ventas de SKUs que no existen en el inventario
+    sku = PRIMER_SKU + rng.integers(0, n_skus, n)
+    fantasma = rng.random(n) < 0.18
+    sku[fantasma] = PRIMER_SKU + n_skus + rng.integers(0, max(1, n_skus // 6), fantasma.sum())
+
+    fechas = pd.Series(_fechas(rng, n, "2024-09-23", "2026-02-04"))
+    fechas[rng.random(n) < 0.002] = "fecha-invalida"
+
+    cantidad = rng.integers(1, 15, n)
+    cantidad[rng.random(n) < 0.01] = -5
+
+    entrega = rng.integers(1, 30, n)
+    entrega[rng.random(n) < 0.005] = 999
+
+    envio = np.round(rng.uniform(5, 100, n), 2)
+    envio[rng.random(n) < 0.08] = np.nan
+
+    return pd.DataFrame({
+        "Transaccion_ID": pd.Series(ids.astype(str)).radd("TRX-"),
+        "SKU_ID": pd.Series(sku.astype(str)).radd("PROD-"),
+        "Fecha_Venta": fechas,
+        "Cantidad_Vendida": cantidad,
+        "Precio_Venta_Final": np.round(rng.uniform(10, 2000, n), 2),
+        "Costo_Envio": envio,
+        "Tiempo_Entrega_Real": entrega,
+        "Estado_Envio": _con_nulos(rng.choice(ESTADOS, n), rng, 0.17),
+        "Ciudad_Destino": rng.choice(CIUDADES, n),
+        "Canal_Venta": rng.choice(CANALES, n),
+    })
+
+
+# ---------------- Feedback ----------------
+def generar_feedback(inicio_fb, n, n_transacciones, rng):
+    ids = PRIMER_FB + inicio_fb + np.arange(n)
+    trx = PRIMERA_TRX + rng.integers(0, n_transacciones, n)
+
+    rating_p = rng.integers(1, 6, n).astype(float)
+    rating_p[rng.random(n) < 0.02] = 0
+    rating_l = rng.integers(1, 6, n).astype(float)
+    rating_l[rng.random(n) < 0.02] = 6
+
+    edad = rng.integers(18, 85, n).astype(float)
+    edad[rng.random(n) < 0.01] = 195
+    edad[rng.random(n) < 0.1] = np.nan
+
+    df = pd.DataFrame({
+        "Feedback_ID": pd.Series(ids.astype(str)).radd("FB-"),
+        "Transaccion_ID": pd.Series(trx.astype(str)).radd("TRX-"),
+        "Rating_Producto": rating_p,
+        "Rating_Logistica": rating_l,
+        "Comentario_Texto": _con_nulos(rng.choice(COMENTARIOS, n), rng, 0.2),
+        "Recomienda_Marca": _con_nulos(rng.choice(SI_NO, n), rng, 0.45),
+        "Ticket_Soporte_Abierto": _con_nulos(rng.choice(SI_NO, n), rng, 0.1),
+        "Edad_Cliente": edad,
+        "Satisfaccion_NPS": np.round(rng.uniform(-100, 100, n), 1),
+    })
+    # ~5% de filas duplicadas de forma exacta
+    return pd.concat([df, df.sample(frac=0.05, random_state=int(rng.integers(1 << 31)))],
+                     ignore_index=True)
+
+
+# ---------------- Escritura ----------------
+def generar(n_transacciones, dir_salida, semilla=0, filas_por_bloque=FILAS_POR_BLOQUE):
+    dir_salida = Path(dir_salida)
+    dir_salida.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(semilla)
+    skus = n_skus(n_transacciones)
+
+    rutas = {
+        "inventario": dir_salida / "inventario.csv",
+        "transacciones": dir_salida / "transacciones.csv",
+        "feedback": dir_salida / "feedback.csv",
+    }
+
+    generar_inventario(skus, rng).to_csv(rutas["inventario"], index=False)
+
+    n_fb = int(n_transacciones * 0.4)
+    for inicio in range(0, n_transacciones, filas_por_bloque):
+        n = min(filas_por_bloque, n_transacciones - inicio)
+        primero = inicio == 0
+        generar_transacciones(inicio, n, skus, rng).to_csv(
+            rutas["transacciones"], index=False, mode="w" if primero else "a", header=primero
+        )
+        inicio_fb = int(inicio * 0.4)
+        generar_feedback(inicio_fb, int(n * 0.4), n_transacciones, rng).to_csv(
+            rutas["feedback"], index=False, mode="w" if primero else "a", header=primero
+        )
+
+    return {n: str(r) for n, r in rutas.items()} | {"transacciones_filas": n_transacciones,
+                                                    "feedback_filas_aprox": int(n_fb * 1.05)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera datasets sintéticos sucios.")
+    parser.add_argument("--transacciones", type=int, default=1_000_000)
+    parser.add_argument("--salida", required=True)
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args(argv)
+    print(generar(args.transacciones, args.salida, args.semilla))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Servidor HTTP local que imita el endpoint de chat completions de Groq
+# (OpenAI-compatible). Sirve para probar ai_analysis sin red ni tokens:
+#
+#   python -m benchmarks.mock_groq --puerto 8765 --latencia 0.5
+#   GROQ_BASE_URL=http://127.0.0.1:8765 streamlit run app.py
+#
+# --fallos N responde 503 a las primeras N peticiones (para ver los
+# reintentos del cliente).
+
+
+class ServidorMock(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, direccion, latencia=0.0, fallos=0):
+        super().__init__(direccion, _Manejador)
+        self.latencia = latencia
+        self.fallos = fallos
+        self.peticiones = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, puerto = self.server_address[:2]
+        return f"http://{host}:{puerto}"
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _responder(self, estado, cuerpo):
+        datos = json.dumps(cuerpo).encode()
+        self.send_response(estado)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def do_POST(self):
+        largo = int(self.headers.get("Content-Length", 0))
+        pedido = json.loads(self.rfile.read(largo) or b"{}")
+
+        with self.server._lock:
+            self.server.peticiones += 1
+            numero = self.server.peticiones
+        if numero <= self.server.fallos:
+            self._responder(503, {"error": {"message": "mock: no disponible"}})
+            return
+
+        time.sleep(self.server.latencia)
+        if not self.path.endswith("/chat/completions"):
+            self._responder(404, {"error": {"message": f"mock: ruta {self.path}"}})
+            return
+
+        self._responder(200, {
+            "id": f"mock-{numero}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": pedido.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": f"**Diagnóstico (mock #{numero})**"},
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        })
+
+
+def iniciar(puerto=0, latencia=0.0, fallos=0):
+    # Arranca el servidor en un hilo; puerto=0 elige uno libre
+    servidor = ServidorMock(("127.0.0.1", puerto), latencia, fallos)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mock local del endpoint de Groq.")
+    parser.add_argument("--puerto", type=int, default=8765)
+    parser.add_argument("--latencia", type=float, default=0.0, help="Segundos por respuesta")
+    parser.add_argument("--fallos", type=int, default=0, help="Primeras N peticiones con 503")
+    args = parser.parse_args(argv)
+    servidor = ServidorMock(("127.0.0.1", args.puerto), args.latencia, args.fallos)
+    print(f"Mock de Groq en {servidor.url}")
+    servidor.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import nullcontext
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from benchmarks.carga import INTERVALO_MUESTREO_S, _rss_mb
+from benchmarks.generar_datos import generar
+from charts import estadisticos_por_grupo, muestreo_estratificado, PRESUPUESTO_PUNTOS
+from correlation import matriz_correlaciones
+from data_processing import clean_inventario, clean_transacciones, clean_feedback
+from filter_index import IndiceFiltros
+from ingestion import leer_dataset
+from integration import construir_master
+from kpi_cube import CuboKPI
+from profiler import reporte_auditoria
+from query_plan import Consulta, FuentesMaestra
+from text_index import CuboSentimiento, IndiceComentarios
+
+# Benchmarks de escalamiento del pipeline sobre datos sintéticos.
+# Para cada escala (número de transacciones) genera los tres CSV y mide
+# cada etapa: tiempo (mejor de N repeticiones) y pico de memoria asignada
+# (tracemalloc, en una corrida aparte para no sesgar el tiempo).
+# tracemalloc solo ve las asignaciones de Python/numpy: las del pool de
+# Arrow (lectores, to_pandas, Parquet) se miden aparte, igual que el pico
+# de RSS, con un hilo que muestrea durante las corridas cronometradas.
+# El resultado es un JSON; con --comparar se contrasta contra uno anterior
+# y el proceso termina con código 1 si alguna etapa se volvió más lenta
+# que la tolerancia.
+#
+#   python -m benchmarks.run_benchmarks --escalas 100000 1000000 \
+#       --salida resultados.json --comparar base.json --tolerancia 0.25
+
+# Diferencias por debajo de esto se consideran ruido
+RUIDO_S = 0.05
+
+COLUMNAS_NUMERICAS = [
+    "Tiempo_Entrega_Limpio", "Brecha_Entrega", "Margen_Utilidad", "Ingreso",
+    "Satisfaccion_NPS", "Rating_Logistica", "Rating_Producto",
+]
+
+
+# ---------------- Etapas ----------------
+# Cada etapa recibe el contexto (dict) y guarda ahí lo que usan las siguientes
+def _ingesta(ctx):
+    for nombre in ("inventario", "transacciones", "feedback"):
+        ctx[f"{nombre}_raw"] = pd.read_csv(ctx["rutas"][nombre])
+
+
+def _ingesta_arrow(ctx):
+    # Lector tipado de ingestion.py; la limpieza sigue con estos crudos
+    for nombre in ("inventario", "transacciones", "feedback"):
+        ctx[f"{nombre}_raw"] = leer_dataset(nombre, ctx["rutas"][nombre])[0]
+
+
+def _limpieza(nombre, fn):
+    def etapa(ctx):
+        ctx[nombre] = fn(ctx[f"{nombre}_raw"])
+    return etapa
+
+
+def _master(ctx):
+    ctx["master"] = construir_master(ctx["transacciones"], ctx["inventario"], ctx["feedback"])
+
+
+def _filtros_de(indice):
+    # Selección típica: ~un tercio del rango de fechas, dos bodegas, todo lo demás
+    bodegas = indice.valores("Bodega_Origen")[:2]
+    return {
+        "Bodega_Origen": bodegas,
+        "Ciudad_Destino_Limpia": indice.valores("Ciudad_Destino_Limpia"),
+        "Canal_Venta": indice.valores("Canal_Venta"),
+    }
+
+
+def _rango_de(indice):
+    inicio, fin = indice.fecha_min(), indice.fecha_max()
+    return fin - (fin - inicio) / 3, fin
+
+
+def _indice(ctx):
+    ctx["indice"] = IndiceFiltros(ctx["master"])
+
+
+def _filtro(ctx):
+    indice = ctx["indice"]
+    ctx["df_f"] = indice.filtrar(*_rango_de(indice), _filtros_de(indice))
+
+
+def _kpis(ctx):
+    indice = ctx["indice"]
+    cubo = CuboKPI(ctx["master"])
+    rango, filtros = _rango_de(indice), _filtros_de(indice)
+    cubo.totales(*rango, filtros)
+    cubo.por_bodega(*rango, filtros)
+
+
+def _comentarios(ctx):
+    indice = ctx["indice"]
+    ctx["comentarios"] = IndiceComentarios(indice.df["Comentario_Texto"])
+    CuboSentimiento(indice.df, ctx["comentarios"].sentimiento())
+
+
+def _busqueda(ctx):
+    # Palabra y frase dentro de la selección típica, más su resumen
+    indice, comentarios = ctx["indice"], ctx["comentarios"]
+    pos = indice.posiciones(*_rango_de(indice), _filtros_de(indice))
+    for consulta in ("excelente", '"no volveria"'):
+        comentarios.resumen(comentarios.buscar(consulta, pos))
+
+
+def _fuentes(ctx):
+    ctx["fuentes"] = FuentesMaestra(ctx["transacciones"], ctx["inventario"], ctx["feedback"])
+
+
+def _consulta(motor, columnas=None):
+    # Mismo filtro que _filtro, resuelto con pushdown sobre las fuentes
+    # limpias en vez de sobre la maestra ya construida
+    def etapa(ctx):
+        indice = ctx["indice"]
+        consulta = Consulta(ctx["fuentes"]).filtrar(*_rango_de(indice), _filtros_de(indice))
+        if columnas is not None:
+            consulta = consulta.seleccionar(columnas)
+        consulta.ejecutar(motor)
+    return etapa
+
+
+def _graficos(ctx):
+    df_f = ctx["df_f"]
+    estadisticos_por_grupo(df_f, "Tiempo_Entrega_Limpio", "Satisfaccion_NPS", "Canal_Venta")
+    matriz_correlaciones(df_f, COLUMNAS_NUMERICAS)
+    if len(df_f) > PRESUPUESTO_PUNTOS:
+        muestreo_estratificado(df_f, "Canal_Venta", PRESUPUESTO_PUNTOS)
+
+
+def _reportes(ctx):
+    for nombre in ("inventario", "transacciones", "feedback"):
+        reporte_auditoria(ctx[f"{nombre}_raw"], ctx[nombre])
+
+
+ETAPAS = [
+    ("ingesta_csv", _ingesta),
+    ("ingesta_arrow", _ingesta_arrow),
+    ("clean_inventario", _limpieza("inventario", clean_inventario)),
+    ("clean_transacciones", _limpieza("transacciones", clean_transacciones)),
+    ("clean_feedback", _limpieza("feedback", clean_feedback)),
+    ("master", _master),
+    ("indice_filtros", _indice),
+    ("filtro", _filtro),
+    ("kpis", _kpis),
+    ("indice_comentarios", _comentarios),
+    ("busqueda_comentarios", _busqueda),
+    ("consulta_fuentes", _fuentes),
+    ("consulta_pandas", _consulta("pandas")),
+    ("consulta_arrow", _consulta("arrow")),
+    ("consulta_kpis_podada", _consulta("pandas", ["Ingreso", "Margen_Utilidad", "Tiempo_Entrega_Limpio"])),
+    ("graficos", _graficos),
+    ("reporte_salud", _reportes),
+]
+
+
+# ---------------- Medición ----------------
+class PicoMemoria:
+    # Pico del pool de Arrow (sobre lo asignado al entrar) y pico de RSS
+    # entre __enter__ y __exit__, muestreados en un hilo
+
+    def __init__(self, intervalo=INTERVALO_MUESTREO_S):
+        self.intervalo = intervalo
+        self.pool = pa.default_memory_pool()
+        self._parar = threading.Event()
+
+    def _muestrear(self):
+        while not self._parar.is_set():
+            self._arrow = max(self._arrow, self.pool.bytes_allocated())
+            self.rss_mb = max(self.rss_mb, _rss_mb())
+            self._parar.wait(self.intervalo)
+
+    def __enter__(self):
+        self._base = self._arrow = self.pool.bytes_allocated()
+        self._max_previo = self.pool.max_memory()
+        self.rss_mb = _rss_mb()
+        self._hilo = threading.Thread(target=self._muestrear, daemon=True)
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._parar.set()
+        self._hilo.join()
+        # max_memory() es exacto pero histórico: solo vale si esta etapa
+        # superó el pico de todo lo anterior; si no, queda lo muestreado
+        if self.pool.max_memory() > self._max_previo:
+            self._arrow = max(self._arrow, self.pool.max_memory())
+        self.arrow_mb = (self._arrow - self._base) / 2**20
+        return False
+
+
+def medir(fn, ctx, repeticiones=1, memoria=True):
+    tiempos = []
+    pico_arrow = pico_rss = 0.0
+    for _ in range(repeticiones):
+        with PicoMemoria() if memoria else nullcontext() as picos:
+            inicio = time.perf_counter()
+            fn(ctx)
+            tiempos.append(time.perf_counter() - inicio)
+        if memoria:
+            pico_arrow = max(pico_arrow, picos.arrow_mb)
+            pico_rss = max(pico_rss, picos.rss_mb)
+
+    resultado = {"tiempo_s": round(min(tiempos), 4)}
+    if memoria:
+        resultado["pico_arrow_mb"] = round(pico_arrow, 1)
+        resultado["rss_pico_mb"] = round(pico_rss, 1)
+        tracemalloc.start()
+        try:
+            fn(ctx)
+            _, pico = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        resultado["pico_mb"] = round(pico / 2**20, 1)
+    return resultado
+
+
+def _rss_max_mb():
+    # ru_maxrss está en KiB en Linux y en bytes en macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+def correr_escala(n_transacciones, dir_datos, repeticiones=1, memoria=True, semilla=0):
+    dir_escala = Path(dir_datos) / f"tx-{n_transacciones}-s{semilla}"
+    if not (dir_escala / "feedback.csv").exists():
+        generar(n_transacciones, dir_escala, semilla)
+
+    ctx = {"rutas": {n: dir_escala / f"{n}.csv" for n in ("inventario", "transacciones", "feedback")}}
+    etapas = {}
+    for nombre, fn in ETAPAS:
+        etapas[nombre] = medir(fn, ctx, repeticiones, memoria)
+        print(f"  {nombre:<22} {etapas[nombre]['tiempo_s']:>9.3f} s"
+              + (f" {etapas[nombre]['pico_mb']:>9.1f} MB  Arrow {etapas[nombre]['pico_arrow_mb']:>9.1f} MB"
+                 f"  RSS {etapas[nombre]['rss_pico_mb']:>9.1f} MB" if memoria else ""), flush=True)
+
+    return {
+        "filas": {n: int(len(ctx[n])) for n in ("inventario", "transacciones", "feedback", "master")}
+                 | {"filtradas": int(len(ctx["df_f"]))},
+        "etapas": etapas,
+        "tiempo_total_s": round(sum(e["tiempo_s"] for e in etapas.values()), 4),
+        "rss_max_mb": _rss_max_mb(),
+    }
+
+
+def entorno():
+    return {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+# ---------------- Regresiones ----------------
+def comparar(actual, base, tolerancia):
+    # Devuelve las etapas que tardan más de (1 + tolerancia) veces la base
+    regresiones = []
+    for escala, res in actual["escalas"].items():
+        etapas_base = base.get("escalas", {}).get(escala, {}).get("etapas", {})
+        for etapa, medida in res["etapas"].items():
+            if etapa not in etapas_base:
+                continue
+            antes, ahora = etapas_base[etapa]["tiempo_s"], medida["tiempo_s"]
+            if ahora > antes * (1 + tolerancia) and ahora - antes > RUIDO_S:
+                regresiones.append({
+                    "escala": escala,
+                    "etapa": etapa,
+                    "base_s": antes,
+                    "actual_s": ahora,
+                    "cambio_pct": round((ahora / antes - 1) * 100, 1) if antes else None,
+                })
+    return regresiones
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks de escalamiento del pipeline.")
+    parser.add_argument("--escalas", type=int, nargs="+", default=[100_000, 1_000_000],
+                        help="Número de transacciones por escala (p. ej. 1000000 10000000 50000000)")
+    parser.add_argument("--salida", default="resultados_benchmark.json", help="JSON de resultados")
+    parser.add_argument("--datos", help="Directorio para los CSV generados (se reutilizan)")
+    parser.add_argument("--repeticiones", type=int, default=1, help="Se reporta el mejor tiempo")
+    parser.add_argument("--sin-memoria", action="store_true", help="No medir memoria (más rápido)")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--comparar", help="JSON de una corrida anterior")
+    parser.add_argument("--tolerancia", type=float, default=0.25,
+                        help="Aumento relativo de tiempo permitido antes de marcar regresión")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="techlog-bench-") as tmp:
+        dir_datos = args.datos or tmp
+        resultados = {"entorno": entorno(), "escalas": {}}
+        for escala in args.escalas:
+            print(f"{escala:,} transacciones", flush=True)
+            resultados["escalas"][str(escala)] = correr_escala(
+                escala, dir_datos, args.repeticiones, not args.sin_memoria, args.semilla
+            )
+
+    codigo = 0
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            base = json.load(f)
+        resultados["regresiones"] = comparar(resultados, base, args.tolerancia)
+        for r in resultados["regresiones"]:
+            print(f"REGRESIÓN {r['escala']} {r['etapa']}: {r['base_s']:.3f} s -> {r['actual_s']:.3f} s")
+        codigo = 1 if resultados["regresiones"] else 0
+
+    with open(args.salida, "w", encoding="utf-8") as f:
+        json.dump(resultados, f, ensure_ascii=False, indent=2)
+    return codigo
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+import os
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+# Gráficos de dispersión escalables.
+#
+# Modo según el número de puntos (n) y el presupuesto:
+#   n <= presupuesto          -> scatter normal (SVG), todos los puntos
+#   n <= 4 * presupuesto      -> scatter WebGL, todos los puntos
+#   n >  4 * presupuesto      -> scatter WebGL con muestreo estratificado por
+#                                grupo de color (cada grupo conserva su peso)
+#   modo="densidad"           -> mapa de densidad con bins calculados en el
+#                                servidor (al navegador solo viajan los bins)
+#
+# La recta OLS y la correlación de Pearson se calculan siempre con TODAS las
+# filas, a partir de estadísticos suficientes por grupo (n, medias, sumas de
+# cuadrados centradas), sin ajustar un modelo de statsmodels.
+
+PRESUPUESTO_PUNTOS = int(os.environ.get("TECHLOG_PRESUPUESTO_PUNTOS", 50_000))
+FACTOR_WEBGL = 4
+BINS_DENSIDAD = 60
+
+
+# ---------------- Estadísticos suficientes ----------------
+class EstadisticosOLS:
+    # Acumulador combinable (fórmulas de Chan et al.) para y ~ x
+
+    def __init__(self, n=0, media_x=0.0, media_y=0.0, m2x=0.0, m2y=0.0, cxy=0.0,
+                 min_x=np.inf, max_x=-np.inf):
+        self.n = n
+        self.media_x = media_x
+        self.media_y = media_y
+        self.m2x = m2x
+        self.m2y = m2y
+        self.cxy = cxy
+        self.min_x = min_x
+        self.max_x = max_x
+
+    @classmethod
+    def de_arrays(cls, x, y):
+        x = np.asarray(x, dtype="float64")
+        y = np.asarray(y, dtype="float64")
+        ok = ~(np.isnan(x) | np.isnan(y))
+        x, y = x[ok], y[ok]
+        if len(x) == 0:
+            return cls()
+        dx, dy = x - x.mean(), y - y.mean()
+        return cls(len(x), x.mean(), y.mean(), (dx * dx).sum(), (dy * dy).sum(),
+                   (dx * dy).sum(), x.min(), x.max())
+
+    def combinar(self, otro):
+        if otro.n == 0:
+            return self
+        if self.n == 0:
+            return otro
+        n = self.n + otro.n
+        dx = otro.media_x - self.media_x
+        dy = otro.media_y - self.media_y
+        factor = self.n * otro.n / n
+        return EstadisticosOLS(
+            n,
+            self.media_x + dx * otro.n / n,
+            self.media_y + dy * otro.n / n,
+            self.m2x + otro.m2x + dx * dx * factor,
+            self.m2y + otro.m2y + dy * dy * factor,
+            self.cxy + otro.cxy + dx * dy * factor,
+            min(self.min_x, otro.min_x),
+            max(self.max_x, otro.max_x),
+        )
+
+    @property
+    def pendiente(self):
+        return self.cxy / self.m2x if self.m2x > 0 else np.nan
+
+    @property
+    def intercepto(self):
+        return self.media_y - self.pendiente * self.media_x
+
+    @property
+    def r(self):
+        denominador = np.sqrt(self.m2x * self.m2y)
+        return self.cxy / denominador if denominador > 0 else np.nan
+
+
+def estadisticos_por_grupo(df, x, y, grupo):
+    d = pd.DataFrame({
+        "x": df[x].astype("float64"),
+        "y": df[y].astype("float64"),
+        "g": df[grupo],
+    }).dropna()
+    if d.empty:
+        return {}
+
+    g = d.groupby("g", observed=True)
+    dx = d["x"] - g["x"].transform("mean")
+    dy = d["y"] - g["y"].transform("mean")
+    sumas = (
+        pd.DataFrame({"g": d["g"], "xx": dx * dx, "yy": dy * dy, "xy": dx * dy})
+        .groupby("g", observed=True)
+        .sum()
+    )
+    resumen = g.agg(n=("x", "size"), mx=("x", "mean"), my=("y", "mean"),
+                    lo=("x", "min"), hi=("x", "max")).join(sumas)
+
+    return {
+        valor: EstadisticosOLS(int(f.n), f.mx, f.my, f.xx, f.yy, f.xy, f.lo, f.hi)
+        for valor, f in resumen.iterrows()
+    }
+
+
+# ---------------- Reducción de puntos ----------------
+def muestreo_estratificado(df, grupo, presupuesto, semilla=0):
+    # Cada grupo conserva su proporción (al menos una fila por grupo)
+    fraccion = presupuesto / len(df)
+    rng = np.random.default_rng(semilla)
+    barajado = df.iloc[rng.permutation(len(df))]
+    cuota = (
+        barajado.groupby(grupo, observed=True, dropna=False)[grupo]
+        .transform("size")
+        .mul(fraccion)
+        .round()
+        .clip(lower=1)
+    )
+    rango = barajado.groupby(grupo, observed=True, dropna=False).cumcount()
+    return barajado[rango < cuota]
+
+
+def _densidad(df, x, y, titulo, labels):
+    d = df[[x, y]].astype("float64").dropna()
+    conteos, bordes_x, bordes_y = np.histogram2d(d[x], d[y], bins=BINS_DENSIDAD)
+    centros_x = (bordes_x[:-1] + bordes_x[1:]) / 2
+    centros_y = (bordes_y[:-1] + bordes_y[1:]) / 2
+
+    fig = go.Figure(go.Heatmap(
+        x=centros_x, y=centros_y, z=np.where(conteos.T > 0, conteos.T, np.nan),
+        colorscale="Blues", colorbar_title="Filas"
+    ))
+    fig.update_layout(
+        title=titulo,
+        xaxis_title=labels.get(x, x),
+        yaxis_title=labels.get(y, y)
+    )
+    return fig
+
+
+def _agregar_tendencias(fig, estadisticos):
+    # Una recta por grupo, del mismo color que sus puntos
+    for traza in list(fig.data):
+        est = estadisticos.get(traza.name)
+        if est is None or np.isnan(est.pendiente):
+            continue
+        xs = np.array([est.min_x, est.max_x])
+        fig.add_trace(go.Scatter(
+            x=xs, y=est.intercepto + est.pendiente * xs,
+            mode="lines",
+            line=dict(color=traza.marker.color),
+            legendgroup=traza.legendgroup,
+            showlegend=False,
+            hovertemplate=f"y = {est.pendiente:.4g}·x + {est.intercepto:.4g}<extra>{traza.name}</extra>"
+        ))
+
+
+# ---------------- Gráfico ----------------
+def grafico_dispersion(df, x, y, color, titulo, hover_data=None, labels=None,
+                       opacity=0.6, tendencia=False, modo="auto",
+                       presupuesto=PRESUPUESTO_PUNTOS):
+    labels = labels or {}
+
+    if modo == "densidad":
+        return _densidad(df, x, y, titulo, labels)
+
+    n = len(df)
+    datos = df
+    render_mode = "svg"
+    if n > presupuesto:
+        render_mode = "webgl"
+    if n > FACTOR_WEBGL * presupuesto:
+        datos = muestreo_estratificado(df, color, FACTOR_WEBGL * presupuesto)
+        titulo = f"{titulo} (muestra de {len(datos):,} de {n:,} filas)"
+
+    fig = px.scatter(
+        datos,
+        x=x,
+        y=y,
+        color=color,
+        hover_data=hover_data,
+        labels=labels,
+        opacity=opacity,
+        render_mode=render_mode,
+        title=titulo
+    )
+
+    if tendencia:
+        # Las rectas se ajustan con todas las filas, no con la muestra
+        _agregar_tendencias(fig, estadisticos_por_grupo(df, x, y, color))
+
+    return fig
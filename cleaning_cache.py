@@ -0,0 +1,100 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import uuid
+from pathlib import Path
+
+import pandas as pd
+
+from data_processing import VERSION_LIMPIEZA
+from ingestion import leer_dataset
+from profiler import reporte_auditoria
+from schema import validar_esquema
+
+# Cache en disco de los datasets limpios.
+# La clave es el hash del contenido del archivo subido + la versión del
+# código de limpieza: si el archivo es idéntico no se vuelve a limpiar.
+DIR_CACHE = Path(os.environ.get("TECHLOG_CACHE_DIR", ".cache_limpieza"))
+
+logger = logging.getLogger("techlog.cache")
+
+
+def hash_contenido(datos):
+    return hashlib.sha256(datos).hexdigest()
+
+
+def clave_cache(nombre, datos):
+    return f"{nombre}-v{VERSION_LIMPIEZA}-{hash_contenido(datos)[:32]}"
+
+
+def _json_default(x):
+    # numpy escalares (int64, float64, bool_) → tipos nativos
+    if hasattr(x, "item"):
+        return x.item()
+    raise TypeError(f"Tipo no serializable: {type(x)}")
+
+
+# ---------------- Lectura / escritura ----------------
+def cargar_de_cache(clave, nombre=None):
+    ruta = DIR_CACHE / clave
+    if not (ruta / "reporte.json").exists():
+        return None
+
+    try:
+        df_raw = pd.read_parquet(ruta / "raw.parquet")
+        df_clean = pd.read_parquet(ruta / "clean.parquet")
+        with open(ruta / "reporte.json", encoding="utf-8") as f:
+            reporte = json.load(f)
+        if nombre is not None:
+            validar_esquema(df_clean, nombre)
+    except Exception:
+        # Entrada corrupta o incompleta: se trata como un fallo de cache
+        shutil.rmtree(ruta, ignore_errors=True)
+        return None
+
+    return df_raw, df_clean, reporte
+
+
+def guardar_en_cache(clave, df_raw, df_clean, reporte):
+    ruta = DIR_CACHE / clave
+    tmp = DIR_CACHE / f".tmp-{clave}-{uuid.uuid4().hex[:8]}"
+    tmp.mkdir(parents=True, exist_ok=True)
+
+    try:
+        df_raw.to_parquet(tmp / "raw.parquet", index=False)
+        df_clean.to_parquet(tmp / "clean.parquet", index=False)
+        # reporte.json se escribe al final: marca la entrada como completa
+        with open(tmp / "reporte.json", "w", encoding="utf-8") as f:
+            json.dump(reporte, f, ensure_ascii=False, default=_json_default)
+        os.replace(tmp, ruta)
+    except Exception:
+        # La limpieza sigue funcionando sin cache, pero el fallo se registra:
+        # si no, el mismo archivo fallaría la cache en cada subida sin aviso.
+        logger.warning("No se pudo guardar %s en la cache", clave, exc_info=True)
+        shutil.rmtree(tmp, ignore_errors=True)
+        return False
+
+    return True
+
+
+# ---------------- Limpieza con cache ----------------
+def limpiar_con_cache(nombre, datos, fn_limpieza):
+    clave = clave_cache(nombre, datos)
+
+    cacheado = cargar_de_cache(clave, nombre)
+    if cacheado is not None:
+        df_raw, df_clean, reporte = cacheado
+        return {"raw": df_raw, "clean": df_clean, "reporte": reporte,
+                "clave": clave, "hit": True}
+
+    df_raw, ingesta = leer_dataset(nombre, datos)
+    df_clean = fn_limpieza(df_raw)
+    reporte = reporte_auditoria(df_raw, df_clean)
+    reporte["Ingesta"] = ingesta
+
+    guardar_en_cache(clave, df_raw, df_clean, reporte)
+
+    return {"raw": df_raw, "clean": df_clean, "reporte": reporte,
+            "clave": clave, "hit": False}
@@ -0,0 +1,55 @@
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Matriz de correlaciones de Pearson entre todas las variables numéricas en
+# una sola pasada vectorizada (pairwise-complete: cada par usa las filas en
+# las que ambas variables tienen valor, igual que DataFrame.corr).
+# Se cachea por estado de filtros: cambiar los ejes es solo una búsqueda.
+
+MAX_ESTADOS = 32
+
+
+def matriz_correlaciones(df, columnas):
+    X = df[columnas].to_numpy(dtype="float64", na_value=np.nan)
+    presente = ~np.isnan(X)
+    M = presente.astype("float64")
+
+    # centrar por la media de cada columna no cambia r y evita cancelaciones
+    medias = np.where(presente, X, 0.0).sum(axis=0) / np.maximum(presente.sum(axis=0), 1)
+    Xz = np.where(presente, X - medias, 0.0)
+
+    n = M.T @ M                      # filas con ambas variables
+    sx = Xz.T @ M                    # sx[i, j] = suma de x_i donde x_j existe
+    sxx = (Xz * Xz).T @ M
+    sxy = Xz.T @ Xz
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cov = sxy - sx * sx.T / n
+        var_i = sxx - sx * sx / n
+        r = cov / np.sqrt(var_i * var_i.T)
+
+    r[n < 2] = np.nan
+    r = np.clip(r, -1, 1)
+    return pd.DataFrame(r, index=columnas, columns=columnas)
+
+
+class MotorCorrelaciones:
+
+    def __init__(self, max_estados=MAX_ESTADOS):
+        self._matrices = OrderedDict()
+        self.max_estados = max_estados
+
+    def matriz(self, df, columnas, estado):
+        # estado: clave hashable del filtro aplicado (fechas + selecciones)
+        clave = (estado, tuple(columnas))
+        if clave in self._matrices:
+            self._matrices.move_to_end(clave)
+            return self._matrices[clave]
+
+        matriz = matriz_correlaciones(df, list(columnas))
+        self._matrices[clave] = matriz
+        if len(self._matrices) > self.max_estados:
+            self._matrices.popitem(last=False)
+        return matriz
@@ -1,47 +1,28 @@
 import pandas as pd
 import numpy as np
-import unicodedata
+from normalization import norm, normalizar_serie, mapear_alias, ALIAS_CIUDADES
+from schema import aplicar_esquema
+from profiler import perfilar, resumen_desde_perfiles
+from instrumentation import instrumentar
 
-def norm(x):
-    if pd.isna(x):
-        return x
-    x = str(x).strip().lower()
-    return unicodedata.normalize("NFKD", x).encode("ascii","ignore").decode("utf-8")
+# Subir cuando cambie la lógica de limpieza: invalida la cache en disco
+VERSION_LIMPIEZA = "6"
 
 # -------------------------------------------
 #Resumen limpieza
+# Sale de los perfiles de una pasada (profiler.py): nulos, duplicados y
+# filas eliminadas sin recorrer el DataFrame varias veces.
+@instrumentar()
 def resumen_limpieza(df_raw, df_clean):
-    filas_iniciales = len(df_raw)
-    filas_finales = len(df_clean)
-    filas_eliminadas = filas_iniciales - filas_finales
-
-    duplicados = df_raw.duplicated().sum()
-    pct_nulos = df_clean.isna().mean().mean() * 100
-
-    salud = max(
-        0,
-        100 - (
-            pct_nulos * 0.4 +
-            (duplicados / max(1, filas_iniciales)) * 100 * 0.3 +
-            (filas_eliminadas / max(1, filas_iniciales)) * 100 * 0.3
-        )
-    )
-
-    return {
-        "Filas iniciales": filas_iniciales,
-        "Filas finales": filas_finales,
-        "Filas eliminadas": filas_eliminadas,
-        "Duplicados": duplicados,
-        "Salud de datos (%)": round(salud, 1)
-    }
+    return resumen_desde_perfiles(perfilar(df_raw), perfilar(df_clean))
 
 # ---------------- Inventario ----------------
-def clean_inventario(df_raw):
+def _preparar_inventario(df_raw):
     df = df_raw.copy()
 
     df["SKU_ID"] = df["SKU_ID"].str.strip().str.upper()
-    df["Categoria"] = df["Categoria"].apply(norm)
-    df["Bodega_Origen"] = df["Bodega_Origen"].apply(norm)
+    df["Categoria"] = normalizar_serie(df["Categoria"])
+    df["Bodega_Origen"] = normalizar_serie(df["Bodega_Origen"])
 
     for c in ["Stock_Actual","Costo_Unitario_USD","Lead_Time_Dias","Punto_Reorden"]:
         df[c] = pd.to_numeric(df[c], errors="coerce")
@@ -50,53 +31,107 @@ def clean_inventario(df_raw):
     df["stock_negativo"] = df["Stock_Actual"] < 0
 
     df["Costo_Unitario_USD"] = df["Costo_Unitario_USD"].replace(0, np.nan)
+    return df
+
+
+def _medianas_por_grupo(df, grupo, columna):
+    medianas = df.groupby(grupo, observed=True)[columna].median().dropna()
+    return {str(k): float(v) for k, v in medianas.items()}
+
+
+def _estadisticos_inventario(df):
+    return {
+        "costo_por_categoria": _medianas_por_grupo(df, "Categoria", "Costo_Unitario_USD"),
+        "costo_global": float(df["Costo_Unitario_USD"].median()),
+        "lead_time_por_bodega": _medianas_por_grupo(df, "Bodega_Origen", "Lead_Time_Dias"),
+        "lead_time_global": float(df["Lead_Time_Dias"].median()),
+    }
+
+
+def estadisticos_inventario(df_raw):
+    # Medianas que usa la imputación de clean_inventario, para guardarlas y
+    # limpiar lotes posteriores con los mismos valores
+    return _estadisticos_inventario(_preparar_inventario(df_raw))
+
+
+def _imputar(serie, grupo, medianas):
+    return serie.fillna(grupo.map(medianas).astype("float64"))
+
+
+# estadisticos: salida de estadisticos_inventario() de un ajuste anterior
+# (si no se pasa, las medianas salen de df_raw)
+@instrumentar()
+def clean_inventario(df_raw, estadisticos=None):
+    df = _preparar_inventario(df_raw)
+    est = estadisticos or _estadisticos_inventario(df)
+
     df["Costo_Unitario_Limpio"] = (
-        df["Costo_Unitario_USD"]
-        .fillna(df.groupby("Categoria")["Costo_Unitario_USD"].transform("median"))
-        .fillna(df["Costo_Unitario_USD"].median())
+        _imputar(df["Costo_Unitario_USD"], df["Categoria"], est["costo_por_categoria"])
+        .fillna(est["costo_global"])
     )
 
     df["Lead_Time_Limpio"] = (
-        df["Lead_Time_Dias"]
-        .replace(0, np.nan)
-        .fillna(df.groupby("Bodega_Origen")["Lead_Time_Dias"].transform("median"))
-        .fillna(df["Lead_Time_Dias"].median())
+        _imputar(df["Lead_Time_Dias"].replace(0, np.nan), df["Bodega_Origen"], est["lead_time_por_bodega"])
+        .fillna(est["lead_time_global"])
     )
 
-    return df.sort_values("Ultima_Revision").drop_duplicates("SKU_ID", keep="last")
+    df = df.sort_values("Ultima_Revision").drop_duplicates("SKU_ID", keep="last")
+    return aplicar_esquema(df, "inventario")
 
 # ---------------- Transacciones ----------------
-def clean_transacciones(df_raw):
+LIMITES_ENTREGA = (0, 180)
+
+
+# limites_entrega: (mínimo, máximo) del recorte de Tiempo_Entrega_Real; por
+# defecto LIMITES_ENTREGA (p. ej. sketches.BosquejosLimpieza.limites_entrega())
+@instrumentar()
+def clean_transacciones(df_raw, alias_ciudades=None, limites_entrega=None):
     df = df_raw.copy()
 
     df["SKU_ID"] = df["SKU_ID"].str.strip().str.upper()
-    df["Ciudad_Destino"] = df["Ciudad_Destino"].apply(norm)
+    df["Ciudad_Destino"] = normalizar_serie(df["Ciudad_Destino"])
 
     for c in ["Cantidad_Vendida","Precio_Venta_Final","Costo_Envio","Tiempo_Entrega_Real"]:
         df[c] = pd.to_numeric(df[c], errors="coerce")
 
     df["Fecha_Venta"] = pd.to_datetime(df["Fecha_Venta"], errors="coerce")
-    df["Tiempo_Entrega_Limpio"] = df["Tiempo_Entrega_Real"].clip(0,180)
+    df["Tiempo_Entrega_Limpio"] = df["Tiempo_Entrega_Real"].clip(*(limites_entrega or LIMITES_ENTREGA))
 
-    ciudades = {
-        "med":"Medellín","medellin":"Medellín",
-        "bog":"Bogotá","bogota":"Bogotá"
-    }
-    df["Ciudad_Destino_Limpia"] = df["Ciudad_Destino"].map(ciudades).fillna(df["Ciudad_Destino"].str.title())
+    df["Ciudad_Destino_Limpia"] = mapear_alias(df["Ciudad_Destino"], alias_ciudades or ALIAS_CIUDADES)
 
-    return df
+    return aplicar_esquema(df, "transacciones")
 
 # ---------------- Feedback ----------------
-def clean_feedback(df_raw):
+COLUMNAS_RATING = ["Rating_Producto", "Rating_Logistica"]
+
+
+def _preparar_feedback(df_raw):
     df = df_raw.drop_duplicates().copy()
 
     df["Edad_Cliente"] = pd.to_numeric(df["Edad_Cliente"], errors="coerce")
     df.loc[(df["Edad_Cliente"] < 0) | (df["Edad_Cliente"] > 100), "Edad_Cliente"] = np.nan
 
-    for c in ["Rating_Producto","Rating_Logistica"]:
+    for c in COLUMNAS_RATING:
         df[c] = pd.to_numeric(df[c], errors="coerce")
         df.loc[(df[c] < 1) | (df[c] > 5), c] = np.nan
-        df[c] = df[c].fillna(df[c].median())
+    return df
+
+
+def medianas_feedback(df_raw):
+    df = _preparar_feedback(df_raw)
+    return {c: float(df[c].median()) for c in COLUMNAS_RATING}
+
+
+# medianas: {"Rating_Producto": x, "Rating_Logistica": y} calculadas fuera
+# (sobre el archivo completo cuando se limpia por bloques, o guardadas de
+# un ajuste anterior cuando se agregan lotes nuevos)
+@instrumentar()
+def clean_feedback(df_raw, medianas=None):
+    df = _preparar_feedback(df_raw)
+
+    for c in COLUMNAS_RATING:
+        mediana = df[c].median() if medianas is None else medianas[c]
+        df[c] = df[c].fillna(mediana)
 
     map_sn = {"si":"Sí","sí":"Sí","yes":"Sí","1":"Sí","no":"No","0":"No"}
     df["Ticket_Soporte_Abierto"] = df["Ticket_Soporte_Abierto"].str.lower().str.strip().map(map_sn)
@@ -105,4 +140,20 @@ def clean_feedback(df_raw):
     df["Satisfaccion_NPS"] = pd.to_numeric(df["Satisfaccion_NPS"], errors="coerce")
     df["Comentario_Texto"] = df["Comentario_Texto"].replace("---", np.nan)
 
-    return df
+    return aplicar_esquema(df, "feedback")
+
+# ---------------- Trazabilidad ----------------
+# Posición en df_raw de cada fila que devuelve clean_<nombre>(df_raw), en
+# el mismo orden (replica solo los pasos que quitan o reordenan filas)
+def filas_origen(nombre, df_raw):
+    if nombre == "transacciones":
+        return np.arange(len(df_raw))
+    if nombre == "feedback":
+        return np.flatnonzero(~df_raw.duplicated().to_numpy())
+    if nombre == "inventario":
+        claves = pd.DataFrame({
+            "SKU_ID": df_raw["SKU_ID"].str.strip().str.upper().to_numpy(),
+            "Ultima_Revision": pd.to_datetime(df_raw["Ultima_Revision"], errors="coerce").to_numpy(),
+        })
+        return claves.sort_values("Ultima_Revision").drop_duplicates("SKU_ID", keep="last").index.to_numpy()
+    raise ValueError(f"Dataset desconocido: {nombre}")
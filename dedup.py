@@ -0,0 +1,275 @@
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Deduplicación entre lotes y bloques con memoria acotada.
+# En vez de guardar las filas ya vistas se guarda una huella de 64 bits
+# por fila (8 bytes, sin importar lo ancha que sea la fila):
+#   - AlmacenHuellas: duplicados exactos. Arreglo ordenado de huellas en
+#     disco (.npy, se abre con memory-map) y, opcional, un filtro de Bloom
+#     delante (~1.2 bytes por fila con 1% de falsos positivos): las filas
+#     que el Bloom descarta, que en un lote nuevo son casi todas, no tocan
+#     el arreglo; los positivos se confirman con búsqueda binaria, así que
+#     el resultado es exacto.
+#   - RegistroVersiones: deduplicación por clave con "gana la última": por
+#     cada huella de clave (p. ej. SKU_ID) la versión más reciente vista
+#     (p. ej. Ultima_Revision), 16 bytes por clave.
+# Las huellas salen de filas normalizadas: columnas en orden alfabético,
+# numéricas como float64 (4 y 4.0 son la misma fila aunque un bloque se
+# haya leído como entero y otro como decimal) y el resto como texto. Con
+# 64 bits la probabilidad de colisión es despreciable (~n² / 2^65).
+
+# Subir si cambia la normalización: las huellas guardadas dejan de servir
+VERSION_HUELLAS = 1
+TASA_FALSOS_POSITIVOS = 0.01
+# Versión de las filas sin versión (fecha nula): nunca pierden ni ganan
+SIN_VERSION = np.iinfo(np.int64).min
+
+
+# ---------------- Huellas ----------------
+def normalizar(df):
+    columnas = {}
+    for col in sorted(df.columns):
+        serie = df[col]
+        if pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+            columnas[col] = serie.to_numpy(dtype="float64", na_value=np.nan)
+        else:
+            columnas[col] = serie.astype("string")
+    return pd.DataFrame(columnas, index=df.index)
+
+
+def huellas_filas(df, columnas=None):
+    # Hash de 64 bits del contenido de cada fila (o de las columnas dadas)
+    if columnas is not None:
+        df = df[list(columnas)]
+    return pd.util.hash_pandas_object(normalizar(df), index=False).to_numpy()
+
+
+def primeras_apariciones(huellas):
+    # Máscara de la primera fila de cada huella (como drop_duplicates keep="first")
+    _, primeras = np.unique(huellas, return_index=True)
+    mascara = np.zeros(len(huellas), dtype=bool)
+    mascara[primeras] = True
+    return mascara
+
+
+def _guardar_npy(ruta, arreglo):
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    tmp = ruta.with_name(ruta.stem + ".tmp.npy")
+    np.save(tmp, arreglo)
+    os.replace(tmp, ruta)
+
+
+# ---------------- Filtro de Bloom ----------------
+class FiltroBloom:
+
+    def __init__(self, capacidad, tasa_fp=TASA_FALSOS_POSITIVOS, bits=None, k=None):
+        capacidad = max(int(capacidad), 1024)
+        m = int(np.ceil(-capacidad * np.log(tasa_fp) / np.log(2) ** 2))
+        self.m = (m + 7) // 8 * 8
+        self.k = k or max(1, int(round(self.m / capacidad * np.log(2))))
+        self.capacidad = capacidad
+        self.tasa_fp = tasa_fp
+        self.bits = np.zeros(self.m // 8, dtype=np.uint8) if bits is None else bits
+
+    def _posiciones(self, huellas):
+        # Doble hash (Kirsch-Mitzenmacher): h1 + i*h2 sobre las dos mitades
+        h = np.asarray(huellas, dtype=np.uint64)
+        h1 = h & np.uint64(0xFFFFFFFF)
+        h2 = (h >> np.uint64(32)) | np.uint64(1)
+        i = np.arange(self.k, dtype=np.uint64)
+        return (h1[:, None] + i[None, :] * h2[:, None]) % np.uint64(self.m)
+
+    def agregar(self, huellas):
+        pos = self._posiciones(huellas).ravel()
+        np.bitwise_or.at(self.bits, pos >> np.uint64(3), np.left_shift(1, pos & np.uint64(7)).astype(np.uint8))
+
+    def quizas_contiene(self, huellas):
+        # False = seguro que no está; True = puede estar
+        pos = self._posiciones(huellas)
+        encendidos = (self.bits[pos >> np.uint64(3)] >> (pos & np.uint64(7)).astype(np.uint8)) & 1
+        return encendidos.all(axis=1)
+
+    def guardar(self, ruta):
+        _guardar_npy(Path(ruta), np.concatenate([
+            np.array([self.capacidad, self.k], dtype=np.int64).view(np.uint8), self.bits
+        ]))
+
+    @classmethod
+    def cargar(cls, ruta, tasa_fp=TASA_FALSOS_POSITIVOS):
+        datos = np.load(ruta)
+        capacidad, k = datos[:16].view(np.int64)
+        return cls(capacidad, tasa_fp, bits=datos[16:].copy(), k=int(k))
+
+
+# ---------------- Duplicados exactos ----------------
+class AlmacenHuellas:
+    # ruta=None: solo en memoria (p. ej. entre bloques de un mismo archivo)
+
+    def __init__(self, ruta=None, bloom=False, tasa_fp=TASA_FALSOS_POSITIVOS):
+        self.ruta = Path(ruta) if ruta is not None else None
+        self.usar_bloom = bloom
+        self.tasa_fp = tasa_fp
+        self._huellas = None
+        self._bloom = None
+
+    @property
+    def _ruta_bloom(self):
+        return self.ruta.with_name(self.ruta.stem + ".bloom.npy")
+
+    def huellas(self):
+        if self._huellas is None:
+            if self.ruta is not None and self.ruta.exists():
+                self._huellas = np.load(self.ruta, mmap_mode="r")
+            else:
+                self._huellas = np.empty(0, dtype=np.uint64)
+        return self._huellas
+
+    def __len__(self):
+        return len(self.huellas())
+
+    def bloom(self):
+        if not self.usar_bloom:
+            return None
+        if self._bloom is None:
+            if self.ruta is not None and self._ruta_bloom.exists():
+                self._bloom = FiltroBloom.cargar(self._ruta_bloom, self.tasa_fp)
+            else:
+                self._bloom = self._reconstruir_bloom(len(self.huellas()))
+        return self._bloom
+
+    def _reconstruir_bloom(self, n):
+        bloom = FiltroBloom(2 * n, self.tasa_fp)
+        vistas = self.huellas()
+        for i in range(0, len(vistas), 1_000_000):
+            bloom.agregar(vistas[i:i + 1_000_000])
+        return bloom
+
+    def contiene(self, huellas):
+        huellas = np.asarray(huellas, dtype=np.uint64)
+        vistas = self.huellas()
+        resultado = np.zeros(len(huellas), dtype=bool)
+        if len(vistas) == 0 or len(huellas) == 0:
+            return resultado
+
+        candidatas = np.arange(len(huellas))
+        bloom = self.bloom()
+        if bloom is not None:
+            candidatas = candidatas[bloom.quizas_contiene(huellas)]
+        # confirmación exacta sobre el arreglo ordenado
+        h = huellas[candidatas]
+        pos = np.minimum(np.searchsorted(vistas, h), len(vistas) - 1)
+        resultado[candidatas] = vistas[pos] == h
+        return resultado
+
+    def nuevas(self, huellas):
+        # Filas no vistas antes ni repetidas dentro del propio lote
+        return primeras_apariciones(huellas) & ~self.contiene(huellas)
+
+    def registrar(self, huellas):
+        huellas = np.unique(np.asarray(huellas, dtype=np.uint64))
+        vistas = self.huellas()
+        self._huellas = np.union1d(vistas, huellas)
+
+        bloom = self.bloom()
+        if bloom is not None:
+            if len(self._huellas) > bloom.capacidad:
+                # lleno: se rehace con el doble de capacidad
+                self._bloom = self._reconstruir_bloom(len(self._huellas))
+            else:
+                bloom.agregar(huellas)
+
+        if self.ruta is not None:
+            _guardar_npy(self.ruta, self._huellas)
+            if self._bloom is not None:
+                self._bloom.guardar(self._ruta_bloom)
+            self._huellas = np.load(self.ruta, mmap_mode="r")
+
+    def mover(self, ruta):
+        # Los registros siguientes se guardan en otra ruta; las huellas
+        # vigentes quedan cargadas (incremental.py prepara así cada lote)
+        self.huellas()
+        self.bloom()
+        self.ruta = Path(ruta)
+
+    def filtrar(self, df, columnas=None):
+        # Devuelve (filas nuevas, huellas de esas filas); no registra nada
+        huellas = huellas_filas(df, columnas)
+        mascara = self.nuevas(huellas)
+        return df[mascara], huellas[mascara]
+
+    def reiniciar(self, huellas=None):
+        self._huellas = np.empty(0, dtype=np.uint64)
+        self._bloom = None
+        if self.ruta is not None:
+            for ruta in (self.ruta, self._ruta_bloom):
+                ruta.unlink(missing_ok=True)
+        if huellas is not None and len(huellas):
+            self.registrar(huellas)
+
+
+# ---------------- Por clave (gana la última) ----------------
+def _versiones(serie):
+    fechas = pd.to_datetime(serie, errors="coerce")
+    valores = fechas.to_numpy(dtype="datetime64[ns]").astype(np.int64)
+    valores[fechas.isna().to_numpy()] = SIN_VERSION
+    return valores
+
+
+class RegistroVersiones:
+
+    def __init__(self, ruta=None):
+        self.ruta = Path(ruta) if ruta is not None else None
+        self._claves = None
+        self._versiones = None
+
+    def _cargar(self):
+        if self._claves is None:
+            if self.ruta is not None and self.ruta.exists():
+                datos = np.load(self.ruta)
+                self._claves, self._versiones = datos[0].view(np.uint64), datos[1]
+            else:
+                self._claves = np.empty(0, dtype=np.uint64)
+                self._versiones = np.empty(0, dtype=np.int64)
+        return self._claves, self._versiones
+
+    def __len__(self):
+        return len(self._cargar()[0])
+
+    def vigentes(self, df, columnas_clave, columna_version):
+        # Filas que no pierden contra lo ya registrado: clave nueva, versión
+        # igual o más reciente (a igual versión gana el lote más nuevo) o
+        # sin versión. Dentro del lote no se deduplica: eso lo hace la limpieza.
+        claves = huellas_filas(df, columnas_clave)
+        versiones = _versiones(df[columna_version])
+        registradas, actuales = self._cargar()
+        if len(registradas) == 0:
+            return np.ones(len(df), dtype=bool)
+
+        pos = np.minimum(np.searchsorted(registradas, claves), len(registradas) - 1)
+        vista = registradas[pos] == claves
+        return ~vista | (versiones == SIN_VERSION) | (versiones >= actuales[pos])
+
+    def registrar(self, df, columnas_clave, columna_version):
+        claves = np.concatenate([self._cargar()[0], huellas_filas(df, columnas_clave)])
+        versiones = np.concatenate([self._versiones, _versiones(df[columna_version])])
+        # por clave, la versión máxima
+        orden = np.lexsort((versiones, claves))
+        claves, versiones = claves[orden], versiones[orden]
+        ultima = np.append(claves[1:] != claves[:-1], True)
+        self._claves, self._versiones = claves[ultima], versiones[ultima]
+
+        if self.ruta is not None:
+            _guardar_npy(self.ruta, np.stack([self._claves.view(np.int64), self._versiones]))
+
+    def mover(self, ruta):
+        # Como AlmacenHuellas.mover
+        self._cargar()
+        self.ruta = Path(ruta)
+
+    def reiniciar(self):
+        self._claves = self._versiones = None
+        if self.ruta is not None:
+            self.ruta.unlink(missing_ok=True)
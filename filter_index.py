@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+
+# Índice de filtros de la tabla maestra. Se construye una vez por maestra:
+#   - la tabla se ordena por Fecha_Venta, así un rango de fechas es un
+#     slice contiguo que se encuentra con búsqueda binaria; la maestra ya
+#     sale ordenada de integration.py y se usa tal cual, sin copiarla;
+#   - por cada valor de bodega / ciudad / canal se guarda un bitmap de
+#     filas (np.packbits, 1 bit por fila).
+# Resolver un filtro solo toca los bytes del rango de fechas elegido, así
+# que el costo depende del tamaño de la selección y no del de la tabla.
+
+COLUMNAS_FILTRO = ("Bodega_Origen", "Ciudad_Destino_Limpia", "Canal_Venta")
+
+
+class IndiceFiltros:
+
+    def __init__(self, df_master, columnas=COLUMNAS_FILTRO):
+        orden = np.argsort(df_master["Fecha_Venta"].to_numpy(), kind="stable")
+        # copia propia solo si la tabla no venía ordenada
+        self.propia = not np.array_equal(orden, np.arange(len(orden)))
+        if self.propia:
+            self.df = df_master.iloc[orden].reset_index(drop=True)
+        else:
+            self.df = df_master.reset_index(drop=True)
+        self.fechas = self.df["Fecha_Venta"].to_numpy()
+        self.n = len(self.df)
+
+        self.bitmaps = {}
+        self.con_nulos = {}
+        for col in columnas:
+            codigos, valores = pd.factorize(self.df[col])
+            self.bitmaps[col] = {
+                valor: np.packbits(codigos == i) for i, valor in enumerate(valores)
+            }
+            self.con_nulos[col] = bool((codigos == -1).any())
+
+    @property
+    def nbytes(self):
+        bitmaps = sum(b.nbytes for valores in self.bitmaps.values() for b in valores.values())
+        if not self.propia:
+            return bitmaps
+        return int(self.df.memory_usage(index=True, deep=True).sum()) + bitmaps
+
+    def fecha_min(self):
+        return self.df["Fecha_Venta"].iloc[0]
+
+    def fecha_max(self):
+        return self.df["Fecha_Venta"].iloc[-1]
+
+    def valores(self, col):
+        return sorted(self.bitmaps[col])
+
+    # ---------------- Resolución ----------------
+    def rango_fechas(self, fecha_inicio, fecha_fin):
+        # Equivale a between(fecha_inicio, fecha_fin), ambos extremos incluidos
+        inicio = pd.Timestamp(fecha_inicio).to_datetime64().astype(self.fechas.dtype)
+        fin = pd.Timestamp(fecha_fin).to_datetime64().astype(self.fechas.dtype)
+        i = int(np.searchsorted(self.fechas, inicio, side="left"))
+        j = int(np.searchsorted(self.fechas, fin, side="right"))
+        return i, max(i, j)
+
+    def _mascara(self, col, seleccion, i, j):
+        # OR de los bitmaps seleccionados, solo sobre los bytes del rango [i, j)
+        b0, b1 = i // 8, (j + 7) // 8
+        acumulado = np.zeros(b1 - b0, dtype=np.uint8)
+        for valor in seleccion:
+            bitmap = self.bitmaps[col].get(valor)
+            if bitmap is not None:
+                acumulado |= bitmap[b0:b1]
+        bits = np.unpackbits(acumulado)
+        return bits[i - b0 * 8: j - b0 * 8].astype(bool)
+
+    def _completa(self, col, seleccion):
+        # Seleccionar todos los valores sin nulos en la columna = sin filtro
+        return not self.con_nulos[col] and set(self.bitmaps[col]) <= set(seleccion)
+
+    def posiciones(self, fecha_inicio, fecha_fin, filtros):
+        # filtros: {columna: valores seleccionados}.
+        # Devuelve un slice (sin copia) o un array de posiciones.
+        i, j = self.rango_fechas(fecha_inicio, fecha_fin)
+
+        mascara = None
+        for col, seleccion in filtros.items():
+            if self._completa(col, seleccion):
+                continue
+            m = self._mascara(col, seleccion, i, j)
+            mascara = m if mascara is None else mascara & m
+
+        if mascara is None:
+            return slice(i, j)
+        return i + np.flatnonzero(mascara)
+
+    def filtrar(self, fecha_inicio, fecha_fin, filtros):
+        return self.filas(self.posiciones(fecha_inicio, fecha_fin, filtros))
+
+    def filas(self, pos):
+        if isinstance(pos, slice):
+            return self.df.iloc[pos]
+        return self.df.take(pos)
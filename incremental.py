@@ -0,0 +1,562 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+from data_processing import (
+    VERSION_LIMPIEZA, clean_inventario, clean_transacciones, clean_feedback,
+    estadisticos_inventario, medianas_feedback,
+)
+from dedup import VERSION_HUELLAS, AlmacenHuellas, RegistroVersiones
+from ingestion import leer_dataset
+from kpi_cube import CuboKPI
+from integration import construir_master
+from normalization import ALIAS_CIUDADES
+from parallel import concatenar_partes
+from schema import clave_sustituta, clave_es_canonica
+from sketches import BosquejosLimpieza
+from text_index import SIN_CATEGORIA, IndiceComentarios
+
+# Ingesta incremental (modo append) sobre un almacén en disco.
+# Un ajuste completo guarda los estadísticos de la limpieza (medianas de
+# costo por categoría y de lead time por bodega, medianas de ratings, mapa
+# de alias de ciudades) y las marcas de agua; cada lote posterior:
+#   - transacciones: solo entran filas por encima de la marca de agua
+#     (Transaccion_Key; para IDs no canónicos, Fecha_Venta);
+#   - feedback: solo filas cuyo contenido no se vio antes (huellas de 64
+#     bits de cada fila cruda en un AlmacenHuellas, ver dedup.py);
+#   - inventario: los SKUs nuevos o revisados reemplazan a los guardados
+#     (se conserva la Ultima_Revision más reciente); las revisiones más
+#     viejas que la registrada para su SKU se descartan sin limpiarlas;
+#   - se limpian con los estadísticos guardados, sin recalcularlos;
+#   - la maestra solo se reconstruye para las transacciones afectadas
+#     (nuevas, con feedback nuevo o con un SKU revisado).
+# reajustar() vuelve a limpiar todo desde los lotes crudos guardados y
+# recalcula los estadísticos: es el único paso que recorre la historia.
+# Cada lote suma además sus filas crudas a bosquejos de cuantiles
+# (sketches.py); actualizar_estadisticos() renueva las medianas guardadas
+# desde ellos, con toda la historia y sin releerla (aproximadas, ver las
+# cotas en sketches.py). Los lotes siguientes se limpian con las nuevas.
+# El índice invertido de los comentarios de feedback (text_index.py) sigue
+# el orden de las partes de limpio/feedback; cada lote solo le agrega sus
+# filas y tokeniza los textos que no había visto. buscar_comentarios()
+# responde palabras y frases con sentimiento y conteo por categoría.
+# El cubo de KPIs (kpi_cube.py) se mantiene igual: las filas de la maestra
+# que se reescriben restan sus celdas y las reconstruidas las suman.
+# Cada lote es atómico: agregar() escribe todo (crudos, limpios, partes de
+# la maestra, huellas, versiones, bosquejos, índice, cubo y estado) bajo
+# .lote-NNNNN/ con las mismas rutas relativas, lo marca CONFIRMADO y recién
+# entonces mueve cada archivo a su lugar, estado.json el último. Al abrir
+# el almacén, un lote sin confirmar (falló o se cortó) se descarta y uno
+# confirmado a medio mover se completa.
+#
+# Estructura:
+#   estado.json                      estadísticos, marcas, número de lote
+#   crudo/<dataset>/lote-NNNNN.parquet
+#   limpio/inventario.parquet
+#   limpio/<transacciones|feedback>/parte-NNNNN.parquet
+#   master/parte-NNNNN.parquet
+#   huellas_feedback.npy             huellas de feedback (+ .bloom.npy)
+#   versiones_inventario.npy         última revisión por SKU
+#   bosquejos.json                   bosquejos de cuantiles de la historia
+#   comentarios.npz                  índice invertido de Comentario_Texto
+#   kpi.parquet                      celdas del cubo de KPIs de la maestra
+#
+#   python incremental.py --almacen almacen/ --inicializar \
+#       --inventario inv.csv --transacciones tx.csv --feedback fb.csv
+#   python incremental.py --almacen almacen/ --transacciones delta.csv
+#   python incremental.py --almacen almacen/ --reajustar
+#   python incremental.py --almacen almacen/ --actualizar-estadisticos
+#   python incremental.py --almacen almacen/ --buscar 'lento "no volveria"'
+
+DATASETS = ("inventario", "transacciones", "feedback")
+
+
+class ErrorAlmacen(ValueError):
+    pass
+
+
+# ---------------- Utilidades ----------------
+def _a_texto(df):
+    # Las columnas object (texto con nulos o tipos mezclados) se guardan como string
+    return df.astype({c: "string" for c in df.columns if df[c].dtype == object})
+
+
+def _escribir(df, ruta):
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    tmp = ruta.with_suffix(".tmp")
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, ruta)
+
+
+def _leer_partes(directorio, columnas=None):
+    partes = sorted(Path(directorio).glob("*.parquet"))
+    return [pd.read_parquet(p, columns=columnas) for p in partes]
+
+
+def _maximo(*valores):
+    # Fechas ISO o enteros; None = sin valor
+    valores = [v for v in valores if v is not None]
+    return max(valores) if valores else None
+
+
+def _unir(partes):
+    partes = [p for p in partes if len(p)]
+    if not partes:
+        return None
+    return partes[0] if len(partes) == 1 else concatenar_partes(partes)
+
+
+class AlmacenIncremental:
+
+    def __init__(self, directorio):
+        self.dir = Path(directorio)
+
+    # ---------------- Estado ----------------
+    @property
+    def _ruta_estado(self):
+        return self.dir / "estado.json"
+
+    def existe(self):
+        return self._ruta_estado.exists()
+
+    def estado(self):
+        if not self.existe():
+            raise ErrorAlmacen(f"No hay un almacén inicializado en {self.dir}")
+        self._recuperar()
+        with open(self._ruta_estado, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _guardar_estado(self, estado, ruta=None):
+        ruta = ruta or self._ruta_estado
+        tmp = ruta.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(estado, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, ruta)
+
+    # ---------------- Lote en preparación ----------------
+    def _preparacion(self, lote):
+        return self.dir / f".lote-{lote:05d}"
+
+    def _en_lote(self, lote, ruta):
+        # Dónde se prepara, dentro del lote, un archivo del almacén
+        return self._preparacion(lote) / Path(ruta).relative_to(self.dir)
+
+    def _confirmar(self, lote, estado):
+        preparacion = self._preparacion(lote)
+        self._guardar_estado(estado, preparacion / "estado.json")
+        (preparacion / "CONFIRMADO").touch()
+        self._aplicar(preparacion)
+
+    def _aplicar(self, preparacion):
+        # Idempotente: se puede repetir si se cortó a medio mover
+        for origen in sorted(preparacion.rglob("*")):
+            if origen.is_file() and origen.name not in ("CONFIRMADO", "estado.json"):
+                destino = self.dir / origen.relative_to(preparacion)
+                destino.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(origen, destino)
+        if (preparacion / "estado.json").exists():
+            os.replace(preparacion / "estado.json", self._ruta_estado)
+        shutil.rmtree(preparacion)
+
+    def _recuperar(self):
+        for preparacion in sorted(self.dir.glob(".lote-*")):
+            if (preparacion / "CONFIRMADO").exists():
+                self._aplicar(preparacion)
+            else:
+                shutil.rmtree(preparacion, ignore_errors=True)
+
+    def huellas_feedback(self):
+        return AlmacenHuellas(self.dir / "huellas_feedback.npy", bloom=True)
+
+    def versiones_inventario(self):
+        return RegistroVersiones(self.dir / "versiones_inventario.npy")
+
+    @property
+    def _ruta_bosquejos(self):
+        return self.dir / "bosquejos.json"
+
+    def bosquejos(self):
+        if not self._ruta_bosquejos.exists():
+            raise ErrorAlmacen("El almacén no tiene bosquejos de cuantiles; ejecuta reajustar().")
+        return BosquejosLimpieza.cargar(self._ruta_bosquejos)
+
+    @property
+    def _ruta_comentarios(self):
+        return self.dir / "comentarios.npz"
+
+    def comentarios(self):
+        if not self._ruta_comentarios.exists():
+            raise ErrorAlmacen("El almacén no tiene índice de comentarios; ejecuta reajustar().")
+        return IndiceComentarios.cargar(self._ruta_comentarios)
+
+    @property
+    def _ruta_cubo(self):
+        return self.dir / "kpi.parquet"
+
+    def cubo(self):
+        if not self._ruta_cubo.exists():
+            raise ErrorAlmacen("El almacén no tiene cubo de KPIs; ejecuta reajustar().")
+        return CuboKPI.cargar(self._ruta_cubo)
+
+    def _guardar_crudo(self, nombre, df_raw, lote, en_lote=False):
+        ruta = self.dir / "crudo" / nombre / f"lote-{lote:05d}.parquet"
+        _escribir(_a_texto(df_raw), self._en_lote(lote, ruta) if en_lote else ruta)
+
+    # ---------------- Lectura ----------------
+    def dataset(self, nombre):
+        if nombre == "inventario":
+            return pd.read_parquet(self.dir / "limpio" / "inventario.parquet")
+        directorio = self.dir / ("master" if nombre == "master" else f"limpio/{nombre}")
+        return _unir(_leer_partes(directorio))
+
+    def datasets(self):
+        return {n: self.dataset(n) for n in (*DATASETS, "master")}
+
+    # ---------------- Ajuste completo ----------------
+    def inicializar(self, archivos, alias_ciudades=None):
+        # archivos: {"inventario": df_raw, "transacciones": df_raw, "feedback": df_raw}
+        faltan = set(DATASETS) - set(archivos)
+        if faltan:
+            raise ErrorAlmacen(f"Para inicializar faltan: {sorted(faltan)}")
+        shutil.rmtree(self.dir, ignore_errors=True)
+        self.dir.mkdir(parents=True)
+        for nombre in DATASETS:
+            self._guardar_crudo(nombre, archivos[nombre], 1)
+        return self.reajustar(alias_ciudades, lote=1)
+
+    def reajustar(self, alias_ciudades=None, lote=None):
+        # Limpieza completa desde los lotes crudos, con estadísticos recalculados
+        if lote is None:
+            estado = self.estado()
+            lote = estado["lote"]
+            alias_ciudades = alias_ciudades or estado["estadisticos"]["alias_ciudades"]
+        alias_ciudades = alias_ciudades or ALIAS_CIUDADES
+
+        crudos = {n: _unir(_leer_partes(self.dir / "crudo" / n)) for n in DATASETS}
+        estadisticos = {
+            "inventario": estadisticos_inventario(crudos["inventario"]),
+            "feedback": medianas_feedback(crudos["feedback"]),
+            "alias_ciudades": dict(alias_ciudades),
+        }
+
+        df_inv = clean_inventario(crudos["inventario"], estadisticos["inventario"])
+        df_tx = clean_transacciones(crudos["transacciones"], alias_ciudades)
+        df_fb = clean_feedback(crudos["feedback"], estadisticos["feedback"])
+        df_master = construir_master(df_tx, df_inv, df_fb)
+
+        for sub in ("limpio", "master"):
+            shutil.rmtree(self.dir / sub, ignore_errors=True)
+        _escribir(df_inv, self.dir / "limpio" / "inventario.parquet")
+        _escribir(df_tx, self.dir / "limpio" / "transacciones" / f"parte-{lote:05d}.parquet")
+        _escribir(df_fb, self.dir / "limpio" / "feedback" / f"parte-{lote:05d}.parquet")
+        _escribir(df_master, self.dir / "master" / f"parte-{lote:05d}.parquet")
+        huellas = self.huellas_feedback()
+        huellas.reiniciar(huellas.filtrar(crudos["feedback"])[1])
+        versiones = self.versiones_inventario()
+        versiones.reiniciar()
+        versiones.registrar(crudos["inventario"], ["SKU_ID"], "Ultima_Revision")
+        bosquejos = BosquejosLimpieza()
+        for nombre in DATASETS:
+            bosquejos.agregar(nombre, crudos[nombre])
+        bosquejos.guardar(self._ruta_bosquejos)
+        IndiceComentarios(df_fb["Comentario_Texto"]).guardar(self._ruta_comentarios)
+        CuboKPI(df_master).guardar(self._ruta_cubo)
+
+        estado = {
+            "version_limpieza": VERSION_LIMPIEZA,
+            "version_huellas": VERSION_HUELLAS,
+            "lote": lote,
+            "estadisticos": estadisticos,
+            "marcas": {
+                "transacciones": self._marca_tx(df_tx, {}),
+                "feedback": self._marca_fb(df_fb, {}),
+                "inventario": self._marca_inv(df_inv, {}),
+            },
+        }
+        self._guardar_estado(estado)
+        return {"modo": "reajuste", "lote": lote,
+                "filas": {"inventario": len(df_inv), "transacciones": len(df_tx),
+                          "feedback": len(df_fb), "master": len(df_master)}}
+
+    # ---------------- Marcas de agua ----------------
+    @staticmethod
+    def _marca_tx(df_tx, previa):
+        claves = df_tx["Transaccion_Key"][clave_es_canonica(df_tx["Transaccion_Key"])]
+        fechas = df_tx["Fecha_Venta"].dropna()
+        return {
+            "id": _maximo(int(claves.max()) if len(claves) else None, previa.get("id", -1)),
+            "fecha": _maximo(fechas.max().isoformat() if len(fechas) else None, previa.get("fecha")),
+        }
+
+    @staticmethod
+    def _marca_fb(df_fb, previa):
+        claves = clave_sustituta(df_fb["Feedback_ID"])
+        claves = claves[clave_es_canonica(claves)]
+        return {"id": _maximo(int(claves.max()) if len(claves) else None, previa.get("id", -1))}
+
+    @staticmethod
+    def _marca_inv(df_inv, previa):
+        revisiones = df_inv["Ultima_Revision"].dropna()
+        return {"revision": _maximo(revisiones.max().isoformat() if len(revisiones) else None,
+                                    previa.get("revision"))}
+
+    # ---------------- Lotes incrementales ----------------
+    def agregar(self, archivos):
+        # archivos: cualquier subconjunto de {"inventario", "transacciones", "feedback"} -> df_raw
+        estado = self.estado()
+        if estado["version_limpieza"] != VERSION_LIMPIEZA:
+            raise ErrorAlmacen(
+                f"El almacén se ajustó con la versión de limpieza {estado['version_limpieza']} "
+                f"(actual: {VERSION_LIMPIEZA}); ejecuta reajustar() antes de agregar lotes."
+            )
+        if estado.get("version_huellas") != VERSION_HUELLAS:
+            raise ErrorAlmacen(
+                "Las huellas de deduplicación del almacén son de otra versión; "
+                "ejecuta reajustar() antes de agregar lotes."
+            )
+        lote = estado["lote"] + 1
+        self._preparacion(lote).mkdir()
+        bosquejos = self.bosquejos()
+        cubo = self.cubo()
+        est = estado["estadisticos"]
+        marcas = estado["marcas"]
+        resumen = {"modo": "append", "lote": lote}
+
+        df_inv = self.dataset("inventario")
+        skus_cambiados = pd.array([], dtype="Int64")
+        tx_nuevas = fb_nuevo = None
+
+        # Inventario: revisiones nuevas reemplazan a las guardadas
+        if archivos.get("inventario") is not None:
+            recibidas = archivos["inventario"]
+            versiones = self.versiones_inventario()
+            versiones.mover(self._en_lote(lote, versiones.ruta))
+            vigentes = versiones.vigentes(recibidas, ["SKU_ID"], "Ultima_Revision")
+            raw = recibidas[vigentes]
+            if len(raw):
+                inv_nuevo = clean_inventario(raw, est["inventario"])
+                combinado = concatenar_partes([df_inv, inv_nuevo])
+                df_inv = (
+                    combinado.sort_values("Ultima_Revision", kind="stable")
+                    .drop_duplicates("SKU_ID", keep="last")
+                    .reset_index(drop=True)
+                )
+                skus_cambiados = inv_nuevo["SKU_Key"].dropna().unique()
+                self._guardar_crudo("inventario", raw, lote, en_lote=True)
+                bosquejos.agregar("inventario", raw)
+                versiones.registrar(raw, ["SKU_ID"], "Ultima_Revision")
+                marcas["inventario"] = self._marca_inv(inv_nuevo, marcas["inventario"])
+            resumen["inventario"] = {"recibidas": len(recibidas), "obsoletas": int((~vigentes).sum()),
+                                     "skus_actualizados": len(skus_cambiados)}
+
+        # Transacciones: solo por encima de la marca de agua
+        if archivos.get("transacciones") is not None:
+            raw = archivos["transacciones"]
+            claves = clave_sustituta(raw["Transaccion_ID"])
+            claves = claves.where(clave_es_canonica(claves))
+            marca = marcas["transacciones"]
+            nuevas = (claves > marca["id"]).fillna(False).to_numpy(dtype=bool)
+            if marca["fecha"] is not None:
+                fechas = pd.to_datetime(raw["Fecha_Venta"], errors="coerce")
+                nuevas |= (claves.isna() & (fechas > pd.Timestamp(marca["fecha"]))).to_numpy(dtype=bool)
+            raw = raw[nuevas]
+            if len(raw):
+                tx_nuevas = clean_transacciones(raw, est["alias_ciudades"])
+                self._guardar_crudo("transacciones", raw, lote, en_lote=True)
+                bosquejos.agregar("transacciones", raw)
+                marcas["transacciones"] = self._marca_tx(tx_nuevas, marca)
+            resumen["transacciones"] = {"recibidas": len(nuevas), "nuevas": int(nuevas.sum()),
+                                        "bajo_marca": int((~nuevas).sum())}
+
+        # Feedback: solo filas con contenido no visto
+        if archivos.get("feedback") is not None:
+            recibidas = archivos["feedback"]
+            almacen_huellas = self.huellas_feedback()
+            almacen_huellas.mover(self._en_lote(lote, almacen_huellas.ruta))
+            raw, huellas = almacen_huellas.filtrar(recibidas)
+            if len(raw):
+                fb_nuevo = clean_feedback(raw, est["feedback"])
+                self._guardar_crudo("feedback", raw, lote, en_lote=True)
+                bosquejos.agregar("feedback", raw)
+                almacen_huellas.registrar(huellas)
+                marcas["feedback"] = self._marca_fb(fb_nuevo, marcas["feedback"])
+            resumen["feedback"] = {"recibidas": len(recibidas), "nuevas": len(raw),
+                                   "duplicadas": len(recibidas) - len(raw)}
+
+        resumen["master"] = self._actualizar_master(df_inv, tx_nuevas, fb_nuevo, skus_cambiados, cubo, lote)
+
+        # Escritura de los limpios (las partes nuevas solo agregan)
+        if archivos.get("inventario") is not None:
+            _escribir(df_inv, self._en_lote(lote, self.dir / "limpio" / "inventario.parquet"))
+        if tx_nuevas is not None:
+            _escribir(tx_nuevas, self._en_lote(lote, self.dir / "limpio" / "transacciones" / f"parte-{lote:05d}.parquet"))
+        if fb_nuevo is not None:
+            _escribir(fb_nuevo, self._en_lote(lote, self.dir / "limpio" / "feedback" / f"parte-{lote:05d}.parquet"))
+            # mismas filas y en el mismo orden que la parte nueva
+            self.comentarios().agregar(fb_nuevo["Comentario_Texto"]).guardar(
+                self._en_lote(lote, self._ruta_comentarios)
+            )
+
+        bosquejos.guardar(self._en_lote(lote, self._ruta_bosquejos))
+        cubo.guardar(self._en_lote(lote, self._ruta_cubo))
+        estado["lote"] = lote
+        estado["marcas"] = marcas
+        self._confirmar(lote, estado)
+        return resumen
+
+    def actualizar_estadisticos(self):
+        # Medianas de imputación desde los bosquejos de toda la historia.
+        # No toca lo ya limpio: rige para los lotes siguientes.
+        estado = self.estado()
+        bosquejos = self.bosquejos()
+        anteriores = estado["estadisticos"]
+        estado["estadisticos"] = {
+            **anteriores,
+            "inventario": bosquejos.estadisticos_inventario(),
+            "feedback": bosquejos.medianas_feedback(),
+        }
+        self._guardar_estado(estado)
+        return {"modo": "estadisticos", "lote": estado["lote"],
+                "antes": {k: anteriores[k] for k in ("inventario", "feedback")},
+                "despues": {k: estado["estadisticos"][k] for k in ("inventario", "feedback")},
+                "error_rango": bosquejos.errores_rango()}
+
+    # ---------------- Comentarios ----------------
+    def buscar_comentarios(self, consulta, ejemplos=10):
+        # Feedback guardado cuyo comentario cumple la consulta (palabras y
+        # "frases"), con su sentimiento y las categorías de sus transacciones
+        comentarios = self.comentarios()
+        pos = comentarios.buscar(consulta)
+        df_fb = self.dataset("feedback")
+        coincidencias = df_fb.iloc[pos] if len(pos) else self._vacio("feedback")
+
+        # Transaccion -> SKU -> Categoria, desde la maestra
+        llaves = _unir(_leer_partes(self.dir / "master", ["Transaccion_Key", "Categoria"]))
+        claves = coincidencias["Transaccion_Key"].dropna().unique()
+        categorias = (
+            llaves[llaves["Transaccion_Key"].isin(claves)]["Categoria"]
+            .astype("string").fillna(SIN_CATEGORIA).value_counts()
+            if llaves is not None else pd.Series(dtype="int64")
+        )
+        muestra = coincidencias.head(ejemplos)
+        return {
+            "modo": "busqueda", "consulta": consulta,
+            **comentarios.resumen(pos),
+            "por_categoria": {str(c): int(n) for c, n in categorias.items() if n},
+            "ejemplos": [
+                {"Feedback_ID": f, "Transaccion_ID": t, "Comentario_Texto": c, "Sentimiento": round(float(p), 2)}
+                for f, t, c, p in zip(muestra["Feedback_ID"], muestra["Transaccion_ID"],
+                                      muestra["Comentario_Texto"], comentarios.sentimiento(pos[:ejemplos]))
+            ],
+        }
+
+    def _actualizar_master(self, df_inv, tx_nuevas, fb_nuevo, skus_cambiados, cubo, lote):
+        # Transacciones ya guardadas que cambian: con feedback nuevo o SKU revisado
+        claves_fb = (
+            pd.array([], dtype="Int64") if fb_nuevo is None
+            else fb_nuevo["Transaccion_Key"].dropna().unique()
+        )
+        if tx_nuevas is None and len(claves_fb) == 0 and len(skus_cambiados) == 0:
+            return {"filas_reconstruidas": 0, "partes_reescritas": 0}
+
+        def afectada(df):
+            return (df["Transaccion_Key"].isin(claves_fb) | df["SKU_Key"].isin(skus_cambiados)).to_numpy(dtype=bool)
+
+        tx_previas = []
+        for ruta in sorted((self.dir / "limpio" / "transacciones").glob("*.parquet")):
+            llaves = pd.read_parquet(ruta, columns=["Transaccion_Key", "SKU_Key"])
+            mascara = afectada(llaves)
+            if mascara.any():
+                tx_previas.append(pd.read_parquet(ruta)[mascara])
+        tx_afectadas = _unir(tx_previas + ([tx_nuevas] if tx_nuevas is not None else []))
+
+        # Quitar de la maestra (y del cubo) las filas que se reconstruyen
+        reescritas = 0
+        for ruta in sorted((self.dir / "master").glob("*.parquet")):
+            llaves = pd.read_parquet(ruta, columns=["Transaccion_Key", "SKU_Key"])
+            mascara = afectada(llaves)
+            if mascara.any():
+                parte = pd.read_parquet(ruta)
+                cubo.quitar(parte[mascara])
+                _escribir(parte[~mascara], self._en_lote(lote, ruta))
+                reescritas += 1
+
+        if tx_afectadas is None:
+            return {"filas_reconstruidas": 0, "partes_reescritas": reescritas}
+
+        # Feedback de esas transacciones: el guardado más el del lote
+        claves_tx = tx_afectadas["Transaccion_Key"].dropna().unique()
+        fb_partes = []
+        for ruta in sorted((self.dir / "limpio" / "feedback").glob("*.parquet")):
+            llaves = pd.read_parquet(ruta, columns=["Transaccion_Key"])
+            mascara = llaves["Transaccion_Key"].isin(claves_tx).to_numpy(dtype=bool)
+            if mascara.any():
+                fb_partes.append(pd.read_parquet(ruta)[mascara])
+        if fb_nuevo is not None:
+            fb_partes.append(fb_nuevo[fb_nuevo["Transaccion_Key"].isin(claves_tx).to_numpy(dtype=bool)])
+        df_fb = _unir(fb_partes)
+        if df_fb is None:
+            df_fb = self._vacio("feedback")
+
+        parcial = construir_master(tx_afectadas, df_inv, df_fb)
+        _escribir(parcial, self._en_lote(lote, self.dir / "master" / f"parte-{lote:05d}.parquet"))
+        cubo.agregar(parcial)
+        return {"filas_reconstruidas": len(parcial), "partes_reescritas": reescritas}
+
+    def _vacio(self, nombre):
+        # DataFrame sin filas con el esquema de un dataset guardado
+        ruta = next((self.dir / "limpio" / nombre).glob("*.parquet"))
+        return pd.read_parquet(ruta).iloc[:0]
+
+
+def _leer_archivo(nombre, ruta):
+    # CSV (también .gz / .zst), Parquet o Arrow IPC; ver ingestion.py
+    return leer_dataset(nombre, ruta)[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingesta incremental de lotes de TechLogistics.")
+    parser.add_argument("--almacen", required=True, help="Directorio del almacén")
+    parser.add_argument("--inventario", help="Inventario del lote (CSV, .csv.gz, .csv.zst, Parquet o Arrow IPC)")
+    parser.add_argument("--transacciones", help="Transacciones del lote")
+    parser.add_argument("--feedback", help="Feedback del lote")
+    modo = parser.add_mutually_exclusive_group()
+    modo.add_argument("--inicializar", action="store_true",
+                      help="Crear el almacén con un ajuste completo (requiere los tres CSV)")
+    modo.add_argument("--reajustar", action="store_true",
+                      help="Volver a limpiar toda la historia y recalcular estadísticos")
+    modo.add_argument("--actualizar-estadisticos", action="store_true",
+                      help="Renovar las medianas de imputación desde los bosquejos de cuantiles")
+    modo.add_argument("--buscar", metavar="CONSULTA",
+                      help='Buscar en los comentarios de feedback (palabras; "frase exacta" entre comillas)')
+    args = parser.parse_args(argv)
+
+    almacen = AlmacenIncremental(args.almacen)
+    archivos = {n: _leer_archivo(n, getattr(args, n)) for n in DATASETS if getattr(args, n)}
+
+    try:
+        if args.inicializar:
+            resumen = almacen.inicializar(archivos)
+        elif args.reajustar:
+            resumen = almacen.reajustar()
+        elif args.actualizar_estadisticos:
+            resumen = almacen.actualizar_estadisticos()
+        elif args.buscar is not None:
+            resumen = almacen.buscar_comentarios(args.buscar)
+        else:
+            resumen = almacen.agregar(archivos)
+    except ErrorAlmacen as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    print(json.dumps(resumen, ensure_ascii=False, indent=2, default=int))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
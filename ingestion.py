@@ -0,0 +1,311 @@
+import csv
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
+import pyarrow.parquet as pq
+
+# Ingesta tipada de los archivos crudos (CSV, CSV.gz, CSV.zst, Parquet y
+# Arrow IPC) con el lector de Arrow: multihilo, sin inferencia de tipos.
+#   - Cada dataset declara sus columnas crudas con un tipo de lectura
+#     ("texto", "numero", "fecha" con su formato); solo se leen esas
+#     columnas y las demás se informan como ignoradas.
+#   - Una columna declarada se entrega tipada si todos sus valores son
+#     válidos; si alguno no lo es (p. ej. "fecha-invalida") se entrega como
+#     texto, igual que en el archivo, y se informa con ejemplos: la
+#     auditoría sigue mostrando el valor original y la limpieza lo coerciona.
+#   - Las filas mal formadas (número de campos distinto a la cabecera) se
+#     saltan y se informan en vez de abortar la lectura.
+#   - leer_por_bloques() lee un archivo grande por partes (streaming.py).
+# leer_dataset() devuelve (df_crudo, reporte); el reporte va al reporte de
+# limpieza bajo "Ingesta".
+
+# columna -> tipo de lectura
+COLUMNAS_CRUDAS = {
+    "inventario": {
+        "SKU_ID": "texto",
+        "Categoria": "texto",
+        "Stock_Actual": "numero",
+        "Costo_Unitario_USD": "numero",
+        "Punto_Reorden": "numero",
+        "Lead_Time_Dias": "numero",
+        "Bodega_Origen": "texto",
+        "Ultima_Revision": "fecha",
+    },
+    "transacciones": {
+        "Transaccion_ID": "texto",
+        "SKU_ID": "texto",
+        "Fecha_Venta": "fecha",
+        "Cantidad_Vendida": "numero",
+        "Precio_Venta_Final": "numero",
+        "Costo_Envio": "numero",
+        "Tiempo_Entrega_Real": "numero",
+        "Estado_Envio": "texto",
+        "Ciudad_Destino": "texto",
+        "Canal_Venta": "texto",
+    },
+    "feedback": {
+        "Feedback_ID": "texto",
+        "Transaccion_ID": "texto",
+        "Rating_Producto": "numero",
+        "Rating_Logistica": "numero",
+        "Comentario_Texto": "texto",
+        "Recomienda_Marca": "texto",
+        "Ticket_Soporte_Abierto": "texto",
+        "Edad_Cliente": "numero",
+        "Satisfaccion_NPS": "numero",
+    },
+}
+FORMATOS_FECHA = {"Ultima_Revision": "%Y-%m-%d", "Fecha_Venta": "%Y-%m-%d"}
+# Texto libre entre comillas que puede traer saltos de línea
+CON_SALTOS_DE_LINEA = {"feedback"}
+
+# Los mismos valores nulos que pandas.read_csv
+VALORES_NULOS = [
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND",
+    "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+]
+BYTES_BLOQUE = 4 * 2**20
+MAX_EJEMPLOS = 20
+
+FORMATOS = {
+    b"PAR1": "parquet",
+    b"ARROW1": "arrow",
+    b"\xff\xff\xff\xff": "arrow_stream",
+    b"\x1f\x8b": "csv.gz",
+    b"\x28\xb5\x2f\xfd": "csv.zst",
+}
+COMPRESION = {"csv.gz": "gzip", "csv.zst": "zstd"}
+EXTENSIONES = ["csv", "gz", "zst", "parquet", "arrow", "feather", "ipc"]
+
+
+class ErrorIngesta(ValueError):
+    pass
+
+
+# ---------------- Fuentes ----------------
+def detectar_formato(fuente):
+    # fuente: bytes o ruta; por los bytes iniciales, no por la extensión
+    if isinstance(fuente, (bytes, bytearray, memoryview)):
+        inicio = bytes(fuente[:8])
+    else:
+        with open(fuente, "rb") as f:
+            inicio = f.read(8)
+    for magico, formato in FORMATOS.items():
+        if inicio.startswith(magico):
+            return formato
+    return "csv"
+
+
+def _abrir(fuente):
+    if isinstance(fuente, (bytes, bytearray, memoryview)):
+        return pa.BufferReader(fuente)
+    return pa.memory_map(str(fuente), "r")
+
+
+def _entrada_csv(fuente, formato):
+    entrada = _abrir(fuente)
+    if formato in COMPRESION:
+        return pa.CompressedInputStream(entrada, COMPRESION[formato])
+    return entrada
+
+
+def _cabecera_csv(fuente, formato):
+    with _entrada_csv(fuente, formato) as entrada:
+        inicio = entrada.read(2**16)
+    linea = inicio.split(b"\n", 1)[0].decode("utf-8-sig").rstrip("\r")
+    return next(csv.reader([linea]), [])
+
+
+# ---------------- Tipos ----------------
+def _es_texto(tipo):
+    return pa.types.is_string(tipo) or pa.types.is_large_string(tipo)
+
+
+def _tipo_arrow(tipo):
+    return {"texto": pa.string(), "numero": pa.float64(), "fecha": pa.timestamp("us")}[tipo]
+
+
+def _convertir(arreglo, col, tipo):
+    # Lanza ArrowInvalid si algún valor no es del tipo declarado
+    if tipo == "texto":
+        return arreglo if arreglo.type == pa.string() else pc.cast(arreglo, pa.string())
+    if tipo == "fecha" and _es_texto(arreglo.type):
+        return pc.strptime(arreglo, format=FORMATOS_FECHA[col], unit="us")
+    return pc.cast(arreglo, _tipo_arrow(tipo))
+
+
+def _invalidos(arreglo, col, tipo):
+    # (cantidad, ejemplos) de valores no nulos que no se pueden convertir
+    if tipo == "fecha" and _es_texto(arreglo.type):
+        convertido = pc.strptime(arreglo, format=FORMATOS_FECHA[col], unit="us", error_is_null=True)
+        mascara = pc.and_(pc.is_null(convertido), pc.is_valid(arreglo))
+        malos = pc.filter(arreglo, mascara)
+    else:
+        serie = arreglo.to_pandas()
+        malos = pa.array(serie[pd.to_numeric(serie, errors="coerce").isna() & serie.notna()].astype("string"))
+    return len(malos), malos.unique()[:5].to_pylist()
+
+
+def _tipar(tabla, nombre, reporte):
+    # Convierte cada columna declarada si todos sus valores son válidos
+    for col, tipo in COLUMNAS_CRUDAS[nombre].items():
+        if col not in tabla.column_names:
+            continue
+        i = tabla.column_names.index(col)
+        try:
+            tabla = tabla.set_column(i, col, _convertir(tabla.column(i), col, tipo))
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            _anotar_invalidos(reporte, col, *_invalidos(tabla.column(i), col, tipo))
+            if not _es_texto(tabla.column(i).type):
+                tabla = tabla.set_column(i, col, pc.cast(tabla.column(i), pa.string()))
+    return tabla
+
+
+# ---------------- Reporte ----------------
+def reporte_vacio(formato):
+    return {"formato": formato, "filas": 0, "filas_malformadas": 0, "ejemplos_malformadas": [],
+            "valores_invalidos": {}, "columnas_ignoradas": []}
+
+
+def _anotar_invalidos(reporte, col, cantidad, ejemplos):
+    previo = reporte["valores_invalidos"].setdefault(col, {"cantidad": 0, "ejemplos": []})
+    previo["cantidad"] += cantidad
+    previo["ejemplos"] = list(dict.fromkeys(previo["ejemplos"] + ejemplos))[:5]
+
+
+def combinar_reportes(reportes):
+    # Reportes de partes de un mismo archivo (parallel.py)
+    total = reporte_vacio(reportes[0]["formato"])
+    total["columnas_ignoradas"] = reportes[0]["columnas_ignoradas"]
+    for r in reportes:
+        total["filas"] += r["filas"]
+        total["filas_malformadas"] += r["filas_malformadas"]
+        total["ejemplos_malformadas"] = (total["ejemplos_malformadas"] + r["ejemplos_malformadas"])[:MAX_EJEMPLOS]
+        for col, inv in r["valores_invalidos"].items():
+            _anotar_invalidos(total, col, inv["cantidad"], inv["ejemplos"])
+    return total
+
+
+class _FilasMalformadas:
+    # invalid_row_handler del lector CSV: salta la fila y la anota
+
+    def __init__(self, reporte):
+        self.reporte = reporte
+
+    def __call__(self, fila):
+        self.reporte["filas_malformadas"] += 1
+        if len(self.reporte["ejemplos_malformadas"]) < MAX_EJEMPLOS:
+            self.reporte["ejemplos_malformadas"].append({
+                "fila": fila.number,
+                "campos_esperados": fila.expected_columns,
+                "campos": fila.actual_columns,
+                "texto": fila.text[:200],
+            })
+        return "skip"
+
+
+# ---------------- Lectura ----------------
+def _columnas(nombre, disponibles, reporte):
+    declaradas = list(COLUMNAS_CRUDAS[nombre])
+    faltan = [c for c in declaradas if c not in disponibles]
+    if faltan:
+        raise ErrorIngesta(f"Al archivo de {nombre} le faltan columnas: {', '.join(faltan)}")
+    reporte["columnas_ignoradas"] = [c for c in disponibles if c not in declaradas]
+    return declaradas
+
+
+def _opciones_csv(nombre, columnas, reporte, tipos):
+    lectura = pv.ReadOptions(use_threads=True, block_size=BYTES_BLOQUE)
+    analisis = pv.ParseOptions(newlines_in_values=nombre in CON_SALTOS_DE_LINEA,
+                               invalid_row_handler=_FilasMalformadas(reporte))
+    conversion = pv.ConvertOptions(
+        include_columns=columnas,
+        column_types=tipos,
+        null_values=VALORES_NULOS,
+        strings_can_be_null=True,
+        timestamp_parsers=sorted(set(FORMATOS_FECHA.values())),
+    )
+    return lectura, analisis, conversion
+
+
+def _leer_csv(nombre, fuente, formato, reporte):
+    # Una sola lectura con las columnas como texto; _tipar convierte las
+    # que tienen todos sus valores válidos (las demás quedan como texto)
+    columnas = _columnas(nombre, _cabecera_csv(fuente, formato), reporte)
+    texto = {c: pa.string() for c in columnas}
+    try:
+        with _entrada_csv(fuente, formato) as entrada:
+            tabla = pv.read_csv(entrada, *_opciones_csv(nombre, columnas, reporte, texto))
+    except pa.ArrowInvalid as e:
+        raise ErrorIngesta(f"No se pudo leer el archivo de {nombre}: {e}") from e
+    return _tipar(tabla, nombre, reporte)
+
+
+def _leer_tabla(nombre, fuente, formato, reporte):
+    # Parquet / Arrow IPC: ya vienen tipados, solo se proyecta y se convierte
+    if formato == "parquet":
+        archivo = pq.ParquetFile(_abrir(fuente))
+        columnas = _columnas(nombre, archivo.schema_arrow.names, reporte)
+        tabla = archivo.read(columns=columnas, use_threads=True)
+    else:
+        abrir = pa.ipc.open_file if formato == "arrow" else pa.ipc.open_stream
+        lector = abrir(_abrir(fuente))
+        columnas = _columnas(nombre, lector.schema.names, reporte)
+        tabla = lector.read_all().select(columnas)
+    return _tipar(tabla, nombre, reporte)
+
+
+def leer_dataset(nombre, fuente):
+    # fuente: bytes (archivo subido) o ruta. Devuelve (df_crudo, reporte)
+    formato = detectar_formato(fuente)
+    reporte = reporte_vacio(formato)
+    if formato.startswith("csv"):
+        tabla = _leer_csv(nombre, fuente, formato, reporte)
+    else:
+        tabla = _leer_tabla(nombre, fuente, formato, reporte)
+    reporte["filas"] = tabla.num_rows
+    return tabla.to_pandas(), reporte
+
+
+def leer_por_bloques(nombre, ruta, filas_por_bloque, reporte=None):
+    # Generador de DataFrames de filas_por_bloque filas (el último, con el
+    # resto). Cada bloque se tipa por separado: una columna puede llegar
+    # como texto en un bloque con valores inválidos y tipada en los demás.
+    formato = detectar_formato(ruta)
+    reporte = reporte if reporte is not None else {}
+    for clave, valor in reporte_vacio(formato).items():
+        reporte.setdefault(clave, valor)
+
+    if formato == "parquet":
+        archivo = pq.ParquetFile(_abrir(ruta))
+        columnas = _columnas(nombre, archivo.schema_arrow.names, reporte)
+        lotes = archivo.iter_batches(batch_size=filas_por_bloque, columns=columnas)
+    elif formato.startswith("arrow"):
+        abrir = pa.ipc.open_file if formato == "arrow" else pa.ipc.open_stream
+        lector = abrir(_abrir(ruta))
+        columnas = _columnas(nombre, lector.schema.names, reporte)
+        lotes = (lector.get_batch(i) for i in range(lector.num_record_batches)) if formato == "arrow" else lector
+    else:
+        columnas = _columnas(nombre, _cabecera_csv(ruta, formato), reporte)
+        texto = {c: pa.string() for c in columnas}
+        lotes = pv.open_csv(_entrada_csv(ruta, formato), *_opciones_csv(nombre, columnas, reporte, texto))
+
+    # Los lotes del lector no coinciden con el tamaño pedido: se acumulan
+    # y se cortan en bloques exactos; el resto pasa al bloque siguiente
+    pendiente = None
+    for lote in lotes:
+        tabla = pa.Table.from_batches([lote.select(columnas)])
+        pendiente = tabla if pendiente is None else pa.concat_tables([pendiente, tabla])
+        while pendiente.num_rows >= filas_por_bloque:
+            yield _bloque(nombre, pendiente.slice(0, filas_por_bloque), reporte)
+            pendiente = pendiente.slice(filas_por_bloque)
+    if pendiente is not None and pendiente.num_rows:
+        yield _bloque(nombre, pendiente, reporte)
+
+
+def _bloque(nombre, tabla, reporte):
+    tabla = _tipar(tabla, nombre, reporte)
+    reporte["filas"] += tabla.num_rows
+    return tabla.to_pandas()
@@ -0,0 +1,249 @@
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+import tracemalloc
+import weakref
+from contextvars import ContextVar
+from functools import wraps
+
+# Instrumentación de etapas: tramos (spans) con duración y pico de memoria.
+#   - Cada tramo se registra como log estructurado (JSON, logger
+#     "techlog.rendimiento") y dentro de la traza activa, con campos al estilo
+#     OpenTelemetry (trace_id, span_id, parent_span_id, tiempos en ns).
+#   - Una traza agrupa los tramos de una ejecución (en la app, un rerun).
+#   - Desactivada (sin traza activa y sin TECHLOG_INSTRUMENTACION=1),
+#     tramo() devuelve un context manager vacío compartido: el costo es una
+#     lectura de ContextVar por llamada.
+#   - El pico de memoria sale de tracemalloc y solo se mide si está activo.
+#     tracemalloc es global al proceso: cada sesión que quiere medir lo pide
+#     con su MedicionMemoria y sigue activo mientras quede algún pedido (el
+#     de una sesión cerrada cae con ella). Con varias sesiones simultáneas
+#     los picos se mezclan.
+#   - TECHLOG_TRAZAS=<ruta.jsonl> agrega cada traza terminada a ese archivo.
+
+GLOBAL = os.environ.get("TECHLOG_INSTRUMENTACION", "") == "1"
+ARCHIVO_TRAZAS = os.environ.get("TECHLOG_TRAZAS")
+
+logger = logging.getLogger("techlog.rendimiento")
+
+_traza_actual = ContextVar("traza_actual", default=None)
+_tramo_actual = ContextVar("tramo_actual", default=None)
+
+
+class _Nulo:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def atributo(self, clave, valor):
+        pass
+
+
+_NULO = _Nulo()
+
+
+class Tramo:
+
+    def __init__(self, nombre, atributos):
+        self.nombre = nombre
+        self.atributos = atributos
+        self.traza = _traza_actual.get()
+        self.padre = _tramo_actual.get()
+        self.trace_id = self.traza.trace_id if self.traza else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.inicio_ns = self.fin_ns = 0
+        self.pico_bytes = None
+        self._pico_abs = 0
+        self._base = 0
+        self._token = None
+
+    def atributo(self, clave, valor):
+        self.atributos[clave] = valor
+
+    def __enter__(self):
+        if tracemalloc.is_tracing():
+            actual, pico = tracemalloc.get_traced_memory()
+            if self.padre is not None:
+                # el pico visto hasta ahora pertenece al padre
+                self.padre._pico_abs = max(self.padre._pico_abs, pico)
+            tracemalloc.reset_peak()
+            self._base = self._pico_abs = actual
+        self._token = _tramo_actual.set(self)
+        self.inicio_ns = time.time_ns()
+        self._t0 = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, tipo, exc, tb):
+        duracion = time.perf_counter_ns() - self._t0
+        self.fin_ns = self.inicio_ns + duracion
+        _tramo_actual.reset(self._token)
+        if tracemalloc.is_tracing():
+            _, pico = tracemalloc.get_traced_memory()
+            self._pico_abs = max(self._pico_abs, pico)
+            self.pico_bytes = self._pico_abs - self._base
+            if self.padre is not None:
+                self.padre._pico_abs = max(self.padre._pico_abs, self._pico_abs)
+        if tipo is not None:
+            self.atributos["error"] = tipo.__name__
+
+        registro = self.como_dict()
+        if self.traza is not None:
+            self.traza.tramos.append(registro)
+        logger.info(json.dumps(registro, ensure_ascii=False, default=str))
+        return False
+
+    def como_dict(self):
+        return {
+            "name": self.nombre,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.padre.span_id if self.padre else None,
+            "start_time_unix_nano": self.inicio_ns,
+            "end_time_unix_nano": self.fin_ns,
+            "duracion_ms": round((self.fin_ns - self.inicio_ns) / 1e6, 3),
+            "pico_mb": None if self.pico_bytes is None else round(self.pico_bytes / 2**20, 2),
+            "attributes": self.atributos,
+        }
+
+
+def tramo(nombre, **atributos):
+    if not GLOBAL and _traza_actual.get() is None:
+        return _NULO
+    return Tramo(nombre, atributos)
+
+
+def instrumentar(nombre=None):
+    # Decorador: cada llamada a la función es un tramo
+    def decorador(fn):
+        etiqueta = nombre or fn.__name__
+
+        @wraps(fn)
+        def envoltura(*args, **kwargs):
+            if not GLOBAL and _traza_actual.get() is None:
+                return fn(*args, **kwargs)
+            with Tramo(etiqueta, {}):
+                return fn(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+# ---------------- Trazas ----------------
+class Traza:
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self.trace_id = secrets.token_hex(16)
+        self.inicio_ns = time.time_ns()
+        self.tramos = []
+
+    @property
+    def duracion_ms(self):
+        # Hasta el fin del último tramo: la traza puede cortarse (st.stop)
+        # sin llegar a cerrarse explícitamente
+        if not self.tramos:
+            return 0.0
+        return round((max(t["end_time_unix_nano"] for t in self.tramos) - self.inicio_ns) / 1e6, 3)
+
+    def desglose(self):
+        # Tramos en orden de inicio, con su profundidad en el árbol
+        por_id = {t["span_id"]: t for t in self.tramos}
+        filas = []
+        for t in sorted(self.tramos, key=lambda t: t["start_time_unix_nano"]):
+            profundidad, padre = 0, t["parent_span_id"]
+            while padre in por_id:
+                profundidad, padre = profundidad + 1, por_id[padre]["parent_span_id"]
+            filas.append({
+                "Etapa": "  " * profundidad + t["name"],
+                "ms": t["duracion_ms"],
+                "MB pico": t["pico_mb"],
+                "profundidad": profundidad,
+            })
+        return filas
+
+    def exportar(self):
+        # Formato OTLP/JSON (resourceSpans -> scopeSpans -> spans)
+        spans = [{
+            "traceId": t["trace_id"],
+            "spanId": t["span_id"],
+            "parentSpanId": t["parent_span_id"] or "",
+            "name": t["name"],
+            "startTimeUnixNano": str(t["start_time_unix_nano"]),
+            "endTimeUnixNano": str(t["end_time_unix_nano"]),
+            "attributes": [
+                {"key": k, "value": {"stringValue": str(v)}}
+                for k, v in (t["attributes"] | {"memoria.pico_mb": t["pico_mb"]}).items()
+                if v is not None
+            ],
+        } for t in self.tramos]
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "techlog"}}]},
+            "scopeSpans": [{"scope": {"name": self.nombre}, "spans": spans}],
+        }]}
+
+
+def iniciar_traza(nombre):
+    # Activa la instrumentación en el contexto actual hasta cerrar_traza()
+    traza = Traza(nombre)
+    _traza_actual.set(traza)
+    return traza
+
+
+def cerrar_traza(traza):
+    if traza is None:
+        return
+    if _traza_actual.get() is traza:
+        _traza_actual.set(None)
+    if ARCHIVO_TRAZAS and traza.tramos:
+        with open(ARCHIVO_TRAZAS, "a", encoding="utf-8") as f:
+            f.write(json.dumps(traza.exportar()) + "\n")
+
+
+def traza_actual():
+    return _traza_actual.get()
+
+
+# ---------------- Memoria ----------------
+_pedidos_memoria = 0
+_memoria_propia = False
+# reentrante: el finalizador de un pedido puede correr en cualquier punto
+_lock_memoria = threading.RLock()
+
+
+def _pedir_memoria(delta):
+    # Solo se detiene el tracemalloc que se arrancó aquí
+    global _pedidos_memoria, _memoria_propia
+    with _lock_memoria:
+        _pedidos_memoria += delta
+        if _pedidos_memoria and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _memoria_propia = True
+        elif not _pedidos_memoria and _memoria_propia:
+            tracemalloc.stop()
+            _memoria_propia = False
+
+
+class MedicionMemoria:
+    # Pedido de medición de memoria de una sesión (se guarda en su estado).
+    # Si la sesión se cierra con el pedido activo, se suelta al recolectarla.
+
+    def __init__(self):
+        self._soltar = None
+
+    @property
+    def activa(self):
+        return self._soltar is not None and self._soltar.alive
+
+    def activar(self, activa=True):
+        if activa == self.activa:
+            return
+        if activa:
+            _pedir_memoria(1)
+            self._soltar = weakref.finalize(self, _pedir_memoria, -1)
+        else:
+            self._soltar()
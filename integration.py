@@ -0,0 +1,181 @@
+import pandas as pd
+
+from schema import aplicar_esquema, validar_esquema
+
+# Motor de integración: construye la tabla maestra (transacciones +
+# inventario + feedback) una sola vez por combinación de datasets limpios.
+#
+# La construcción se divide en etapas; cada etapa solo se recalcula cuando
+# cambia alguno de los datasets de los que depende:
+#   base      -> transacciones
+#   tx_inv    -> transacciones, inventario
+#   master    -> transacciones, inventario, feedback
+
+
+# ---------------- Columnas derivadas ----------------
+def _ingreso(df):
+    return df["Cantidad_Vendida"] * df["Precio_Venta_Final"]
+
+
+def _sku_fantasma(df):
+    return df["_merge"] == "left_only"
+
+
+def _costo_total(df):
+    return df["Cantidad_Vendida"] * df["Costo_Unitario_Limpio"] + df["Costo_Envio"]
+
+
+def _margen_utilidad(df):
+    return df["Ingreso"] - df["Costo_Total"]
+
+
+def _brecha_entrega(df):
+    return df["Tiempo_Entrega_Limpio"] - df["Lead_Time_Limpio"]
+
+
+# columna -> (datasets de los que depende, función). El orden importa:
+# Margen_Utilidad usa Ingreso y Costo_Total.
+DERIVADAS = {
+    "Ingreso": (("transacciones",), _ingreso),
+    "sku_fantasma": (("transacciones", "inventario"), _sku_fantasma),
+    "Costo_Total": (("transacciones", "inventario"), _costo_total),
+    "Margen_Utilidad": (("transacciones", "inventario"), _margen_utilidad),
+    "Brecha_Entrega": (("transacciones", "inventario"), _brecha_entrega),
+}
+
+# Columnas de entrada de cada derivada (query_plan.py las usa para podar
+# columnas de las fuentes)
+ENTRADAS_DERIVADAS = {
+    "Ingreso": ("Cantidad_Vendida", "Precio_Venta_Final"),
+    "sku_fantasma": ("_merge",),
+    "Costo_Total": ("Cantidad_Vendida", "Costo_Unitario_Limpio", "Costo_Envio"),
+    "Margen_Utilidad": ("Ingreso", "Costo_Total"),
+    "Brecha_Entrega": ("Tiempo_Entrega_Limpio", "Lead_Time_Limpio"),
+}
+
+ETAPAS = {
+    "base": ("transacciones",),
+    "tx_inv": ("transacciones", "inventario"),
+    "master": ("transacciones", "inventario", "feedback"),
+}
+
+
+def _agregar_derivadas(df, etapa):
+    # Solo las columnas cuyas dependencias quedan cubiertas por primera vez
+    # en esta etapa (las anteriores ya vienen calculadas).
+    disponibles = set(ETAPAS[etapa])
+    for col, (deps, fn) in DERIVADAS.items():
+        if set(deps) <= disponibles and col not in df.columns:
+            df[col] = fn(df)
+    return df
+
+
+def version_df(df):
+    # Huella del contenido para cuando no se dispone de una clave externa
+    return str(pd.util.hash_pandas_object(df, index=False).sum())
+
+
+# ---------------- Etapas ----------------
+def _etapa_base(df_tx):
+    df = df_tx.copy()
+    df["Fecha_Venta"] = pd.to_datetime(df["Fecha_Venta"], errors="coerce")
+    df = df.dropna(subset=["Fecha_Venta"])
+    return _agregar_derivadas(df, "base")
+
+
+# Los joins usan las claves sustitutas enteras (SKU_Key, Transaccion_Key);
+# las filas sin clave válida del lado derecho no pueden emparejar.
+def _etapa_tx_inv(base, df_inv):
+    derecha = df_inv.drop(columns="SKU_ID").dropna(subset=["SKU_Key"])
+    df = base.merge(derecha, on="SKU_Key", how="left", indicator=True)
+    return _agregar_derivadas(df, "tx_inv")
+
+
+def _etapa_master(tx_inv, df_fb):
+    derecha = df_fb.drop(columns="Transaccion_ID").dropna(subset=["Transaccion_Key"])
+    df = tx_inv.merge(derecha, on="Transaccion_Key", how="left")
+    # Ordenada por fecha: IndiceFiltros la usa tal cual, sin otra copia
+    df = df.sort_values("Fecha_Venta", kind="stable", ignore_index=True)
+    df = aplicar_esquema(_agregar_derivadas(df, "master"), "master")
+    return validar_esquema(df, "master")
+
+
+def clave_etapa(etapa, versiones):
+    return "|".join([etapa, *(versiones[d] for d in ETAPAS[etapa])])
+
+
+class MotorIntegracion:
+
+    def __init__(self, almacen=None):
+        # almacen (shared_store.AlmacenCompartido): las etapas se guardan
+        # ahí, por clave de versiones, y las comparten todas las sesiones
+        self.almacen = almacen
+        self._versiones = {}
+        self._etapas = {}
+        self.recalculos = {etapa: 0 for etapa in ETAPAS}
+        self._huellas = {}
+
+    def _version(self, nombre, df):
+        # Mismo objeto que la última vez -> misma huella, sin volver a hashear
+        previa = self._huellas.get(nombre)
+        if previa is not None and previa[0] is df:
+            return previa[1]
+        version = version_df(df)
+        self._huellas[nombre] = (df, version)
+        return version
+
+    def _vigente(self, etapa, versiones):
+        deps = ETAPAS[etapa]
+        previas = self._versiones.get(etapa)
+        return previas is not None and all(previas[d] == versiones[d] for d in deps)
+
+    def _guardar(self, etapa, df, versiones):
+        self._etapas[etapa] = df
+        self._versiones[etapa] = {d: versiones[d] for d in ETAPAS[etapa]}
+        self.recalculos[etapa] += 1
+
+    def master(self, df_tx, df_inv, df_fb, versiones=None):
+        if versiones is None:
+            versiones = {}
+        versiones = {
+            "transacciones": versiones.get("transacciones") or self._version("transacciones", df_tx),
+            "inventario": versiones.get("inventario") or self._version("inventario", df_inv),
+            "feedback": versiones.get("feedback") or self._version("feedback", df_fb),
+        }
+
+        if self.almacen is not None:
+            return self._master_compartido(df_tx, df_inv, df_fb, versiones)
+
+        if not self._vigente("base", versiones):
+            self._guardar("base", _etapa_base(df_tx), versiones)
+
+        if not self._vigente("tx_inv", versiones):
+            self._guardar("tx_inv", _etapa_tx_inv(self._etapas["base"], df_inv), versiones)
+
+        if not self._vigente("master", versiones):
+            self._guardar("master", _etapa_master(self._etapas["tx_inv"], df_fb), versiones)
+
+        return self._etapas["master"]
+
+    def _master_compartido(self, df_tx, df_inv, df_fb, versiones):
+        # Solo se bajan las etapas que faltan: si la maestra está en el
+        # almacén no se tocan base ni tx_inv
+        def etapa(nombre, calcular):
+            def calcular_y_contar():
+                self.recalculos[nombre] += 1
+                return calcular()
+            return self.almacen.obtener_o_calcular(clave_etapa(nombre, versiones), calcular_y_contar)
+
+        def base():
+            return etapa("base", lambda: _etapa_base(df_tx))
+
+        def tx_inv():
+            return etapa("tx_inv", lambda: _etapa_tx_inv(base(), df_inv))
+
+        return etapa("master", lambda: _etapa_master(tx_inv(), df_fb))
+
+
+def construir_master(df_tx, df_inv, df_fb):
+    # Versión sin estado, para scripts y procesos por lotes
+    versiones = {"transacciones": "-", "inventario": "-", "feedback": "-"}
+    return MotorIntegracion().master(df_tx, df_inv, df_fb, versiones=versiones)
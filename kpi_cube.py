@@ -0,0 +1,119 @@
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Cubo de KPIs materializado sobre día × bodega × ciudad × canal.
+# Solo guarda medidas aditivas (sumas y conteos), así que cualquier
+# combinación de filtros del sidebar se responde sumando celdas del cubo
+# en lugar de recorrer las transacciones, y un lote nuevo se incorpora
+# agregándolo y sumando sus celdas a las existentes. Las filas que se
+# reescriben (incremental.py) restan antes sus celdas viejas con quitar().
+#
+# La dimensión día trunca Fecha_Venta, que en estos datos no trae hora.
+# Las filas con algún nulo en las dimensiones quedan fuera del cubo: los
+# filtros del dashboard (isin) tampoco las dejan pasar nunca.
+
+DIMENSIONES = ["Dia", "Bodega_Origen", "Ciudad_Destino_Limpia", "Canal_Venta"]
+MEDIDAS = ["filas", "ingreso", "margen", "margen_n", "tickets", "fantasmas"]
+
+
+def agregar_celdas(df_master):
+    celdas = pd.DataFrame({
+        "Dia": df_master["Fecha_Venta"].dt.floor("D"),
+        "Bodega_Origen": df_master["Bodega_Origen"],
+        "Ciudad_Destino_Limpia": df_master["Ciudad_Destino_Limpia"],
+        "Canal_Venta": df_master["Canal_Venta"],
+        "filas": 1,
+        "ingreso": df_master["Ingreso"].fillna(0),
+        "margen": df_master["Margen_Utilidad"].fillna(0),
+        "margen_n": df_master["Margen_Utilidad"].notna().astype(int),
+        "tickets": df_master["Ticket_Soporte_Abierto"].fillna(False).astype(int),
+        "fantasmas": df_master["sku_fantasma"].fillna(False).astype(int),
+    })
+    return _sumar(celdas)
+
+
+def _sumar(celdas):
+    # Las dimensiones se pasan a texto para que cubos de lotes distintos
+    # (con categorías distintas) se puedan concatenar sin perder valores
+    for col in DIMENSIONES[1:]:
+        celdas[col] = celdas[col].astype("string")
+    return (
+        celdas
+        .groupby(DIMENSIONES, as_index=False, observed=True, dropna=True)[MEDIDAS]
+        .sum()
+        .sort_values("Dia", kind="stable")
+        .reset_index(drop=True)
+    )
+
+
+class CuboKPI:
+
+    def __init__(self, df_master=None):
+        self.celdas = agregar_celdas(df_master) if df_master is not None else None
+
+    @property
+    def nbytes(self):
+        return int(self.celdas.memory_usage(index=True, deep=True).sum())
+
+    def agregar(self, df_nuevas):
+        # Incremental: solo se agregan las filas nuevas
+        self.celdas = _sumar(pd.concat([self.celdas, agregar_celdas(df_nuevas)], ignore_index=True))
+
+    def quitar(self, df_viejas):
+        # Resta las celdas de filas que ya estaban en el cubo; las celdas
+        # que se quedan sin filas desaparecen
+        viejas = agregar_celdas(df_viejas)
+        viejas[MEDIDAS] = -viejas[MEDIDAS]
+        celdas = _sumar(pd.concat([self.celdas, viejas], ignore_index=True))
+        self.celdas = celdas[celdas["filas"] != 0].reset_index(drop=True)
+
+    # ---------------- Persistencia ----------------
+    def guardar(self, ruta):
+        ruta = Path(ruta)
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        tmp = ruta.with_suffix(".tmp")
+        self.celdas.to_parquet(tmp, index=False)
+        os.replace(tmp, ruta)
+
+    @classmethod
+    def cargar(cls, ruta):
+        cubo = cls()
+        cubo.celdas = pd.read_parquet(ruta)
+        return cubo
+
+    # ---------------- Consultas ----------------
+    def _seleccion(self, fecha_inicio, fecha_fin, filtros):
+        dias = self.celdas["Dia"].to_numpy()
+        i = np.searchsorted(dias, pd.Timestamp(fecha_inicio).to_datetime64().astype(dias.dtype), side="left")
+        j = np.searchsorted(dias, pd.Timestamp(fecha_fin).to_datetime64().astype(dias.dtype), side="right")
+        sel = self.celdas.iloc[i:j]
+
+        mascara = np.ones(len(sel), dtype=bool)
+        for col, valores in filtros.items():
+            mascara &= sel[col].isin(valores).to_numpy()
+        return sel[mascara]
+
+    def totales(self, fecha_inicio, fecha_fin, filtros):
+        t = self._seleccion(fecha_inicio, fecha_fin, filtros)[MEDIDAS].sum()
+        return {
+            "ingreso": t["ingreso"],
+            "margen": t["margen"],
+            "margen_pct": t["margen"] / t["ingreso"] * 100 if t["ingreso"] else np.nan,
+            "fantasmas_pct": t["fantasmas"] / t["filas"] * 100 if t["filas"] else np.nan,
+            "filas": int(t["filas"]),
+        }
+
+    def por_bodega(self, fecha_inicio, fecha_fin, filtros):
+        g = (
+            self._seleccion(fecha_inicio, fecha_fin, filtros)
+            .groupby("Bodega_Origen", as_index=False)[MEDIDAS]
+            .sum()
+        )
+        return pd.DataFrame({
+            "Bodega_Origen": g["Bodega_Origen"],
+            "Margen_Utilidad": g["margen"] / g["margen_n"].replace(0, np.nan),
+            "Tasa_Tickets": g["tickets"] / g["filas"],
+        })
@@ -0,0 +1,70 @@
+import unicodedata
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# Normalización de texto por diccionario: las columnas de texto (categoría,
+# bodega, ciudad) tienen pocas decenas de valores distintos, así que cada
+# valor distinto se normaliza una sola vez y el resultado se expande con los
+# códigos de pd.factorize. La memoria LRU se comparte entre datasets.
+
+# Alias de ciudades (valor ya normalizado -> nombre canónico).
+# Se puede pasar un diccionario propio a mapear_alias.
+ALIAS_CIUDADES = {
+    "med": "Medellín", "medellin": "Medellín",
+    "bog": "Bogotá", "bogota": "Bogotá",
+}
+
+
+@lru_cache(maxsize=8192)
+def _norm_texto(x):
+    x = x.strip().lower()
+    return unicodedata.normalize("NFKD", x).encode("ascii", "ignore").decode("utf-8")
+
+
+def norm(x):
+    if pd.isna(x):
+        return x
+    return _norm_texto(str(x))
+
+
+def info_memo():
+    return _norm_texto.cache_info()
+
+
+# ---------------- Transformación por diccionario ----------------
+def transformar_categorias(serie, fn):
+    # Aplica fn a cada valor distinto y devuelve un categórico.
+    # Valores distintos que colapsan al mismo resultado comparten categoría.
+    codigos, unicos = pd.factorize(serie, use_na_sentinel=True)
+
+    nuevos = [fn(u) for u in unicos]
+    categorias = pd.unique(pd.Series([v for v in nuevos if not pd.isna(v)], dtype=object))
+
+    posicion = {c: i for i, c in enumerate(categorias)}
+    remap = np.array(
+        [-1 if pd.isna(v) else posicion[v] for v in nuevos] + [-1],
+        dtype=np.int32
+    )
+    # el sentinel -1 de factorize indexa el último elemento (-1) de remap
+    nuevos_codigos = remap[codigos]
+
+    return pd.Series(
+        pd.Categorical.from_codes(nuevos_codigos, categories=categorias),
+        index=serie.index,
+        name=serie.name
+    )
+
+
+def normalizar_serie(serie):
+    return transformar_categorias(serie, norm)
+
+
+def mapear_alias(serie, alias=None):
+    # Valores con alias -> nombre canónico; el resto en formato título
+    alias = ALIAS_CIUDADES if alias is None else alias
+    return transformar_categorias(
+        serie,
+        lambda v: alias.get(v, v.title()) if isinstance(v, str) else v
+    )
@@ -0,0 +1,228 @@
+import os
+import tempfile
+import uuid
+from concurrent.futures import ProcessPoolExecutor, wait
+from contextlib import suppress
+
+import pandas as pd
+import pyarrow as pa
+from pandas.api.types import union_categoricals
+
+from cleaning_cache import clave_cache, cargar_de_cache, guardar_en_cache
+from data_processing import clean_inventario, clean_transacciones, clean_feedback
+from ingestion import combinar_reportes, detectar_formato, leer_dataset
+from profiler import perfilar, reporte_desde_perfiles
+
+# Ingesta y limpieza en paralelo (pool de procesos).
+#   - Los tres datasets son independientes hasta el merge: cada uno se
+#     parsea y limpia en su propio proceso.
+#   - clean_transacciones es local a la fila, así que el CSV (sin
+#     comprimir) de transacciones se parte además por filas (cortes en
+#     saltos de línea) entre varios procesos. Inventario (dedup por SKU) y
+#     feedback (medianas, dedup) necesitan el dataset completo y no se parten.
+#   - Cada proceso lee con el lector tipado de ingestion.py; el reporte de
+#     ingesta (filas mal formadas, valores inválidos) se agrega al de
+#     limpieza bajo "Ingesta".
+#   - Los resultados vuelven como archivos Arrow IPC en memoria compartida
+#     (/dev/shm cuando existe) que el proceso principal lee con memory_map,
+#     en lugar de DataFrames serializados con pickle. Si una tarea falla,
+#     los archivos que dejaron las demás se borran igual.
+#   - Los reportes de auditoría se arman combinando los perfiles parciales.
+#   - limites_entrega (opcional) reemplaza el recorte fijo de
+#     Tiempo_Entrega_Real en clean_transacciones (p. ej. desde los
+#     bosquejos de sketches.py); forma parte de la clave de cache.
+
+LIMPIADORES = {
+    "inventario": clean_inventario,
+    "transacciones": clean_transacciones,
+    "feedback": clean_feedback,
+}
+
+# Por debajo de este tamaño el costo del pool no compensa
+BYTES_MIN_PARALELO = 5_000_000
+BYTES_POR_PARTE = 16_000_000
+
+_pool = None
+_pool_workers = None
+
+
+def _dir_intercambio():
+    return "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+
+def obtener_pool(max_workers=None):
+    # Un único pool por proceso: evita pagar el arranque en cada limpieza
+    global _pool, _pool_workers
+    max_workers = max_workers or os.cpu_count() or 1
+    if _pool is None or _pool_workers != max_workers:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+        _pool = ProcessPoolExecutor(max_workers=max_workers)
+        _pool_workers = max_workers
+    return _pool
+
+
+# ---------------- Intercambio por Arrow ----------------
+def _a_arrow(df):
+    try:
+        tabla = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # columnas con tipos mezclados: se devuelve el DataFrame tal cual
+        return df
+
+    ruta = os.path.join(_dir_intercambio(), f"techlog-{uuid.uuid4().hex}.arrow")
+    with pa.OSFile(ruta, "wb") as sink, pa.ipc.new_file(sink, tabla.schema) as writer:
+        writer.write_table(tabla)
+    return ruta
+
+
+def _de_arrow(resultado):
+    if isinstance(resultado, pd.DataFrame):
+        return resultado
+    try:
+        with pa.memory_map(resultado) as fuente:
+            return pa.ipc.open_file(fuente).read_all().to_pandas()
+    finally:
+        os.remove(resultado)
+
+
+def _borrar_intercambio(futuros):
+    # Archivos Arrow de las tareas terminadas que no se llegaron a leer
+    wait(futuros)
+    for futuro in futuros:
+        if futuro.cancelled() or futuro.exception() is not None:
+            continue
+        for resultado in (futuro.result()["raw"], futuro.result()["clean"]):
+            if isinstance(resultado, str):
+                with suppress(FileNotFoundError):
+                    os.remove(resultado)
+
+
+def concatenar_partes(partes):
+    # Las partes traen categorías distintas: se unen sin pasar por object
+    df = pd.concat(partes, ignore_index=True)
+    for col in partes[0].columns:
+        tipos = [p[col].dtype for p in partes]
+        if all(isinstance(t, pd.CategoricalDtype) for t in tipos):
+            df[col] = pd.Series(union_categoricals([p[col] for p in partes]), index=df.index)
+        elif len(set(map(str, tipos))) > 1 and not all(pd.api.types.is_numeric_dtype(t) for t in tipos):
+            # Una parte cayó a texto (valor no numérico) y otra no: la
+            # columna unida queda como texto, igual que al leerla entera
+            df[col] = df[col].astype("string")
+    return df
+
+
+# ---------------- Tareas (se ejecutan en los procesos del pool) ----------------
+def _resultado(df_raw, df_clean, ingesta, por_arrow):
+    empaquetar = _a_arrow if por_arrow else (lambda df: df)
+    return {
+        "raw": empaquetar(df_raw),
+        "clean": empaquetar(df_clean),
+        "perfil_raw": perfilar(df_raw),
+        "perfil_clean": perfilar(df_clean),
+        "ingesta": ingesta,
+    }
+
+
+def _limpiar(nombre, df_raw, limites_entrega=None):
+    if nombre == "transacciones":
+        return clean_transacciones(df_raw, limites_entrega=limites_entrega)
+    return LIMPIADORES[nombre](df_raw)
+
+
+def _tarea_dataset(nombre, datos, por_arrow=True, limites_entrega=None):
+    df_raw, ingesta = leer_dataset(nombre, datos)
+    return _resultado(df_raw, _limpiar(nombre, df_raw, limites_entrega), ingesta, por_arrow)
+
+
+def _tarea_parte_transacciones(datos, limites_entrega=None):
+    df_raw, ingesta = leer_dataset("transacciones", datos)
+    return _resultado(df_raw, clean_transacciones(df_raw, limites_entrega=limites_entrega), ingesta, True)
+
+
+def partir_csv(datos, partes):
+    # Cortes en saltos de línea; cada parte lleva la cabecera.
+    # Válido para archivos sin saltos de línea dentro de campos (transacciones).
+    fin_cabecera = datos.index(b"\n") + 1
+    cabecera, cuerpo = datos[:fin_cabecera], datos[fin_cabecera:]
+
+    cortes = [0]
+    for k in range(1, partes):
+        pos = cuerpo.find(b"\n", max(cortes[-1], k * len(cuerpo) // partes))
+        if pos == -1:
+            break
+        cortes.append(pos + 1)
+    cortes.append(len(cuerpo))
+
+    return [cabecera + cuerpo[a:b] for a, b in zip(cortes, cortes[1:]) if b > a]
+
+
+# ---------------- Orquestación ----------------
+def _combinar(resultados):
+    raws = [_de_arrow(r["raw"]) for r in resultados]
+    cleans = [_de_arrow(r["clean"]) for r in resultados]
+
+    perfil_raw, perfil_clean = resultados[0]["perfil_raw"], resultados[0]["perfil_clean"]
+    for r in resultados[1:]:
+        perfil_raw = perfil_raw.combinar(r["perfil_raw"])
+        perfil_clean = perfil_clean.combinar(r["perfil_clean"])
+
+    df_raw = raws[0] if len(raws) == 1 else concatenar_partes(raws)
+    df_clean = cleans[0] if len(cleans) == 1 else concatenar_partes(cleans)
+    reporte = reporte_desde_perfiles(perfil_raw, perfil_clean)
+    reporte["Ingesta"] = combinar_reportes([r["ingesta"] for r in resultados])
+    return df_raw, df_clean, reporte
+
+
+def limpiar_datasets(archivos, max_workers=None, limites_entrega=None):
+    # archivos: {"inventario": bytes, "transacciones": bytes, "feedback": bytes}
+    # Devuelve {nombre: {"raw", "clean", "reporte", "clave", "hit"}}
+    resultados = {}
+    pendientes = {}
+
+    for nombre, datos in archivos.items():
+        clave = clave_cache(nombre, datos)
+        if nombre == "transacciones" and limites_entrega is not None:
+            clave += "-entrega-{:g}-{:g}".format(*limites_entrega)
+        cacheado = cargar_de_cache(clave, nombre)
+        if cacheado is not None:
+            df_raw, df_clean, reporte = cacheado
+            resultados[nombre] = {"raw": df_raw, "clean": df_clean, "reporte": reporte,
+                                  "clave": clave, "hit": True}
+        else:
+            pendientes[nombre] = (clave, datos)
+
+    if not pendientes:
+        return resultados
+
+    total = sum(len(d) for _, d in pendientes.values())
+    todos = []
+    try:
+        if total < BYTES_MIN_PARALELO:
+            # Archivos pequeños: en serie, sin pool ni intercambio por Arrow
+            parciales = {n: [_tarea_dataset(n, d, por_arrow=False, limites_entrega=limites_entrega)]
+                         for n, (_, d) in pendientes.items()}
+        else:
+            pool = obtener_pool(max_workers)
+            futuros = {}
+            for nombre, (_, datos) in pendientes.items():
+                if nombre == "transacciones" and detectar_formato(datos) == "csv":
+                    partes = max(1, min(_pool_workers, len(datos) // BYTES_POR_PARTE + 1))
+                    futuros[nombre] = [pool.submit(_tarea_parte_transacciones, p, limites_entrega)
+                                       for p in partir_csv(datos, partes)]
+                else:
+                    futuros[nombre] = [pool.submit(_tarea_dataset, nombre, datos,
+                                                   limites_entrega=limites_entrega)]
+                todos.extend(futuros[nombre])
+            parciales = {n: [f.result() for f in lista] for n, lista in futuros.items()}
+
+        for nombre, lista in parciales.items():
+            clave = pendientes[nombre][0]
+            df_raw, df_clean, reporte = _combinar(lista)
+            guardar_en_cache(clave, df_raw, df_clean, reporte)
+            resultados[nombre] = {"raw": df_raw, "clean": df_clean, "reporte": reporte,
+                                  "clave": clave, "hit": False}
+    finally:
+        _borrar_intercambio(todos)
+
+    return resultados
@@ -0,0 +1,260 @@
+import numpy as np
+import pandas as pd
+
+# Perfilador de datos en una pasada.
+# Cada bloque de filas produce un perfil parcial combinable:
+#   - por columna: nulos; y para las numéricas n, media y M2 (Chan),
+#     mínimo, máximo y una muestra acotada (reservorio) para cuantiles;
+#   - por fila: hash de 64 bits para contar duplicados (8 bytes por fila).
+# Los perfiles de varios bloques se combinan, así que un archivo grande se
+# perfila bloque a bloque sin tenerlo completo en memoria.
+#
+# Cuantiles y conteos de outliers (3 sigma e IQR) salen de la muestra: son
+# exactos mientras la columna tenga hasta TAMANO_MUESTRA valores y
+# estimaciones escaladas a n por encima de eso.
+
+TAMANO_MUESTRA = 50_000
+CUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+FILAS_POR_BLOQUE = 250_000
+
+
+def _es_numerica(serie):
+    return pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie)
+
+
+class PerfilColumna:
+
+    def __init__(self, nulos=0, numerica=False):
+        self.nulos = nulos
+        self.numerica = numerica
+        self.n = 0
+        self.media = 0.0
+        self.m2 = 0.0
+        self.minimo = np.inf
+        self.maximo = -np.inf
+        self.muestra = np.empty(0)
+        self.vistos = 0
+
+    @classmethod
+    def de_serie(cls, serie, rng):
+        perfil = cls(int(serie.isna().sum()), _es_numerica(serie))
+        if not perfil.numerica:
+            return perfil
+
+        valores = serie.to_numpy(dtype="float64", na_value=np.nan)
+        valores = valores[~np.isnan(valores)]
+        if len(valores) == 0:
+            return perfil
+
+        perfil.n = len(valores)
+        perfil.media = valores.mean()
+        perfil.m2 = ((valores - perfil.media) ** 2).sum()
+        perfil.minimo = valores.min()
+        perfil.maximo = valores.max()
+        perfil.vistos = len(valores)
+        if len(valores) > TAMANO_MUESTRA:
+            valores = rng.choice(valores, TAMANO_MUESTRA, replace=False)
+        perfil.muestra = valores
+        return perfil
+
+    def combinar(self, otro, rng):
+        res = PerfilColumna(self.nulos + otro.nulos, self.numerica or otro.numerica)
+        if otro.n == 0 or self.n == 0:
+            fuente = self if otro.n == 0 else otro
+            res.n, res.media, res.m2 = fuente.n, fuente.media, fuente.m2
+            res.minimo, res.maximo = fuente.minimo, fuente.maximo
+            res.muestra, res.vistos = fuente.muestra, fuente.vistos
+            return res
+
+        res.n = self.n + otro.n
+        delta = otro.media - self.media
+        res.media = self.media + delta * otro.n / res.n
+        res.m2 = self.m2 + otro.m2 + delta * delta * self.n * otro.n / res.n
+        res.minimo = min(self.minimo, otro.minimo)
+        res.maximo = max(self.maximo, otro.maximo)
+
+        # Reservorio: cada parte aporta en proporción a los valores que vio
+        res.vistos = self.vistos + otro.vistos
+        if len(self.muestra) + len(otro.muestra) <= TAMANO_MUESTRA:
+            res.muestra = np.concatenate([self.muestra, otro.muestra])
+        else:
+            k = round(TAMANO_MUESTRA * self.vistos / res.vistos)
+            k = min(k, len(self.muestra))
+            resto = min(TAMANO_MUESTRA - k, len(otro.muestra))
+            res.muestra = np.concatenate([
+                rng.choice(self.muestra, k, replace=False),
+                rng.choice(otro.muestra, resto, replace=False),
+            ])
+        return res
+
+    # ---------------- Estadísticos ----------------
+    @property
+    def std(self):
+        return np.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else np.nan
+
+    def _escalar(self, conteo_en_muestra):
+        if len(self.muestra) == 0:
+            return 0
+        return int(round(conteo_en_muestra * self.n / len(self.muestra)))
+
+    def outliers_3sigma(self):
+        if not self.n or np.isnan(self.std):
+            return 0
+        return self._escalar(int((np.abs(self.muestra - self.media) > 3 * self.std).sum()))
+
+    def outliers_iqr(self):
+        if not self.n:
+            return 0
+        q1, q3 = np.quantile(self.muestra, [0.25, 0.75])
+        iqr = q3 - q1
+        fuera = (self.muestra < q1 - 1.5 * iqr) | (self.muestra > q3 + 1.5 * iqr)
+        return self._escalar(int(fuera.sum()))
+
+    def cuantiles(self):
+        if not self.n:
+            return {f"p{int(q * 100)}": np.nan for q in CUANTILES}
+        return {f"p{int(q * 100)}": v for q, v in zip(CUANTILES, np.quantile(self.muestra, CUANTILES))}
+
+
+class Perfil:
+
+    def __init__(self, filas=0, hashes=None, columnas=None):
+        self.filas = filas
+        self.hashes = np.empty(0, dtype=np.uint64) if hashes is None else hashes
+        self.columnas = columnas or {}
+
+    @classmethod
+    def de_bloque(cls, df, semilla=0):
+        rng = np.random.default_rng(semilla)
+        hashes = np.unique(pd.util.hash_pandas_object(df, index=False).to_numpy())
+        columnas = {col: PerfilColumna.de_serie(df[col], rng) for col in df.columns}
+        return cls(len(df), hashes, columnas)
+
+    def combinar(self, otro, semilla=0):
+        rng = np.random.default_rng(semilla)
+        columnas = dict(self.columnas)
+        for col, p in otro.columnas.items():
+            columnas[col] = columnas[col].combinar(p, rng) if col in columnas else p
+        hashes = np.union1d(self.hashes, otro.hashes)
+        return Perfil(self.filas + otro.filas, hashes, columnas)
+
+    # ---------------- Resultados ----------------
+    @property
+    def duplicados(self):
+        # filas cuyo contenido ya apareció antes (como df.duplicated().sum())
+        return self.filas - len(self.hashes)
+
+    def pct_nulos(self):
+        return pd.Series(
+            {col: p.nulos / self.filas * 100 if self.filas else 0.0 for col, p in self.columnas.items()}
+        )
+
+    def numericas(self):
+        return {col: p for col, p in self.columnas.items() if p.numerica}
+
+    def outliers_3sigma(self):
+        return sum(p.outliers_3sigma() for p in self.numericas().values())
+
+    def tabla(self):
+        # Una fila por columna, para mostrar en la auditoría
+        filas = []
+        for col, p in self.columnas.items():
+            fila = {"Columna": col, "Nulos (%)": p.nulos / self.filas * 100 if self.filas else 0.0}
+            if p.numerica:
+                fila.update({
+                    "Outliers 3σ": p.outliers_3sigma(),
+                    "Outliers IQR": p.outliers_iqr(),
+                    "Mín": p.minimo if p.n else np.nan,
+                    "Máx": p.maximo if p.n else np.nan,
+                    **p.cuantiles(),
+                })
+            filas.append(fila)
+        return pd.DataFrame(filas)
+
+
+def perfilar_bloques(bloques):
+    # bloques: cualquier iterable de DataFrames (p. ej. read_csv con chunksize)
+    perfil = None
+    for n, bloque in enumerate(bloques):
+        parcial = Perfil.de_bloque(bloque, semilla=n)
+        perfil = parcial if perfil is None else perfil.combinar(parcial, semilla=n)
+    return perfil or Perfil()
+
+
+def perfilar(df, filas_por_bloque=FILAS_POR_BLOQUE):
+    return perfilar_bloques(
+        df.iloc[i:i + filas_por_bloque] for i in range(0, max(len(df), 1), filas_por_bloque)
+    )
+
+
+# ---------------- Puntajes de salud ----------------
+def _sin_claves(perfil):
+    # Las claves sustitutas (schema.py) se derivan de los IDs: no entran al puntaje
+    columnas = {c: p for c, p in perfil.columnas.items() if not c.endswith("_Key")}
+    return Perfil(perfil.filas, perfil.hashes, columnas)
+
+
+def resumen_desde_perfiles(perfil_raw, perfil_clean):
+    perfil_clean = _sin_claves(perfil_clean)
+    filas_iniciales = perfil_raw.filas
+    filas_finales = perfil_clean.filas
+    filas_eliminadas = filas_iniciales - filas_finales
+
+    duplicados = perfil_raw.duplicados
+    pct_nulos = perfil_clean.pct_nulos().mean()
+
+    salud = max(
+        0,
+        100 - (
+            pct_nulos * 0.4 +
+            (duplicados / max(1, filas_iniciales)) * 100 * 0.3 +
+            (filas_eliminadas / max(1, filas_iniciales)) * 100 * 0.3
+        )
+    )
+
+    return {
+        "Filas iniciales": int(filas_iniciales),
+        "Filas finales": int(filas_finales),
+        "Filas eliminadas": int(filas_eliminadas),
+        "Duplicados": int(duplicados),
+        "Salud de datos (%)": round(float(salud), 1)
+    }
+
+
+def health_desde_perfiles(perfil_raw, perfil_clean):
+    perfil_clean = _sin_claves(perfil_clean)
+    pct_nulos = perfil_clean.pct_nulos()
+    duplicados = perfil_raw.duplicados
+    outliers = perfil_clean.outliers_3sigma()
+    celdas_numericas = perfil_clean.filas * len(perfil_clean.numericas())
+
+    health = max(
+        0,
+        100 - (
+            pct_nulos.mean() * 0.4 +
+            (duplicados / max(1, perfil_raw.filas)) * 100 * 0.2 +
+            (outliers / max(1, celdas_numericas)) * 100 * 0.4
+        )
+    )
+
+    return {
+        "health_score": round(float(health), 1),
+        "pct_nulos": pct_nulos,
+        "duplicados": int(duplicados),
+        "outliers": int(outliers)
+    }
+
+
+def reporte_auditoria(df_raw, df_clean):
+    # Reporte que guarda la cache de limpieza: resumen + salud + perfil por columna
+    return reporte_desde_perfiles(perfilar(df_raw), perfilar(df_clean))
+
+
+def reporte_desde_perfiles(perfil_raw, perfil_clean):
+    health = health_desde_perfiles(perfil_raw, perfil_clean)
+
+    reporte = resumen_desde_perfiles(perfil_raw, perfil_clean)
+    reporte["Health score"] = health["health_score"]
+    reporte["Outliers (3σ)"] = health["outliers"]
+    reporte["Perfil"] = perfil_clean.tabla().to_dict("records")
+    return reporte
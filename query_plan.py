@@ -0,0 +1,324 @@
+import numpy as np
+import pandas as pd
+
+from filter_index import IndiceFiltros
+from integration import DERIVADAS, ENTRADAS_DERIVADAS
+from schema import aplicar_esquema
+
+# Capa de consultas perezosa sobre la tabla maestra.
+# Una Consulta describe fuentes limpias -> joins -> derivadas -> filtros ->
+# agregación sin ejecutar nada; al ejecutarla se arma un plan físico:
+#   - predicados empujados a las fuentes antes de los joins: fecha, ciudad
+#     y canal sobre transacciones (rango de fechas por búsqueda binaria y
+#     bitmaps, con el mismo IndiceFiltros de la maestra); bodega y demás
+#     columnas del inventario sobre el inventario; columnas del feedback
+#     sobre el feedback. Un filtro sobre el lado derecho de un left join
+#     descarta los nulos, así que ese join pasa a inner (mismo resultado);
+#   - el feedback se reduce antes del join a las transacciones que
+#     sobrevivieron (semi-join por búsqueda binaria sobre la clave
+#     ordenada), así el costo depende del tamaño de la selección;
+#   - poda de columnas: cada fuente aporta solo las columnas pedidas, las
+#     que necesitan las derivadas y las claves de join. Un join cuyas
+#     columnas no se piden se omite si sus claves son únicas (no cambia el
+#     número de filas); si no, se une solo la clave.
+# Motores: "pandas" (por defecto) y "arrow" (joins en Acero, el motor
+# columnar en proceso de pyarrow).
+#
+#   fuentes = FuentesMaestra(df_tx, df_inv, df_fb)
+#   df_f = Consulta(fuentes).filtrar(inicio, fin, filtros).ejecutar()
+#   Consulta(fuentes).seleccionar(["Ingreso"]).agrupar("Canal_Venta", ingreso=("Ingreso", "sum"))
+
+MOTORES = ("pandas", "arrow")
+COLUMNAS_INDICE_TX = ("Ciudad_Destino_Limpia", "Canal_Venta")
+FUNCIONES = ("sum", "mean", "count", "min", "max", "size")
+
+
+class ErrorConsulta(ValueError):
+    pass
+
+
+# ---------------- Fuentes ----------------
+class FuentesMaestra:
+    # Se preparan una vez por versión de los datos limpios
+
+    def __init__(self, df_tx, df_inv, df_fb):
+        tx = df_tx.copy()
+        tx["Fecha_Venta"] = pd.to_datetime(tx["Fecha_Venta"], errors="coerce")
+        tx = tx.dropna(subset=["Fecha_Venta"])
+        # orden por fecha + bitmaps de ciudad y canal
+        self.indice_tx = IndiceFiltros(tx, columnas=COLUMNAS_INDICE_TX)
+
+        self.inv = df_inv.drop(columns="SKU_ID").dropna(subset=["SKU_Key"]).reset_index(drop=True)
+
+        fb = df_fb.drop(columns="Transaccion_ID").dropna(subset=["Transaccion_Key"])
+        orden = np.argsort(fb["Transaccion_Key"].to_numpy(dtype="int64"), kind="stable")
+        self.fb = fb.iloc[orden].reset_index(drop=True)
+        self.claves_fb = self.fb["Transaccion_Key"].to_numpy(dtype="int64")
+
+        self.columnas = {
+            "transacciones": list(self.indice_tx.df.columns),
+            "inventario": [c for c in self.inv.columns if c != "SKU_Key"],
+            "feedback": [c for c in self.fb.columns if c != "Transaccion_Key"],
+        }
+        self.claves_unicas = {
+            "inventario": bool(self.inv["SKU_Key"].is_unique),
+            "feedback": bool(self.fb["Transaccion_Key"].is_unique),
+        }
+        self._arrow = {}
+
+    def origen(self, col):
+        for nombre, columnas in self.columnas.items():
+            if col in columnas:
+                return nombre
+        if col in DERIVADAS or col == "_merge":
+            return "derivada"
+        raise ErrorConsulta(f"Columna desconocida: {col}")
+
+    def columnas_master(self):
+        return [*self.columnas["transacciones"], *self.columnas["inventario"],
+                *self.columnas["feedback"], *DERIVADAS]
+
+    def posiciones_feedback(self, claves):
+        # Semi-join: filas del feedback (ordenado por clave) de esas transacciones
+        claves = np.unique(claves)
+        inicio = np.searchsorted(self.claves_fb, claves, side="left")
+        fin = np.searchsorted(self.claves_fb, claves, side="right")
+        largo = fin - inicio
+        if largo.sum() == 0:
+            return np.empty(0, dtype=np.int64)
+        # concatenación vectorizada de los rangos [inicio, fin)
+        desplazamiento = np.repeat(inicio - np.cumsum(largo) + largo, largo)
+        return desplazamiento + np.arange(largo.sum())
+
+    def arrow(self, nombre):
+        import pyarrow as pa
+
+        if nombre not in self._arrow:
+            df = {"inventario": self.inv, "feedback": self.fb}[nombre]
+            self._arrow[nombre] = pa.Table.from_pandas(df, preserve_index=False)
+        return self._arrow[nombre]
+
+
+# ---------------- Plan ----------------
+class PlanFisico:
+
+    def __init__(self, fuentes, fechas, predicados, salida, agrupacion):
+        self.fechas = fechas
+        self.agrupacion = agrupacion
+        self.salida = salida
+
+        # predicados por fuente
+        self.predicados = {"transacciones": {}, "inventario": {}, "feedback": {}}
+        for col, seleccion in predicados.items():
+            origen = fuentes.origen(col)
+            if origen == "derivada":
+                raise ErrorConsulta(f"No se puede filtrar por la columna derivada {col}")
+            self.predicados[origen][col] = list(seleccion)
+
+        # columnas necesarias: salida + entradas de derivadas (transitivo)
+        necesarias = set(salida)
+        if agrupacion is not None:
+            por, medidas = agrupacion
+            necesarias |= set(por) | {col for col, _ in medidas.values() if col is not None}
+        pendientes = [c for c in necesarias if c in ENTRADAS_DERIVADAS]
+        while pendientes:
+            for entrada in ENTRADAS_DERIVADAS[pendientes.pop()]:
+                if entrada not in necesarias:
+                    necesarias.add(entrada)
+                    if entrada in ENTRADAS_DERIVADAS:
+                        pendientes.append(entrada)
+        self.derivadas = [c for c in DERIVADAS if c in necesarias]
+
+        self.columnas = {
+            nombre: [c for c in cols if c in necesarias or c in self.predicados[nombre]]
+            for nombre, cols in fuentes.columnas.items()
+        }
+        self.columnas["transacciones"] = list(dict.fromkeys(
+            self.columnas["transacciones"] + ["SKU_Key", "Transaccion_Key"]
+        ))
+
+        # joins: inner si hay predicado sobre el lado derecho; se omiten si
+        # no aportan columnas y sus claves son únicas
+        self.joins = {}
+        for nombre in ("inventario", "feedback"):
+            aporta = bool(self.columnas[nombre]) or (nombre == "inventario" and "_merge" in necesarias)
+            if self.predicados[nombre]:
+                self.joins[nombre] = "inner"
+            elif aporta or not fuentes.claves_unicas[nombre]:
+                self.joins[nombre] = "left"
+        self.indicador = "_merge" in necesarias
+
+    def explicar(self):
+        lineas = []
+        fi, ff = self.fechas
+        tx = ", ".join(f"{c} in {len(v)} valores" for c, v in self.predicados["transacciones"].items())
+        lineas.append(f"Scan transacciones [{', '.join(self.columnas['transacciones'])}]"
+                      f" fecha [{fi} .. {ff}]" + (f" {tx}" if tx else ""))
+        for nombre, clave in (("inventario", "SKU_Key"), ("feedback", "Transaccion_Key")):
+            if nombre not in self.joins:
+                lineas.append(f"  (join {nombre} omitido)")
+                continue
+            pred = ", ".join(f"{c} in {len(v)} valores" for c, v in self.predicados[nombre].items())
+            semi = " semi-join por clave" if nombre == "feedback" else ""
+            lineas.append(f"  {self.joins[nombre].upper()} JOIN {nombre} ON {clave}"
+                          f" [{', '.join(self.columnas[nombre])}]{semi}" + (f" where {pred}" if pred else ""))
+        if self.derivadas:
+            lineas.append(f"  Derivadas [{', '.join(self.derivadas)}]")
+        if self.agrupacion is not None:
+            lineas.append(f"  Agrupar por {self.agrupacion[0]}: {list(self.agrupacion[1])}")
+        return "\n".join(lineas)
+
+
+# ---------------- Ejecución ----------------
+def _aislar(df, predicados):
+    for col, seleccion in predicados.items():
+        df = df[df[col].isin(seleccion).to_numpy(dtype=bool)]
+    return df
+
+
+def _transacciones(fuentes, plan):
+    indice = fuentes.indice_tx
+    fi, ff = plan.fechas
+    predicados = dict(plan.predicados["transacciones"])
+    bitmaps = {c: predicados.pop(c) for c in COLUMNAS_INDICE_TX if c in predicados}
+
+    pos = indice.posiciones(fi if fi is not None else indice.fecha_min(),
+                            ff if ff is not None else indice.fecha_max(), bitmaps)
+    tx = indice.df[plan.columnas["transacciones"]]
+    tx = tx.iloc[pos] if isinstance(pos, slice) else tx.take(pos)
+    return _aislar(tx, predicados)
+
+
+def _feedback(fuentes, plan, claves_tx):
+    pos = fuentes.posiciones_feedback(claves_tx)
+    fb = fuentes.fb[["Transaccion_Key", *plan.columnas["feedback"]]].take(pos)
+    return _aislar(fb, plan.predicados["feedback"])
+
+
+def _ejecutar_pandas(fuentes, plan, tx):
+    df = tx
+    if "inventario" in plan.joins:
+        inv = _aislar(fuentes.inv[["SKU_Key", *plan.columnas["inventario"]]], plan.predicados["inventario"])
+        df = df.merge(inv, on="SKU_Key", how=plan.joins["inventario"], indicator=plan.indicador)
+    if "feedback" in plan.joins:
+        fb = _feedback(fuentes, plan, df["Transaccion_Key"].dropna().to_numpy(dtype="int64"))
+        df = df.merge(fb, on="Transaccion_Key", how=plan.joins["feedback"])
+    return df
+
+
+def _ejecutar_arrow(fuentes, plan, tx):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    # El orden de salida de Acero no está definido: se numeran las filas
+    # de las fuentes y se reordena al final, igual que el merge de pandas
+    tabla = pa.Table.from_pandas(tx.reset_index(drop=True), preserve_index=False)
+    tabla = tabla.append_column("_fila", pa.array(np.arange(len(tx))))
+    orden = [("_fila", "ascending")]
+
+    if "inventario" in plan.joins:
+        inv = fuentes.arrow("inventario").select(["SKU_Key", *plan.columnas["inventario"]])
+        for col, seleccion in plan.predicados["inventario"].items():
+            inv = inv.filter(pc.is_in(inv[col], value_set=pa.array(seleccion)))
+        if plan.indicador:
+            inv = inv.append_column("_en_inventario", pa.array(np.ones(len(inv), dtype=bool)))
+        tipo = "inner" if plan.joins["inventario"] == "inner" else "left outer"
+        tabla = tabla.join(_sin_diccionarios(inv), "SKU_Key", join_type=tipo)
+
+    if "feedback" in plan.joins:
+        claves = pc.drop_null(tabla["Transaccion_Key"]).to_numpy()
+        pos = fuentes.posiciones_feedback(claves.astype("int64"))
+        fb = fuentes.arrow("feedback").select(["Transaccion_Key", *plan.columnas["feedback"]]).take(pos)
+        fb = fb.append_column("_fila_fb", pa.array(pos))
+        for col, seleccion in plan.predicados["feedback"].items():
+            fb = fb.filter(pc.is_in(fb[col], value_set=pa.array(seleccion)))
+        tipo = "inner" if plan.joins["feedback"] == "inner" else "left outer"
+        tabla = tabla.join(_sin_diccionarios(fb), "Transaccion_Key", join_type=tipo)
+        orden.append(("_fila_fb", "ascending"))
+
+    tabla = tabla.sort_by(orden)
+    df = tabla.to_pandas(types_mapper=_tipos_arrow().get)
+    if plan.indicador:
+        df["_merge"] = np.where(df["_en_inventario"].isna(), "left_only", "both")
+    return df.drop(columns=[c for c in ("_fila", "_fila_fb", "_en_inventario") if c in df.columns])
+
+
+def _tipos_arrow():
+    import pyarrow as pa
+
+    # tipos nullable de pandas: el join pierde los metadatos de pandas
+    return {pa.bool_(): pd.BooleanDtype(), pa.int64(): pd.Int64Dtype(), pa.string(): pd.StringDtype()}
+
+
+def _sin_diccionarios(tabla):
+    # Acero no acepta columnas diccionario fuera de las claves del join
+    import pyarrow as pa
+
+    campos = [
+        pa.field(f.name, f.type.value_type) if pa.types.is_dictionary(f.type) else f
+        for f in tabla.schema
+    ]
+    return tabla.cast(pa.schema(campos))
+
+
+class Consulta:
+
+    def __init__(self, fuentes, fechas=(None, None), predicados=None, columnas=None, agrupacion=None):
+        self.fuentes = fuentes
+        self.fechas = fechas
+        self.predicados = predicados or {}
+        self.columnas = columnas
+        self.agrupacion = agrupacion
+
+    def _con(self, **cambios):
+        actual = {"fechas": self.fechas, "predicados": self.predicados,
+                  "columnas": self.columnas, "agrupacion": self.agrupacion}
+        return Consulta(self.fuentes, **(actual | cambios))
+
+    # ---------------- Construcción (perezosa) ----------------
+    def filtrar(self, fecha_inicio=None, fecha_fin=None, filtros=None):
+        # filtros: {columna: valores permitidos}, como en el sidebar
+        return self._con(fechas=(fecha_inicio, fecha_fin),
+                         predicados=self.predicados | (filtros or {}))
+
+    def seleccionar(self, columnas):
+        return self._con(columnas=list(columnas))
+
+    def agrupar(self, por, **medidas):
+        # medidas: nombre=(columna, función); función en FUNCIONES
+        por = [por] if isinstance(por, str) else list(por)
+        for nombre, (col, fn) in medidas.items():
+            if fn not in FUNCIONES:
+                raise ErrorConsulta(f"Función de agregación no soportada: {fn}")
+        return self._con(agrupacion=(por, medidas))
+
+    def plan(self):
+        if self.columnas is not None:
+            salida = self.columnas
+        else:
+            # agrupando, solo hacen falta las columnas de la agrupación
+            salida = [] if self.agrupacion is not None else self.fuentes.columnas_master()
+        return PlanFisico(self.fuentes, self.fechas, self.predicados, salida, self.agrupacion)
+
+    def explicar(self):
+        return self.plan().explicar()
+
+    # ---------------- Ejecución ----------------
+    def ejecutar(self, motor="pandas"):
+        if motor not in MOTORES:
+            raise ErrorConsulta(f"Motor desconocido: {motor} (opciones: {', '.join(MOTORES)})")
+        plan = self.plan()
+
+        tx = _transacciones(self.fuentes, plan)
+        df = (_ejecutar_arrow if motor == "arrow" else _ejecutar_pandas)(self.fuentes, plan, tx)
+        for col in plan.derivadas:
+            df[col] = DERIVADAS[col][1](df)
+        df = aplicar_esquema(df, "master")
+
+        if plan.agrupacion is not None:
+            por, medidas = plan.agrupacion
+            return (
+                df.groupby(por, observed=True, as_index=False)
+                .agg(**{n: (c if c is not None else por[0], fn) for n, (c, fn) in medidas.items()})
+            )
+        return df[[c for c in plan.salida if c in df.columns]].reset_index(drop=True)
@@ -0,0 +1,221 @@
+import numpy as np
+import pandas as pd
+
+# Registro de esquemas: tipo declarado de cada columna de los tres datasets
+# limpios y de la tabla maestra.
+#
+# Tipos:
+#   "categoria" -> category (columnas de baja cardinalidad)
+#   "texto"     -> string
+#   "sino"      -> boolean nullable ("Sí"/"No" -> True/False)
+#   "bool"      -> boolean nullable
+#   "fecha"     -> datetime64
+#   "dinero"    -> float64 (importes: se conserva la precisión en las sumas)
+#   "medida"    -> float32 (días, ratings, edades, cantidades) cuando todos
+#                  los valores caben exactos; si no (valores > 2**24, decimales
+#                  como -41.7), la columna queda en float64
+#   "clave"     -> Int64, clave sustituta entera de un ID "PREFIJO-####"
+#
+# Claves sustitutas: un ID en forma canónica (el prefijo declarado de su
+# columna y el número sin ceros a la izquierda, p. ej. "TRX-12") se guarda
+# como ese número, así que las claves conservan el orden de los IDs y sirven
+# de marca de agua. Cualquier otra forma ("TRX-00012", "ABC-12", números de
+# más de 18 cifras) recibe un hash de 63 bits del texto en el rango
+# negativo: nunca choca con una clave canónica. Dos IDs no canónicos
+# distintos pueden compartir hash (probabilidad ~n²/2**64); dentro de una
+# misma columna eso se detecta y es un ErrorEsquema, entre datasets
+# distintos no se verifica.
+#
+# Las columnas marcadas como requeridas deben existir; el resto se tipa si
+# está presente.
+
+
+class ErrorEsquema(ValueError):
+    pass
+
+
+TIPOS = {
+    "categoria": "category",
+    "texto": "string",
+    "sino": "boolean",
+    "bool": "boolean",
+    "fecha": "datetime64",
+    "dinero": "float64",
+    "medida": "float32",
+    "clave": "Int64",
+}
+
+# columna -> (tipo, requerida)
+ESQUEMAS = {
+    "inventario": {
+        "SKU_ID": ("categoria", True),
+        "SKU_Key": ("clave", True),
+        "Categoria": ("categoria", True),
+        "Stock_Actual": ("medida", True),
+        "Costo_Unitario_USD": ("dinero", True),
+        "Punto_Reorden": ("medida", True),
+        "Lead_Time_Dias": ("medida", True),
+        "Bodega_Origen": ("categoria", True),
+        "Ultima_Revision": ("fecha", True),
+        "stock_negativo": ("bool", True),
+        "Costo_Unitario_Limpio": ("dinero", True),
+        "Lead_Time_Limpio": ("medida", True),
+    },
+    "transacciones": {
+        "Transaccion_ID": ("texto", True),
+        "Transaccion_Key": ("clave", True),
+        "SKU_ID": ("categoria", True),
+        "SKU_Key": ("clave", True),
+        "Fecha_Venta": ("fecha", True),
+        "Cantidad_Vendida": ("medida", True),
+        "Precio_Venta_Final": ("dinero", True),
+        "Costo_Envio": ("dinero", True),
+        "Tiempo_Entrega_Real": ("medida", True),
+        "Estado_Envio": ("categoria", True),
+        "Ciudad_Destino": ("categoria", True),
+        "Canal_Venta": ("categoria", True),
+        "Tiempo_Entrega_Limpio": ("medida", True),
+        "Ciudad_Destino_Limpia": ("categoria", True),
+    },
+    "feedback": {
+        "Feedback_ID": ("texto", True),
+        "Transaccion_ID": ("texto", True),
+        "Transaccion_Key": ("clave", True),
+        "Rating_Producto": ("medida", True),
+        "Rating_Logistica": ("medida", True),
+        "Comentario_Texto": ("texto", True),
+        "Recomienda_Marca": ("sino", True),
+        "Ticket_Soporte_Abierto": ("sino", True),
+        "Edad_Cliente": ("medida", True),
+        "Satisfaccion_NPS": ("medida", True),
+        "NPS_Grupo": ("categoria", False),
+    },
+}
+
+# La maestra guarda las claves enteras en lugar de los IDs de texto de
+# transacción/feedback; el SKU_ID se conserva como categoría para mostrarlo.
+ESQUEMAS["master"] = {
+    **{c: t for c, t in ESQUEMAS["transacciones"].items() if c != "Transaccion_ID"},
+    **{c: t for c, t in ESQUEMAS["inventario"].items() if c not in ("SKU_ID", "SKU_Key")},
+    **{c: t for c, t in ESQUEMAS["feedback"].items()
+       if c not in ("Feedback_ID", "Transaccion_ID", "Transaccion_Key")},
+    "sku_fantasma": ("bool", True),
+    "Ingreso": ("dinero", True),
+    "Costo_Total": ("dinero", True),
+    "Margen_Utilidad": ("dinero", True),
+    "Brecha_Entrega": ("medida", True),
+}
+
+PREFIJOS_ID = {
+    "SKU_ID": "PROD",
+    "Transaccion_ID": "TRX",
+    "Feedback_ID": "FB",
+}
+
+COLUMNAS_DESCARTADAS = {
+    "master": ["_merge", "Transaccion_ID", "Feedback_ID"],
+}
+
+
+# ---------------- Conversión ----------------
+def clave_sustituta(serie):
+    # "PROD-123" -> 123; formas no canónicas -> hash negativo.
+    # Se convierte cada valor distinto una sola vez.
+    if serie.name not in PREFIJOS_ID:
+        raise ErrorEsquema(f"{serie.name}: columna sin prefijo de ID declarado")
+    patron = rf"^{PREFIJOS_ID[serie.name]}-(0|[1-9]\d{{0,17}})$"
+
+    codigos, unicos = pd.factorize(serie)
+    unicos = pd.Series(unicos, dtype="string")
+    numeros = pd.to_numeric(unicos.str.extract(patron, expand=False), errors="coerce").astype("Int64")
+    otros = numeros.isna().to_numpy()
+    if otros.any():
+        huellas = pd.util.hash_array(unicos[otros].to_numpy(dtype=object))
+        hashes = -(huellas >> np.uint64(1)).astype("int64") - 1
+        # un hash repetido uniría filas de IDs distintos en los joins
+        if len(np.unique(hashes)) != len(hashes):
+            raise ErrorEsquema(f"{serie.name}: dos IDs distintos comparten clave sustituta")
+        numeros[otros] = hashes
+    # take con allow_fill: el código -1 (ID nulo) queda como <NA>
+    claves = numeros.array.take(codigos, allow_fill=True)
+    return pd.Series(claves, index=serie.index, name=serie.name)
+
+
+def clave_es_canonica(claves):
+    # Las claves hash (negativas) no siguen el orden de los IDs
+    return (claves >= 0).fillna(False)
+
+
+def _convertir(serie, tipo):
+    if tipo == "categoria":
+        return serie.astype("category")
+    if tipo == "texto":
+        return serie.astype("string")
+    if tipo == "sino":
+        if serie.dtype == "boolean":
+            return serie
+        return serie.map({"Sí": True, "No": False}).astype("boolean")
+    if tipo == "bool":
+        return serie.astype("boolean")
+    if tipo == "fecha":
+        return pd.to_datetime(serie, errors="coerce")
+    if tipo == "clave":
+        if serie.dtype == "Int64":
+            return serie
+        return clave_sustituta(serie)
+
+    serie = pd.to_numeric(serie, errors="coerce")
+    if tipo == "medida":
+        return _medida(serie)
+    return serie.astype(TIPOS[tipo])
+
+
+def _medida(serie):
+    # float32 solo si ningún valor cambia al reducirlo
+    valores = serie.astype("float64")
+    reducida = valores.astype("float32")
+    exacta = np.array_equal(reducida.to_numpy(dtype="float64"), valores.to_numpy(), equal_nan=True)
+    return reducida if exacta else valores
+
+
+def aplicar_esquema(df, nombre):
+    esquema = ESQUEMAS[nombre]
+    df = df.drop(columns=[c for c in COLUMNAS_DESCARTADAS.get(nombre, []) if c in df.columns])
+
+    convertidas = {}
+    for col, (tipo, _) in esquema.items():
+        if col in df.columns:
+            convertidas[col] = _convertir(df[col], tipo)
+    # columnas clave derivadas de su ID de texto
+    for col, (tipo, _) in esquema.items():
+        if tipo == "clave" and col not in df.columns:
+            origen = col.replace("_Key", "_ID")
+            if origen in df.columns:
+                convertidas[col] = clave_sustituta(df[origen])
+
+    return df.assign(**convertidas)
+
+
+# ---------------- Validación ----------------
+def _tipo_valido(serie, tipo):
+    if tipo == "fecha":
+        return pd.api.types.is_datetime64_any_dtype(serie)
+    if tipo == "texto":
+        return pd.api.types.is_string_dtype(serie)
+    if tipo == "medida":
+        return str(serie.dtype) in ("float32", "float64")
+    return str(serie.dtype) == TIPOS[tipo]
+
+
+def validar_esquema(df, nombre):
+    errores = []
+    for col, (tipo, requerida) in ESQUEMAS[nombre].items():
+        if col not in df.columns:
+            if requerida:
+                errores.append(f"falta la columna {col}")
+        elif not _tipo_valido(df[col], tipo):
+            errores.append(f"{col}: se esperaba {TIPOS[tipo]}, llegó {df[col].dtype}")
+
+    if errores:
+        raise ErrorEsquema(f"Esquema '{nombre}' inválido: " + "; ".join(errores))
+    return df
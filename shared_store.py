@@ -0,0 +1,289 @@
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from audit_viewer import VisorAuditoria
+from cleaning_cache import clave_cache
+from parallel import limpiar_datasets
+
+# Almacén de datos compartido por todas las sesiones del proceso.
+# Las sesiones de Streamlit guardan solo las claves (hash de contenido +
+# versión de limpieza, ver cleaning_cache.py); los DataFrames viven una
+# sola vez aquí, así que veinte sesiones con los mismos archivos comparten
+# una única copia de cada dataset, de la maestra y de su índice. Los
+# crudos no se guardan: solo los usa la auditoría, que los lee por páginas
+# desde archivos mapeados en memoria (audit_viewer.py).
+#   - presupuesto de memoria (TECHLOG_MEMORIA_MB) con desalojo LRU;
+#   - los DataFrames desalojados se escriben a disco (Parquet) y se vuelven
+#     a cargar al pedirlos; los demás objetos (índices, cubos, reportes)
+#     simplemente se descartan y se recalculan. La escritura se hace fuera
+#     del lock del almacén (mientras tanto se sirven desde memoria), igual
+#     que la lectura;
+#   - cada clave se calcula una vez aunque varias sesiones la pidan a la vez;
+#   - estadisticas() reporta aciertos en memoria / disco, fallos y desalojos.
+# Se entregan copias superficiales: con Copy-on-Write (pandas >= 3) lo que
+# una sesión modifique o agregue queda en su copia, sin tocar la compartida.
+# almacen_figuras() es una segunda instancia, con su propio presupuesto
+# (TECHLOG_FIGURAS_MB), para las figuras de Plotly del dashboard: las
+# figuras no se copian, quien las recibe no debe modificarlas.
+
+PRESUPUESTO_MB = float(os.environ.get("TECHLOG_MEMORIA_MB", "2048"))
+DIR_DESBORDE = os.environ.get("TECHLOG_DESBORDE_DIR")
+PRESUPUESTO_FIGURAS_MB = float(os.environ.get("TECHLOG_FIGURAS_MB", "256"))
+PARTES = ("clean", "reporte")
+
+
+def tamano_de(valor):
+    # Bytes aproximados en memoria
+    if isinstance(valor, pd.DataFrame):
+        return int(valor.memory_usage(index=True, deep=True).sum())
+    if hasattr(valor, "to_plotly_json"):
+        # figura de Plotly: pesan los arreglos de las trazas
+        return sum(_tamano_plotly(t.to_plotly_json()) for t in valor.data) + 4096
+    if hasattr(valor, "nbytes"):
+        return int(valor.nbytes)
+    return sys.getsizeof(valor)
+
+
+class AlmacenCompartido:
+
+    def __init__(self, presupuesto_mb=PRESUPUESTO_MB, dir_desborde=DIR_DESBORDE):
+        self.presupuesto = int(presupuesto_mb * 2**20)
+        self._dir_base = dir_desborde
+        self._dir = None
+        self._memoria = OrderedDict()   # clave -> (valor, bytes)
+        self._en_disco = {}             # clave -> ruta
+        self._escribiendo = {}          # clave -> DataFrame desalojado, aún sin escribir
+        self._calculos = {}             # clave -> lock del cálculo en curso
+        self._lock = threading.RLock()
+        self.bytes = 0
+        self.aciertos_memoria = 0
+        self.aciertos_disco = 0
+        self.fallos = 0
+        self.desalojos = 0
+
+    # ---------------- Lectura ----------------
+    def contiene(self, clave):
+        with self._lock:
+            return clave in self._memoria or clave in self._en_disco
+
+    def obtener(self, clave):
+        return self._buscar(clave, contar=True)
+
+    def _buscar(self, clave, contar):
+        with self._lock:
+            entrada = self._memoria.get(clave)
+            if entrada is not None:
+                self._memoria.move_to_end(clave)
+                self.aciertos_memoria += contar
+                return _entregar(entrada[0])
+            if clave in self._escribiendo:
+                self.aciertos_memoria += contar
+                return _entregar(self._escribiendo[clave])
+            ruta = self._en_disco.get(clave)
+            if ruta is None:
+                self.fallos += contar
+                return None
+
+        valor = _leer(ruta)
+        with self._lock:
+            self.aciertos_disco += contar
+            valor, victimas = self._insertar(clave, valor)
+        self._desbordar(victimas)
+        return _entregar(valor)
+
+    def obtener_o_calcular(self, clave, calcular):
+        valor = self.obtener(clave)
+        if valor is not None:
+            return valor
+
+        with self._lock:
+            lock = self._calculos.setdefault(clave, threading.Lock())
+        with lock:
+            # otra sesión pudo terminar el cálculo mientras se esperaba
+            valor = self._buscar(clave, contar=False)
+            if valor is None:
+                valor = self.poner(clave, calcular())
+        with self._lock:
+            self._calculos.pop(clave, None)
+        return valor
+
+    # ---------------- Escritura ----------------
+    def poner(self, clave, valor):
+        # Si la clave ya está se conserva la copia existente (deduplicación)
+        with self._lock:
+            valor, victimas = self._insertar(clave, valor)
+        self._desbordar(victimas)
+        return _entregar(valor)
+
+    def _insertar(self, clave, valor):
+        # Con el lock tomado. Devuelve el valor guardado y los DataFrames
+        # desalojados que hay que escribir a disco (después de soltarlo)
+        existente = self._memoria.get(clave)
+        if existente is not None:
+            self._memoria.move_to_end(clave)
+            return existente[0], []
+        tamano = tamano_de(valor)
+        self._memoria[clave] = (valor, tamano)
+        self.bytes += tamano
+        return valor, self._desalojar()
+
+    def _desalojar(self):
+        # LRU; la entrada recién usada nunca se desaloja
+        victimas = []
+        while self.bytes > self.presupuesto and len(self._memoria) > 1:
+            clave, (valor, tamano) = self._memoria.popitem(last=False)
+            self.bytes -= tamano
+            self.desalojos += 1
+            if (isinstance(valor, pd.DataFrame) and clave not in self._en_disco
+                    and clave not in self._escribiendo):
+                self._escribiendo[clave] = valor
+                victimas.append(clave)
+        return victimas
+
+    def _desbordar(self, victimas):
+        # Sin el lock: la escritura no bloquea a las demás sesiones
+        for clave in victimas:
+            with self._lock:
+                valor = self._escribiendo.get(clave)
+                directorio = self._directorio()
+            if valor is None:
+                continue
+            ruta = self._escribir(directorio, clave, valor)
+            with self._lock:
+                if self._escribiendo.pop(clave, None) is not None:
+                    self._en_disco[clave] = ruta
+                    ruta = None
+            if ruta is not None:
+                # vaciar() llegó durante la escritura
+                ruta.unlink(missing_ok=True)
+
+    def _directorio(self):
+        if self._dir is None:
+            if self._dir_base:
+                Path(self._dir_base).mkdir(parents=True, exist_ok=True)
+            self._dir = Path(tempfile.mkdtemp(prefix="techlog-desborde-", dir=self._dir_base))
+        return self._dir
+
+    @staticmethod
+    def _escribir(directorio, clave, df):
+        ruta = directorio / hashlib.sha256(clave.encode()).hexdigest()[:32]
+        try:
+            df.to_parquet(ruta.with_suffix(".parquet"), index=True)
+            return ruta.with_suffix(".parquet")
+        except Exception:
+            # tipos que Parquet no admite (p. ej. columnas object mezcladas)
+            df.to_pickle(ruta.with_suffix(".pkl"))
+            return ruta.with_suffix(".pkl")
+
+    def vaciar(self):
+        with self._lock:
+            self._memoria.clear()
+            self._escribiendo.clear()
+            for ruta in self._en_disco.values():
+                Path(ruta).unlink(missing_ok=True)
+            self._en_disco.clear()
+            self.bytes = 0
+
+    # ---------------- Métricas ----------------
+    def estadisticas(self):
+        with self._lock:
+            pedidos = self.aciertos_memoria + self.aciertos_disco + self.fallos
+            return {
+                "entradas_memoria": len(self._memoria),
+                "entradas_disco": len(self._en_disco),
+                "memoria_mb": round(self.bytes / 2**20, 1),
+                "presupuesto_mb": round(self.presupuesto / 2**20, 1),
+                "aciertos_memoria": self.aciertos_memoria,
+                "aciertos_disco": self.aciertos_disco,
+                "fallos": self.fallos,
+                "desalojos": self.desalojos,
+                "tasa_aciertos": round((self.aciertos_memoria + self.aciertos_disco) / pedidos, 3) if pedidos else None,
+            }
+
+
+def _tamano_plotly(valor):
+    if isinstance(valor, dict):
+        return sum(_tamano_plotly(v) for v in valor.values())
+    if isinstance(valor, np.ndarray):
+        return int(valor.nbytes) * (8 if valor.dtype == object else 1)
+    if isinstance(valor, (list, tuple)):
+        return 8 * len(valor)
+    return 0
+
+
+def _entregar(valor):
+    return valor.copy(deep=False) if isinstance(valor, pd.DataFrame) else valor
+
+
+def _leer(ruta):
+    ruta = Path(ruta)
+    return pd.read_parquet(ruta) if ruta.suffix == ".parquet" else pd.read_pickle(ruta)
+
+
+# ---------------- Instancia del proceso ----------------
+_almacen = None
+_almacen_figuras = None
+_lock_global = threading.Lock()
+
+
+def almacen_compartido():
+    global _almacen
+    with _lock_global:
+        if _almacen is None:
+            _almacen = AlmacenCompartido()
+        return _almacen
+
+
+def almacen_figuras():
+    global _almacen_figuras
+    with _lock_global:
+        if _almacen_figuras is None:
+            _almacen_figuras = AlmacenCompartido(PRESUPUESTO_FIGURAS_MB)
+        return _almacen_figuras
+
+
+def cargar_datasets(archivos, almacen=None):
+    # archivos: {nombre: bytes}. Limpia (con cache en disco y en paralelo)
+    # solo los que el almacén no tiene y los publica en él.
+    # Devuelve {nombre: {"clave", "reporte", "hit"}}; el limpio se pide al
+    # almacén con f"{clave}:clean" y el crudo se lee con VisorAuditoria.
+    almacen = almacen or almacen_compartido()
+    claves = {n: clave_cache(n, datos) for n, datos in archivos.items()}
+
+    resultados = {}
+    pendientes = {}
+    for nombre, clave in claves.items():
+        reporte = almacen.obtener(f"{clave}:reporte")
+        if (reporte is not None and all(almacen.contiene(f"{clave}:{p}") for p in PARTES)
+                and VisorAuditoria(clave, nombre).existe()):
+            resultados[nombre] = {"clave": clave, "reporte": reporte, "hit": True}
+        else:
+            pendientes[nombre] = archivos[nombre]
+
+    for nombre, res in limpiar_datasets(pendientes).items() if pendientes else ():
+        for parte in PARTES:
+            almacen.poner(f"{res['clave']}:{parte}", res[parte])
+        VisorAuditoria.preparar(res["clave"], nombre, res["raw"], res["clean"])
+        resultados[nombre] = {"clave": res["clave"], "reporte": res["reporte"], "hit": res["hit"]}
+    return resultados
+
+
+def datasets(versiones, almacen=None):
+    # {nombre: clave} -> {nombre: limpio}; None si alguno ya no está
+    # (p. ej. el proceso se reinició)
+    almacen = almacen or almacen_compartido()
+    salida = {}
+    for nombre, clave in versiones.items():
+        df = almacen.obtener(f"{clave}:clean")
+        if df is None:
+            return None
+        salida[nombre] = df
+    return salida
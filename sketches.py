@@ -0,0 +1,368 @@
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from data_processing import COLUMNAS_RATING, _preparar_feedback, _preparar_inventario
+from ingestion import detectar_formato, leer_dataset
+from parallel import BYTES_POR_PARTE, obtener_pool, partir_csv
+
+# Estadísticos combinables para la limpieza: bosquejos de cuantiles (KLL)
+# y acumuladores de momentos, por grupo. Cada partición o lote produce
+# los suyos y se combinan sin volver a leer los datos; se guardan en JSON
+# para seguir sumando lotes posteriores (incremental.py).
+#
+# Cotas de error del bosquejo KLL con parámetro k (K_DEFECTO = 200):
+#   - mientras un grupo no supera la capacidad del nivel 0 (k valores) no
+#     se compacta nada y los cuantiles son exactos (mismo resultado que
+#     pandas, con interpolación);
+#   - por encima, el cuantil devuelto tiene error de rango ≤ ~3.3/k
+#     (≈1.65% con k=200) con 99% de confianza: la mediana estimada es un
+#     valor cuyo rango real está entre el 48.35% y el 51.65%. En columnas
+#     de pocos valores enteros (Lead_Time_Dias) eso puede ser el entero
+#     vecino de la mediana exacta. Combinar bosquejos no empeora la cota.
+#     Memoria: O(k) valores por grupo.
+# Los momentos (n, media, M2, mínimo, máximo) se combinan con la fórmula
+# de Chan y son exactos salvo redondeo.
+#
+# Diferencias con la limpieza exacta: por particiones, los duplicados
+# exactos de feedback solo se quitan dentro de cada partición (el
+# bosquejo puede contar dos veces una fila repetida en dos particiones).
+
+K_DEFECTO = 200
+CONFIANZA_ERROR = 3.3
+
+
+# ---------------- Momentos ----------------
+class Momentos:
+
+    def __init__(self, n=0, media=0.0, m2=0.0, minimo=np.inf, maximo=-np.inf):
+        self.n = n
+        self.media = media
+        self.m2 = m2
+        self.minimo = minimo
+        self.maximo = maximo
+
+    def actualizar(self, valores):
+        v = np.asarray(valores, dtype="float64")
+        v = v[~np.isnan(v)]
+        if len(v):
+            media = v.mean()
+            self.combinar(Momentos(len(v), media, ((v - media) ** 2).sum(), v.min(), v.max()))
+        return self
+
+    def combinar(self, otro):
+        if otro.n == 0:
+            return self
+        n = self.n + otro.n
+        delta = otro.media - self.media
+        self.media += delta * otro.n / n
+        self.m2 += otro.m2 + delta * delta * self.n * otro.n / n
+        self.n = n
+        self.minimo = min(self.minimo, otro.minimo)
+        self.maximo = max(self.maximo, otro.maximo)
+        return self
+
+    @property
+    def std(self):
+        return float(np.sqrt(self.m2 / (self.n - 1))) if self.n > 1 else np.nan
+
+    def a_dict(self):
+        return {"n": self.n, "media": self.media, "m2": self.m2,
+                "minimo": self.minimo if self.n else None, "maximo": self.maximo if self.n else None}
+
+    @classmethod
+    def de_dict(cls, d):
+        if not d["n"]:
+            return cls()
+        return cls(d["n"], d["media"], d["m2"], d["minimo"], d["maximo"])
+
+
+# ---------------- Bosquejo KLL ----------------
+class BosquejoKLL:
+
+    def __init__(self, k=K_DEFECTO, niveles=None, semilla=0):
+        self.k = k
+        self.niveles = niveles or [np.empty(0)]
+        self._rng = np.random.default_rng(semilla)
+
+    @property
+    def n(self):
+        return int(sum(len(nivel) << h for h, nivel in enumerate(self.niveles)))
+
+    def _capacidad(self, h):
+        altura = len(self.niveles)
+        return max(2, int(np.ceil(self.k * (2 / 3) ** (altura - h - 1))))
+
+    def _comprimir(self):
+        # Un nivel lleno se ordena y la mitad de sus valores (pares o
+        # impares, al azar) sube al nivel siguiente con el doble de peso
+        lleno = True
+        while lleno:
+            lleno = False
+            for h in range(len(self.niveles)):
+                nivel = self.niveles[h]
+                if len(nivel) <= self._capacidad(h):
+                    continue
+                lleno = True
+                if h + 1 == len(self.niveles):
+                    self.niveles.append(np.empty(0))
+                nivel = np.sort(nivel)
+                resto = nivel[len(nivel) - len(nivel) % 2:]
+                nivel = nivel[:len(nivel) - len(nivel) % 2]
+                sube = nivel[self._rng.integers(2)::2]
+                self.niveles[h + 1] = np.concatenate([self.niveles[h + 1], sube])
+                self.niveles[h] = resto
+                break
+
+    def actualizar(self, valores):
+        v = np.asarray(valores, dtype="float64")
+        v = v[~np.isnan(v)]
+        if len(v):
+            self.niveles[0] = np.concatenate([self.niveles[0], v])
+            self._comprimir()
+        return self
+
+    def combinar(self, otro):
+        for h, nivel in enumerate(otro.niveles):
+            if h == len(self.niveles):
+                self.niveles.append(np.empty(0))
+            self.niveles[h] = np.concatenate([self.niveles[h], nivel])
+        self.k = min(self.k, otro.k)
+        self._comprimir()
+        return self
+
+    def exacto(self):
+        return len(self.niveles) == 1
+
+    def error_rango(self):
+        # Cota (99%) del error de rango de un cuantil
+        return 0.0 if self.exacto() else CONFIANZA_ERROR / self.k
+
+    def cuantil(self, q):
+        if self.n == 0:
+            return np.nan
+        if self.exacto():
+            nivel = self.niveles[0]
+            return float(np.median(nivel) if q == 0.5 else np.quantile(nivel, q))
+        valores = np.concatenate(self.niveles)
+        pesos = np.concatenate([np.full(len(nivel), 2 ** h) for h, nivel in enumerate(self.niveles)])
+        orden = np.argsort(valores, kind="stable")
+        acumulado = np.cumsum(pesos[orden])
+        i = np.searchsorted(acumulado, q * acumulado[-1], side="left")
+        return float(valores[orden][min(i, len(valores) - 1)])
+
+    def mediana(self):
+        return self.cuantil(0.5)
+
+    def a_dict(self):
+        # Con el estado del generador: al cargar, los lotes siguientes siguen
+        # la misma secuencia de sorteos en lugar de repetir los primeros
+        return {"k": self.k, "niveles": [nivel.tolist() for nivel in self.niveles],
+                "rng": self._rng.bit_generator.state}
+
+    @classmethod
+    def de_dict(cls, d):
+        bosquejo = cls(d["k"], [np.asarray(nivel, dtype="float64") for nivel in d["niveles"]])
+        if "rng" in d:
+            bosquejo._rng.bit_generator.state = d["rng"]
+        return bosquejo
+
+
+# ---------------- Por grupo ----------------
+class EstadisticosAgrupados:
+    # Bosquejo + momentos globales y por valor de una columna de grupo
+
+    def __init__(self, k=K_DEFECTO):
+        self.k = k
+        self.total = (BosquejoKLL(k), Momentos())
+        self.grupos = {}
+
+    def _grupo(self, clave):
+        if clave not in self.grupos:
+            self.grupos[clave] = (BosquejoKLL(self.k, semilla=len(self.grupos) + 1), Momentos())
+        return self.grupos[clave]
+
+    def actualizar(self, valores, grupos=None):
+        valores = pd.to_numeric(valores, errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+        for destino in self.total:
+            destino.actualizar(valores)
+        if grupos is not None:
+            codigos, claves = pd.factorize(grupos)
+            for i, clave in enumerate(claves):
+                v = valores[codigos == i]
+                if np.isnan(v).all():
+                    continue
+                for destino in self._grupo(str(clave)):
+                    destino.actualizar(v)
+        return self
+
+    def combinar(self, otro):
+        for destino, fuente in zip(self.total, otro.total):
+            destino.combinar(fuente)
+        for clave, fuentes in otro.grupos.items():
+            for destino, fuente in zip(self._grupo(clave), fuentes):
+                destino.combinar(fuente)
+        return self
+
+    def cuantil(self, q, grupo=None):
+        bosquejo = self.total[0] if grupo is None else self.grupos[grupo][0]
+        return bosquejo.cuantil(q)
+
+    def mediana(self, grupo=None):
+        return self.cuantil(0.5, grupo)
+
+    def medianas(self):
+        # Como groupby(...).median().dropna()
+        return {clave: b.mediana() for clave, (b, _) in self.grupos.items() if b.n}
+
+    def momentos(self, grupo=None):
+        return self.total[1] if grupo is None else self.grupos[grupo][1]
+
+    def limites(self, metodo="iqr"):
+        # Umbrales de outliers: Tukey (1.5 IQR) o media ± 3 sigma
+        if metodo == "3sigma":
+            m = self.total[1]
+            return float(m.media - 3 * m.std), float(m.media + 3 * m.std)
+        q1, q3 = self.cuantil(0.25), self.cuantil(0.75)
+        return q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1)
+
+    def error_rango(self):
+        return max([self.total[0].error_rango()] + [b.error_rango() for b, _ in self.grupos.values()])
+
+    def a_dict(self):
+        return {
+            "k": self.k,
+            "total": [self.total[0].a_dict(), self.total[1].a_dict()],
+            "grupos": {c: [b.a_dict(), m.a_dict()] for c, (b, m) in self.grupos.items()},
+        }
+
+    @classmethod
+    def de_dict(cls, d):
+        est = cls(d["k"])
+        est.total = (BosquejoKLL.de_dict(d["total"][0]), Momentos.de_dict(d["total"][1]))
+        est.grupos = {c: (BosquejoKLL.de_dict(b), Momentos.de_dict(m)) for c, (b, m) in d["grupos"].items()}
+        return est
+
+
+# ---------------- Estadísticos de la limpieza ----------------
+class BosquejosLimpieza:
+    # Lo que necesitan las imputaciones y recortes de data_processing.py:
+    #   costo      Costo_Unitario_USD por Categoria  (0 = nulo)
+    #   lead_time  Lead_Time_Dias por Bodega_Origen
+    #   ratings    Rating_Producto / Rating_Logistica válidos (1-5)
+    #   entrega    Tiempo_Entrega_Real
+
+    def __init__(self, k=K_DEFECTO):
+        self.k = k
+        self.costo = EstadisticosAgrupados(k)
+        self.lead_time = EstadisticosAgrupados(k)
+        self.ratings = {c: EstadisticosAgrupados(k) for c in COLUMNAS_RATING}
+        self.entrega = EstadisticosAgrupados(k)
+
+    def agregar(self, nombre, df_raw):
+        # Un bloque / partición / lote crudo de un dataset
+        if nombre == "inventario":
+            df = _preparar_inventario(df_raw)
+            self.costo.actualizar(df["Costo_Unitario_USD"], df["Categoria"])
+            self.lead_time.actualizar(df["Lead_Time_Dias"], df["Bodega_Origen"])
+        elif nombre == "feedback":
+            df = _preparar_feedback(df_raw)
+            for c in COLUMNAS_RATING:
+                self.ratings[c].actualizar(df[c])
+        elif nombre == "transacciones":
+            self.entrega.actualizar(df_raw["Tiempo_Entrega_Real"])
+        else:
+            raise ValueError(f"Dataset desconocido: {nombre}")
+        return self
+
+    def combinar(self, otro):
+        self.costo.combinar(otro.costo)
+        self.lead_time.combinar(otro.lead_time)
+        for c in COLUMNAS_RATING:
+            self.ratings[c].combinar(otro.ratings[c])
+        self.entrega.combinar(otro.entrega)
+        return self
+
+    # ---------------- Para los limpiadores ----------------
+    def estadisticos_inventario(self):
+        # Mismo formato que data_processing.estadisticos_inventario()
+        return {
+            "costo_por_categoria": self.costo.medianas(),
+            "costo_global": self.costo.mediana(),
+            "lead_time_por_bodega": self.lead_time.medianas(),
+            "lead_time_global": self.lead_time.mediana(),
+        }
+
+    def medianas_feedback(self):
+        # Mismo formato que data_processing.medianas_feedback()
+        return {c: self.ratings[c].mediana() for c in COLUMNAS_RATING}
+
+    def limites_entrega(self, metodo="iqr"):
+        # Para clean_transacciones(limites_entrega=...); nunca por debajo de 0
+        inferior, superior = self.entrega.limites(metodo)
+        return max(0.0, inferior), superior
+
+    def errores_rango(self):
+        return {
+            "costo": self.costo.error_rango(),
+            "lead_time": self.lead_time.error_rango(),
+            **{c: self.ratings[c].error_rango() for c in COLUMNAS_RATING},
+            "entrega": self.entrega.error_rango(),
+        }
+
+    # ---------------- Persistencia ----------------
+    def a_dict(self):
+        return {
+            "k": self.k,
+            "costo": self.costo.a_dict(),
+            "lead_time": self.lead_time.a_dict(),
+            "ratings": {c: e.a_dict() for c, e in self.ratings.items()},
+            "entrega": self.entrega.a_dict(),
+        }
+
+    @classmethod
+    def de_dict(cls, d):
+        b = cls(d["k"])
+        b.costo = EstadisticosAgrupados.de_dict(d["costo"])
+        b.lead_time = EstadisticosAgrupados.de_dict(d["lead_time"])
+        b.ratings = {c: EstadisticosAgrupados.de_dict(e) for c, e in d["ratings"].items()}
+        b.entrega = EstadisticosAgrupados.de_dict(d["entrega"])
+        return b
+
+    def guardar(self, ruta):
+        ruta = Path(ruta)
+        tmp = ruta.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.a_dict(), f)
+        os.replace(tmp, ruta)
+
+    @classmethod
+    def cargar(cls, ruta):
+        with open(ruta, encoding="utf-8") as f:
+            return cls.de_dict(json.load(f))
+
+
+# ---------------- En paralelo ----------------
+def _bosquejo_parte(nombre, datos, k):
+    return BosquejosLimpieza(k).agregar(nombre, leer_dataset(nombre, datos)[0])
+
+
+def bosquejos_en_paralelo(archivos, k=K_DEFECTO, max_workers=None):
+    # archivos: {nombre: bytes del archivo}. Cada dataset se resume en un
+    # proceso del pool (el CSV de transacciones además partido por filas,
+    # como en parallel.py) y los bosquejos parciales se combinan.
+    pool = obtener_pool(max_workers)
+    futuros = []
+    for nombre, datos in archivos.items():
+        partes = [datos]
+        if nombre == "transacciones" and detectar_formato(datos) == "csv":
+            partes = partir_csv(datos, max(1, len(datos) // BYTES_POR_PARTE + 1))
+        futuros += [pool.submit(_bosquejo_parte, nombre, p, k) for p in partes]
+
+    total = BosquejosLimpieza(k)
+    for futuro in futuros:
+        total.combinar(futuro.result())
+    return total
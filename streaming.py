@@ -0,0 +1,145 @@
+import shutil
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+from data_processing import clean_transacciones, clean_feedback, COLUMNAS_RATING
+from dedup import AlmacenHuellas
+from ingestion import leer_por_bloques
+
+# Limpieza por bloques para archivos más grandes que la RAM.
+# Se lee el archivo en bloques (lector de Arrow de ingestion.py: CSV,
+# CSV comprimido, Parquet o Arrow IPC), se limpia cada bloque y se
+# escribe a Parquet particionado; en memoria solo vive un bloque a la vez.
+#
+# Plan por dataset:
+#   transacciones -> 1 pasada. Todas las reglas son locales a la fila
+#                    (clip 0-180 o los límites que se pasen, alias de
+#                    ciudades).
+#   feedback      -> 2 pasadas. Las medianas de los ratings son globales:
+#                    la pasada 1 acumula un histograma exacto de valores
+#                    (los ratings tienen muy pocos valores distintos) y la
+#                    pasada 2 imputa con esas medianas. Los duplicados se
+#                    eliminan entre bloques con huellas de 64 bits por fila
+#                    (dedup.py): 8 bytes por fila en memoria.
+#   inventario    -> no aplica: es el maestro de productos (miles de filas)
+#                    y se limpia completo en memoria.
+# Cada corrida escribe en un directorio temporal que al final reemplaza a
+# dir_salida: no quedan partes de una corrida anterior con otros bloques.
+
+FILAS_POR_BLOQUE = 500_000
+
+
+@contextmanager
+def _salida_temporal(dir_salida):
+    dir_salida = Path(dir_salida)
+    tmp = dir_salida.with_name(f".tmp-{dir_salida.name}-{uuid.uuid4().hex[:8]}")
+    tmp.mkdir(parents=True)
+    try:
+        yield tmp
+        shutil.rmtree(dir_salida, ignore_errors=True)
+        tmp.replace(dir_salida)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _escribir_particiones(df, dir_salida, columna_particion, n_bloque):
+    particiones = set()
+    for valor, parte in df.groupby(columna_particion, dropna=False, observed=True, sort=False):
+        nombre = "sin_valor" if pd.isna(valor) else str(valor)
+        ruta = Path(dir_salida) / f"{columna_particion}={nombre}"
+        ruta.mkdir(parents=True, exist_ok=True)
+        parte.drop(columns=columna_particion).to_parquet(
+            ruta / f"parte-{n_bloque:05d}.parquet", index=False
+        )
+        particiones.add(nombre)
+    return particiones
+
+
+# ---------------- Transacciones (1 pasada) ----------------
+def limpiar_transacciones_por_bloques(ruta_csv, dir_salida, filas_por_bloque=FILAS_POR_BLOQUE,
+                                      alias_ciudades=None, limites_entrega=None):
+    filas = 0
+    bloques = 0
+    particiones = set()
+    ingesta = {}
+
+    lector = leer_por_bloques("transacciones", ruta_csv, filas_por_bloque, ingesta)
+    with _salida_temporal(dir_salida) as tmp:
+        for n, bloque in enumerate(lector):
+            df = clean_transacciones(bloque, alias_ciudades=alias_ciudades,
+                                     limites_entrega=limites_entrega)
+            # Partición por mes de venta (las fechas inválidas van a "sin_valor")
+            df["mes"] = df["Fecha_Venta"].dt.strftime("%Y-%m")
+            particiones |= _escribir_particiones(df, tmp, "mes", n)
+
+            filas += len(bloque)
+            bloques += 1
+
+    return {"filas": filas, "bloques": bloques, "particiones": sorted(particiones), "ingesta": ingesta}
+
+
+# ---------------- Feedback (2 pasadas) ----------------
+def _mediana_de_conteos(conteos):
+    total = sum(conteos.values())
+    if total == 0:
+        return float("nan")
+
+    # posiciones (base 0) de los valores centrales, igual que pandas.median
+    medio_bajo, medio_alto = (total - 1) // 2, total // 2
+    bajo = alto = None
+    acumulado = 0
+    for valor in sorted(conteos):
+        acumulado += conteos[valor]
+        if bajo is None and acumulado > medio_bajo:
+            bajo = valor
+        if acumulado > medio_alto:
+            alto = valor
+            break
+    return (bajo + alto) / 2
+
+
+def medianas_ratings(ruta_csv, filas_por_bloque=FILAS_POR_BLOQUE):
+    # Pasada 1: histograma exacto de los ratings válidos (1-5), sin filas
+    # duplicadas en todo el archivo, igual que clean_feedback
+    conteos = {c: Counter() for c in COLUMNAS_RATING}
+    vistas = AlmacenHuellas()
+
+    for bloque in leer_por_bloques("feedback", ruta_csv, filas_por_bloque):
+        bloque, huellas = vistas.filtrar(bloque)
+        vistas.registrar(huellas)
+        for c in COLUMNAS_RATING:
+            valores = pd.to_numeric(bloque[c], errors="coerce")
+            valores = valores[(valores >= 1) & (valores <= 5)]
+            conteos[c].update(valores.value_counts().to_dict())
+
+    return {c: _mediana_de_conteos(conteos[c]) for c in COLUMNAS_RATING}
+
+
+def limpiar_feedback_por_bloques(ruta_csv, dir_salida, filas_por_bloque=FILAS_POR_BLOQUE):
+    medianas = medianas_ratings(ruta_csv, filas_por_bloque)
+
+    filas = 0
+    bloques = 0
+    duplicadas = 0
+    vistas = AlmacenHuellas()
+    ingesta = {}
+    # Pasada 2: limpieza con las medianas globales, sin las filas ya vistas
+    # en bloques anteriores
+    lector = leer_por_bloques("feedback", ruta_csv, filas_por_bloque, ingesta)
+    with _salida_temporal(dir_salida) as tmp:
+        for n, bloque in enumerate(lector):
+            unicas, huellas = vistas.filtrar(bloque)
+            vistas.registrar(huellas)
+            duplicadas += len(bloque) - len(unicas)
+            df = clean_feedback(unicas, medianas=medianas)
+            df.to_parquet(tmp / f"parte-{n:05d}.parquet", index=False)
+
+            filas += len(bloque)
+            bloques += 1
+
+    return {"filas": filas, "bloques": bloques, "duplicadas": duplicadas, "medianas": medianas,
+            "ingesta": ingesta}
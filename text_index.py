@@ -0,0 +1,358 @@
+import json
+import re
+import unicodedata
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from kpi_cube import DIMENSIONES as DIMENSIONES_KPI
+
+# Índice invertido de Comentario_Texto con sentimiento por léxico.
+# Los comentarios se repiten mucho (textos predefinidos, plantillas), así
+# que el documento del índice es cada texto distinto y cada fila guarda
+# solo el código de su texto (int32, -1 sin comentario):
+#   - normalización una vez por texto distinto: minúsculas, sin tildes,
+#     tokens [a-z0-9]+;
+#   - postings posicionales (término -> (texto, posición)) en arreglos
+#     ordenados tipo CSR; una frase es una cadena de búsquedas binarias
+#     sobre las claves texto * largo + posición;
+#   - texto -> filas también en CSR, así una búsqueda devuelve posiciones
+#     de fila que se cruzan con las de IndiceFiltros (filtros del sidebar);
+#   - sentimiento vectorizado: peso del léxico por término, signo invertido
+#     tras una negación ("no volvería"), suma por texto recortada a [-1, 1].
+# agregar() suma filas nuevas: solo se tokenizan los textos no vistos y se
+# reordenan los postings (que son del tamaño del vocabulario de textos,
+# no del de las filas).
+#
+# CuboSentimiento agrega el sentimiento por día × bodega × ciudad × canal ×
+# categoría, como CuboKPI, para responder los resúmenes por categoría y por
+# bodega con cualquier combinación de filtros sin recorrer las filas. Los
+# SKUs sin categoría cuentan bajo SIN_CATEGORIA: la categoría no es un
+# filtro del sidebar y esos comentarios sí entran en los totales.
+
+LEXICO = {
+    "excelente": 2, "perfecto": 2, "genial": 2, "encantado": 2, "increible": 2,
+    "bueno": 1, "buena": 1, "rapido": 1, "rapida": 1, "justo": 1, "barato": 1,
+    "recomiendo": 1, "recomendable": 1, "volveria": 1, "satisfecho": 1, "gracias": 1,
+    "lento": -1, "lenta": -1, "tarde": -1, "demora": -1, "demorado": -1, "caro": -1,
+    "malo": -1, "mala": -1, "regular": -1, "reclamo": -1, "devolucion": -1,
+    "danado": -2, "danada": -2, "roto": -2, "rota": -2, "defectuoso": -2,
+    "pesimo": -2, "pesima": -2, "perdido": -2, "estafa": -2,
+}
+NEGACIONES = {"no", "nunca", "sin", "jamas", "ni"}
+# Suma de pesos que ya cuenta como sentimiento máximo
+SATURACION = 2
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_FRASE = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def normalizar(texto):
+    texto = unicodedata.normalize("NFKD", str(texto).lower())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+def tokenizar(texto):
+    return _TOKEN.findall(normalizar(texto))
+
+
+def interpretar(consulta):
+    # 'lento "no volveria"' -> [["lento"], ["no", "volveria"]]: todas las
+    # cláusulas deben estar; una cláusula de varios términos es una frase
+    clausulas = []
+    for frase, palabra in _FRASE.findall(consulta):
+        tokens = tokenizar(frase or palabra)
+        if tokens:
+            clausulas.append(tokens)
+    return clausulas
+
+
+def _csr(grupos, n_grupos):
+    # grupos (ya ordenados) -> inicio de cada grupo
+    return np.concatenate([[0], np.cumsum(np.bincount(grupos, minlength=n_grupos))]).astype(np.int64)
+
+
+def _en_rango(pos, posiciones):
+    # Cruce con lo que devuelve IndiceFiltros.posiciones (slice o arreglo)
+    if posiciones is None:
+        return pos
+    if isinstance(posiciones, slice):
+        i = np.searchsorted(pos, posiciones.start, side="left")
+        j = np.searchsorted(pos, posiciones.stop, side="left")
+        return pos[i:j]
+    return np.intersect1d(pos, posiciones, assume_unique=True)
+
+
+class IndiceComentarios:
+
+    def __init__(self, comentarios=()):
+        self.textos = []            # texto distinto (tal como llegó) por código
+        self._codigo_texto = {}     # texto -> código
+        self.terminos = {}          # término normalizado -> id
+        self.codigos = np.empty(0, dtype=np.int32)
+        # tokens de todos los textos: (texto, término, posición)
+        self._tok_texto = np.empty(0, dtype=np.int32)
+        self._tok_termino = np.empty(0, dtype=np.int32)
+        self._tok_pos = np.empty(0, dtype=np.int32)
+        self.puntaje_texto = np.empty(0, dtype=np.float32)
+        self._filas = None
+        self._ordenar()
+        self.agregar(comentarios)
+
+    @property
+    def n(self):
+        return len(self.codigos)
+
+    @property
+    def nbytes(self):
+        arreglos = (self.codigos, self._tok_texto, self._tok_termino, self._tok_pos,
+                    self.puntaje_texto, self._post_texto, self._post_pos, self._post_inicio)
+        return int(sum(a.nbytes for a in arreglos) + sum(len(t) for t in self.textos))
+
+    # ---------------- Construcción ----------------
+    def agregar(self, comentarios):
+        # comentarios: Series / lista de textos (nulos = sin comentario), una
+        # por fila nueva; las filas nuevas van al final
+        serie = pd.Series(comentarios, dtype="string")
+        locales, unicos = pd.factorize(serie)
+        mapa = np.empty(len(unicos), dtype=np.int32)
+        nuevos = []
+        for i, texto in enumerate(unicos):
+            codigo = self._codigo_texto.get(texto)
+            if codigo is None:
+                codigo = len(self.textos)
+                self._codigo_texto[texto] = codigo
+                self.textos.append(texto)
+                nuevos.append(codigo)
+            mapa[i] = codigo
+        filas = np.full(len(locales), -1, dtype=np.int32)
+        filas[locales >= 0] = mapa[locales[locales >= 0]]
+        self.codigos = np.concatenate([self.codigos, filas])
+
+        if nuevos:
+            self._indexar(nuevos)
+        self._filas = None
+        return self
+
+    def _indexar(self, nuevos):
+        tok_texto, tok_termino, tok_pos = [], [], []
+        for codigo in nuevos:
+            for pos, token in enumerate(tokenizar(self.textos[codigo])):
+                tok_texto.append(codigo)
+                tok_termino.append(self.terminos.setdefault(token, len(self.terminos)))
+                tok_pos.append(pos)
+        self._tok_texto = np.concatenate([self._tok_texto, np.asarray(tok_texto, dtype=np.int32)])
+        self._tok_termino = np.concatenate([self._tok_termino, np.asarray(tok_termino, dtype=np.int32)])
+        self._tok_pos = np.concatenate([self._tok_pos, np.asarray(tok_pos, dtype=np.int32)])
+        self._ordenar()
+        self._puntuar()
+
+    def _ordenar(self):
+        # Postings: tokens ordenados por (término, texto, posición)
+        orden = np.lexsort((self._tok_pos, self._tok_texto, self._tok_termino))
+        self._post_texto = self._tok_texto[orden]
+        self._post_pos = self._tok_pos[orden]
+        self._post_inicio = _csr(self._tok_termino[orden], len(self.terminos))
+        self._largo = int(self._tok_pos.max()) + 2 if len(self._tok_pos) else 1
+
+    def _puntuar(self):
+        # Léxico por término, negado si el token anterior del mismo texto es una negación
+        peso = np.zeros(len(self.terminos), dtype=np.float32)
+        negacion = np.zeros(len(self.terminos), dtype=bool)
+        for termino, i in self.terminos.items():
+            peso[i] = LEXICO.get(termino, 0)
+            negacion[i] = termino in NEGACIONES
+        valores = peso[self._tok_termino]
+        # los tokens de un texto son contiguos y en orden de posición
+        negado = np.zeros(len(valores), dtype=bool)
+        negado[1:] = negacion[self._tok_termino[:-1]] & (self._tok_texto[1:] == self._tok_texto[:-1])
+        valores[negado] *= -1
+        suma = np.bincount(self._tok_texto, weights=valores, minlength=len(self.textos))
+        self.puntaje_texto = (np.clip(suma, -SATURACION, SATURACION) / SATURACION).astype(np.float32)
+
+    def _filas_por_texto(self):
+        # CSR texto -> filas (ordenadas); se rearma solo después de agregar()
+        if self._filas is None:
+            orden = np.argsort(self.codigos, kind="stable")
+            con_texto = orden[self.codigos[orden] >= 0]
+            self._filas = (con_texto, _csr(self.codigos[con_texto], len(self.textos)))
+        return self._filas
+
+    # ---------------- Búsqueda ----------------
+    def _textos_con(self, termino):
+        i = self.terminos.get(termino)
+        if i is None:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+        a, b = self._post_inicio[i], self._post_inicio[i + 1]
+        return self._post_texto[a:b], self._post_pos[a:b]
+
+    def _textos_frase(self, tokens):
+        # Claves texto * largo + posición del primer término que siguen
+        # presentes al desplazarlas por cada término siguiente
+        texto, pos = self._textos_con(tokens[0])
+        claves = texto.astype(np.int64) * self._largo + pos
+        for k, termino in enumerate(tokens[1:], start=1):
+            texto, pos = self._textos_con(termino)
+            siguientes = texto.astype(np.int64) * self._largo + pos
+            if len(siguientes) == 0:
+                return np.empty(0, dtype=np.int64)
+            j = np.minimum(np.searchsorted(siguientes, claves + k), len(siguientes) - 1)
+            claves = claves[siguientes[j] == claves + k]
+        return np.unique(claves // self._largo)
+
+    def textos_de(self, consulta):
+        # Códigos de los textos que cumplen todas las cláusulas
+        resultado = None
+        for clausula in interpretar(consulta):
+            encontrados = self._textos_frase(clausula)
+            resultado = encontrados if resultado is None else np.intersect1d(resultado, encontrados)
+        return np.empty(0, dtype=np.int64) if resultado is None else resultado
+
+    def buscar(self, consulta, posiciones=None):
+        # Posiciones de fila (ordenadas) cuyo comentario cumple la consulta,
+        # opcionalmente dentro de posiciones (slice o arreglo)
+        filas, inicio = self._filas_por_texto()
+        partes = [filas[inicio[t]:inicio[t + 1]] for t in self.textos_de(consulta)]
+        pos = np.sort(np.concatenate(partes)) if partes else np.empty(0, dtype=np.int64)
+        return _en_rango(pos, posiciones)
+
+    # ---------------- Sentimiento ----------------
+    def sentimiento(self, posiciones=None):
+        # Puntaje por fila en [-1, 1]; NaN sin comentario
+        codigos = self.codigos if posiciones is None else self.codigos[posiciones]
+        puntajes = np.full(len(codigos), np.nan, dtype=np.float32)
+        con_texto = codigos >= 0
+        puntajes[con_texto] = self.puntaje_texto[codigos[con_texto]]
+        return puntajes
+
+    def resumen(self, posiciones=None):
+        puntajes = self.sentimiento(posiciones)
+        validos = puntajes[~np.isnan(puntajes)]
+        return {
+            "filas": len(puntajes),
+            "comentarios": len(validos),
+            "sentimiento_medio": float(validos.mean()) if len(validos) else np.nan,
+            "positivos": int((validos > 0).sum()),
+            "negativos": int((validos < 0).sum()),
+        }
+
+    def terminos_frecuentes(self, posiciones=None, n=15):
+        # Términos más frecuentes en las filas dadas, con el sentimiento medio
+        # de los comentarios que los contienen (así "volveria" sale negativo
+        # si casi siempre aparece como "no volvería")
+        codigos = self.codigos if posiciones is None else self.codigos[posiciones]
+        filas_texto = np.bincount(codigos[codigos >= 0], minlength=len(self.textos))
+        peso = filas_texto[self._tok_texto]
+        filas = np.bincount(self._tok_termino, weights=peso, minlength=len(self.terminos))
+        suma = np.bincount(self._tok_termino, weights=peso * self.puntaje_texto[self._tok_texto],
+                           minlength=len(self.terminos))
+        df = pd.DataFrame({
+            "Termino": pd.array(list(self.terminos), dtype="string"),
+            "Filas": filas.astype(np.int64),
+            "Sentimiento_Medio": np.divide(suma, filas, out=np.full(len(filas), np.nan), where=filas > 0),
+        })
+        df = df[(df["Filas"] > 0) & (df["Termino"].str.len() > 2) & ~df["Termino"].isin(NEGACIONES)]
+        return df.sort_values("Filas", ascending=False, kind="stable").head(n).reset_index(drop=True)
+
+    # ---------------- Persistencia ----------------
+    def guardar(self, ruta):
+        ruta = Path(ruta)
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        tmp = ruta.with_suffix(".tmp.npz")
+        np.savez(
+            tmp,
+            codigos=self.codigos, tok_texto=self._tok_texto,
+            tok_termino=self._tok_termino, tok_pos=self._tok_pos,
+            meta=np.frombuffer(json.dumps({"textos": self.textos, "terminos": list(self.terminos)},
+                                          ensure_ascii=False).encode(), dtype=np.uint8),
+        )
+        tmp.replace(ruta)
+
+    @classmethod
+    def cargar(cls, ruta):
+        with np.load(ruta) as datos:
+            meta = json.loads(datos["meta"].tobytes().decode())
+            indice = cls()
+            indice.textos = meta["textos"]
+            indice._codigo_texto = {t: i for i, t in enumerate(indice.textos)}
+            indice.terminos = {t: i for i, t in enumerate(meta["terminos"])}
+            indice.codigos = datos["codigos"]
+            indice._tok_texto = datos["tok_texto"]
+            indice._tok_termino = datos["tok_termino"]
+            indice._tok_pos = datos["tok_pos"]
+        indice._ordenar()
+        indice._puntuar()
+        return indice
+
+
+# ---------------- Resúmenes por categoría y bodega ----------------
+DIMENSIONES = DIMENSIONES_KPI + ["Categoria"]
+MEDIDAS = ["comentarios", "suma", "positivos", "negativos"]
+SIN_CATEGORIA = "Sin categoría"
+
+
+def agregar_celdas(df_master, puntajes):
+    # puntajes: sentimiento por fila de df_master (NaN sin comentario)
+    con_texto = ~np.isnan(puntajes)
+    df = df_master[con_texto]
+    p = puntajes[con_texto]
+    celdas = pd.DataFrame({
+        "Dia": df["Fecha_Venta"].dt.floor("D"),
+        **{col: df[col].astype("string") for col in DIMENSIONES_KPI[1:]},
+        "Categoria": df["Categoria"].astype("string").fillna(SIN_CATEGORIA),
+        "comentarios": 1,
+        "suma": p.astype(np.float64),
+        "positivos": (p > 0).astype(int),
+        "negativos": (p < 0).astype(int),
+    })
+    return _sumar(celdas)
+
+
+def _sumar(celdas):
+    return (
+        celdas
+        .groupby(DIMENSIONES, as_index=False, observed=True, dropna=True)[MEDIDAS]
+        .sum()
+        .sort_values("Dia", kind="stable")
+        .reset_index(drop=True)
+    )
+
+
+class CuboSentimiento:
+
+    def __init__(self, df_master, puntajes):
+        self.celdas = agregar_celdas(df_master, puntajes)
+
+    @property
+    def nbytes(self):
+        return int(self.celdas.memory_usage(index=True, deep=True).sum())
+
+    def agregar(self, df_nuevas, puntajes):
+        self.celdas = _sumar(pd.concat([self.celdas, agregar_celdas(df_nuevas, puntajes)], ignore_index=True))
+
+    def _seleccion(self, fecha_inicio, fecha_fin, filtros):
+        dias = self.celdas["Dia"].to_numpy()
+        i = np.searchsorted(dias, pd.Timestamp(fecha_inicio).to_datetime64().astype(dias.dtype), side="left")
+        j = np.searchsorted(dias, pd.Timestamp(fecha_fin).to_datetime64().astype(dias.dtype), side="right")
+        sel = self.celdas.iloc[i:j]
+
+        mascara = np.ones(len(sel), dtype=bool)
+        for col, valores in filtros.items():
+            mascara &= sel[col].isin(valores).to_numpy()
+        return sel[mascara]
+
+    def por(self, dimension, fecha_inicio, fecha_fin, filtros):
+        # dimension: "Categoria" o "Bodega_Origen"
+        g = (
+            self._seleccion(fecha_inicio, fecha_fin, filtros)
+            .groupby(dimension, as_index=False)[MEDIDAS]
+            .sum()
+        )
+        return pd.DataFrame({
+            dimension: g[dimension],
+            "Comentarios": g["comentarios"],
+            "Sentimiento_Medio": g["suma"] / g["comentarios"],
+            "Pct_Negativos": g["negativos"] / g["comentarios"],
+            "Pct_Positivos": g["positivos"] / g["comentarios"],
+        })